@@ -462,6 +462,32 @@ function createLandSuitabilityHeatmap(map, layerControl, bounds, resolution = 20
     return heatmap;
 }
 
+/**
+ * Create the suitability overlay from the server's cached XYZ heatmap tiles
+ * Panning fetches one cached tile per view cell instead of scoring points in the browser.
+ * @param {object} map - Leaflet map object
+ * @param {object} layerControl - Layer control to add the overlay to
+ * @param {object} options - Leaflet tile layer options
+ * @returns {object} Tile layer
+ */
+function createSuitabilityTileLayer(map, layerControl, options = {}) {
+    const defaultOptions = {
+        opacity: 0.7,
+        // Tiles are rendered up to HEATMAP_MAX_ZOOM; deeper zooms scale them up
+        maxNativeZoom: 14,
+        maxZoom: 19,
+        attribution: 'Suitability scores'
+    };
+
+    const tileLayer = L.tileLayer('/api/heatmap/{z}/{x}/{y}.png', {...defaultOptions, ...options}).addTo(map);
+
+    if (layerControl) {
+        layerControl.addOverlay(tileLayer, "Site Suitability");
+    }
+
+    return tileLayer;
+}
+
 /**
  * Add a drawing control to the map for custom area selection
  * @param {object} map - Leaflet map object
@@ -644,6 +670,7 @@ if (typeof module !== 'undefined' && module.exports) {
         createWindPotentialHeatmap,
         createCombinedPotentialHeatmap,
         createLandSuitabilityHeatmap,
+        createSuitabilityTileLayer,
         addDrawingControl,
         addMeasurementControl,
         addGeocodingControl,
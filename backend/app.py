@@ -1,20 +1,37 @@
 import os
-from flask import Flask, jsonify, send_from_directory
+import time
+from flask import Flask, Response, abort, g, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from routes.solar_data import solar_data_bp
 from routes.site_selection import site_selection_bp
 from routes.predictions import predictions_bp
 from routes.cost_estimation import cost_estimation_bp
 from routes.terrain_analysis import terrain_analysis_bp
+from routes.heatmap_tiles import heatmap_tiles_bp
+from routes.jobs import jobs_bp
+from utils.cache import cache_stats
+from utils.static_assets import AssetDirectory, asset_response
+from utils.metrics import (
+    finish_request_trace, http_duration, http_in_flight, http_requests, profiler, registry,
+    server_timing_header, span, start_request_trace
+)
 
 # Get the absolute path to the project root directory
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 FRONTEND_DIR = os.path.join(PROJECT_ROOT, 'frontend')
 ASSETS_DIR = os.path.join(PROJECT_ROOT, 'assets')
-FRONTEND_ASSETS_DIR = os.path.join(FRONTEND_DIR, 'assets')
 COMPONENTS_DIR = os.path.join(PROJECT_ROOT, 'components')
 CHARTS_DIR = os.path.join(PROJECT_ROOT, 'charts')
 
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON encoding shows up as its own ``json.encode`` span"""
+
+    def dumps(self, obj, **kwargs):
+        with span('json.encode'):
+            return super().dumps(obj, **kwargs)
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 
 # Register Blueprints for API routes
 app.register_blueprint(solar_data_bp, url_prefix='/api/solar')
@@ -22,42 +39,128 @@ app.register_blueprint(site_selection_bp, url_prefix='/api/site-selection')
 app.register_blueprint(predictions_bp, url_prefix='/api/predictions')
 app.register_blueprint(cost_estimation_bp, url_prefix='/api/cost-estimation')
 app.register_blueprint(terrain_analysis_bp, url_prefix='/api/terrain-analysis')
+app.register_blueprint(heatmap_tiles_bp, url_prefix='/api/heatmap')
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+
+# Hit/miss counters for the upstream API caches
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    return jsonify(cache_stats())
+
+# Per-route latency, status counts and in-flight requests
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.request_recorded = False
+    g.profiler = profiler.start()
+    http_in_flight.inc()
+    start_request_trace()
+
+def record_request(status):
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    http_requests.inc(method=request.method, route=route, status=status)
+    http_duration.observe(elapsed, method=request.method, route=route)
+    g.request_recorded = True
+    return elapsed
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = record_request(response.status_code)
+    response.headers['Server-Timing'] = server_timing_header(finish_request_trace(), elapsed)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    # stream_with_context pushes the request context again, so this runs twice for streamed responses
+    if 'request_started' not in g or g.get('request_finished'):
+        return
+    g.request_finished = True
+    http_in_flight.dec()
+    if not g.request_recorded:
+        # The view raised, so after_request never ran
+        finish_request_trace()
+        record_request(500)
+    if g.profiler is not None:
+        profiler.finish(g.profiler, f'{request.method} {request.full_path}', time.perf_counter() - g.request_started)
+
+def cache_metric_lines():
+    lines = [
+        '# HELP cache_events_total Upstream cache lookups and maintenance by outcome',
+        '# TYPE cache_events_total counter'
+    ]
+    sizes = ['# HELP cache_entries In-memory entries per cache', '# TYPE cache_entries gauge']
+    for name, stats in cache_stats().items():
+        for event in ('hits', 'disk_hits', 'misses', 'coalesced', 'evictions', 'errors'):
+            lines.append(f'cache_events_total{{cache="{name}",event="{event}"}} {stats[event]}')
+        sizes.append(f'cache_entries{{cache="{name}"}} {stats["size"]}')
+    return lines + sizes
+
+registry.add_collector(cache_metric_lines)
+
+# Prometheus text exposition of everything above
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Slow requests captured by the sampled profiler (PROFILE_SAMPLE_RATE)
+@app.route('/metrics/profiles')
+def list_profiles():
+    return jsonify(profiler.list())
+
+@app.route('/metrics/profiles/<int:profile_id>')
+def get_profile(profile_id):
+    profile = profiler.get(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(profile['stats'], mimetype='text/plain')
+
+# Static files are indexed once and served from memory, precompressed where it helps
+frontend_files = AssetDirectory(FRONTEND_DIR)
+asset_files = AssetDirectory(ASSETS_DIR)
+component_files = AssetDirectory(COMPONENTS_DIR)
+chart_files = AssetDirectory(CHARTS_DIR)
+for directory in (frontend_files, asset_files, component_files, chart_files):
+    directory.load_all()
 
 # Serve frontend HTML files
 @app.route('/')
 def index():
-    return send_from_directory(FRONTEND_DIR, 'index.html')
+    return serve_frontend('index.html')
 
 @app.route('/<path:filename>')
 def serve_frontend(filename):
-    # Check if the file exists in the frontend directory
-    frontend_path = os.path.join(FRONTEND_DIR, filename)
-    if os.path.isfile(frontend_path):
-        return send_from_directory(FRONTEND_DIR, filename)
-    
+    asset = frontend_files.get(filename)
+    if asset is not None:
+        return asset_response(asset)
+
     # If not found, return a 404 error
     return jsonify({"error": "File not found"}), 404
 
 # Serve static assets from both locations
 @app.route('/assets/<path:filename>')
 def serve_assets(filename):
-    # First try to serve from the frontend/assets directory
-    frontend_asset_path = os.path.join(FRONTEND_ASSETS_DIR, filename)
-    if os.path.isfile(frontend_asset_path):
-        return send_from_directory(FRONTEND_ASSETS_DIR, filename)
-    
-    # If not found in frontend/assets, serve from the main assets directory
-    return send_from_directory(ASSETS_DIR, filename)
+    # frontend/assets takes precedence over the main assets directory
+    asset = frontend_files.get(f'assets/{filename}') or asset_files.get(filename)
+    if asset is None:
+        abort(404)
+    return asset_response(asset)
 
 # Serve components
 @app.route('/components/<path:filename>')
 def serve_components(filename):
-    return send_from_directory(COMPONENTS_DIR, filename)
+    asset = component_files.get(filename)
+    if asset is None:
+        abort(404)
+    return asset_response(asset)
 
 # Serve charts
 @app.route('/charts/<path:filename>')
 def serve_charts(filename):
-    return send_from_directory(CHARTS_DIR, filename)
+    asset = chart_files.get(filename)
+    if asset is None:
+        abort(404)
+    return asset_response(asset)
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))  # Use Render's assigned port
@@ -0,0 +1,80 @@
+"""Benchmark the raster terrain kernels on a synthetic DEM grid
+
+Run from the backend directory:
+
+    python -m benchmarks.raster --size 3000 --repeats 5
+
+Times every stage of ``analyze_dem`` and the whole pipeline on one grid and
+prints the best of ``--repeats`` runs, since a single core's timings vary a
+lot between runs. The grid is fractal noise at several scales, so flow paths
+run for hundreds of cells like on real terrain.
+"""
+import argparse
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+from scipy import ndimage
+
+# The raster engine aims to analyze a grid this many cells per side in well under a second
+TARGET_SIZE = 3000
+TARGET_SECONDS = 1.0
+
+# (smoothing sigma in cells, amplitude in meters) of each noise octave
+OCTAVES = [(400, 300), (100, 80), (25, 20), (6, 4), (1.5, 1)]
+
+def synthetic_dem(size, seed=0):
+    rng = np.random.default_rng(seed)
+    dem = np.full((size, size), 500.0)
+    for sigma, amplitude in OCTAVES:
+        dem += amplitude * sigma * ndimage.gaussian_filter(rng.standard_normal((size, size)), sigma)
+    return dem.astype(np.float32)
+
+def best_time(function, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=TARGET_SIZE, help='Cells per side of the grid')
+    parser.add_argument('--cell', type=float, default=30.0, help='Cell size in meters')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from models import raster_terrain
+
+    dem = synthetic_dem(args.size, args.seed)
+    filled = raster_terrain.fill_voids(dem)
+    direction = raster_terrain.d8_flow_direction(filled, args.cell, args.cell)
+    stages = {
+        'fill_voids': lambda: raster_terrain.fill_voids(dem),
+        'slope_aspect': lambda: raster_terrain.slope_aspect(filled, args.cell, args.cell),
+        'roughness_index': lambda: raster_terrain.roughness_index(filled),
+        'd8_flow_direction': lambda: raster_terrain.d8_flow_direction(filled, args.cell, args.cell),
+        'flow_accumulation': lambda: raster_terrain.flow_accumulation(direction),
+        'analyze_dem': lambda: raster_terrain.analyze_dem(dem, args.cell, args.cell)
+    }
+
+    print(f'{args.size} x {args.size} grid, best of {args.repeats} '
+          f'(Python {platform.python_version()}, NumPy {np.__version__}, {os.cpu_count()} CPUs)')
+    print(f'{"stage":20} {"ms":>9} {"ns/cell":>9}')
+    for name, stage in stages.items():
+        seconds, _ = best_time(stage, args.repeats)
+        print(f'{name:20} {seconds * 1000:9.1f} {seconds * 1e9 / dem.size:9.1f}')
+
+    if args.size >= TARGET_SIZE:
+        verdict = 'meets' if seconds < TARGET_SECONDS else 'misses'
+        print(f'analyze_dem {verdict} the {TARGET_SECONDS:g} s target for {TARGET_SIZE} x {TARGET_SIZE} grids')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark the API routes against local stand-ins for OpenTopoData, PVGIS and Mongo
+
+Run from the backend directory:
+
+    python -m benchmarks.run --requests 200 --save
+    python -m benchmarks.run --only terrain predictions --upstream-latency 50
+    python -m benchmarks.run --compare benchmarks/baselines/<commit>.json
+
+Every scenario is driven through the Flask test client (no network, measures
+the handler itself) and through a real threaded local server (adds HTTP and
+concurrency). Latency percentiles, requests per second and per-request
+allocations are printed and can be saved as a baseline for later comparison.
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+# A point whose PVGIS series is fetched from the stand-in before the run
+PVGIS_POINT = (33.45, -112.07)
+
+def percentile(sorted_values, p):
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+def summarize(latencies, wall_seconds, errors):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'rps': round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else None
+    }
+
+def configure_environment(args, upstream):
+    """Point the app at the stand-ins; must run before the app is imported"""
+    scratch = tempfile.mkdtemp(prefix='bench-')
+    os.environ.update({
+        'OPENTOPODATA_URL': f'{upstream.base_url}/opentopodata',
+        'PVGIS_API_BASE': f'{upstream.base_url}/pvgis/',
+        'ELEVATION_REMOTE_FALLBACK': 'true',
+        'OPENTOPODATA_RATE_LIMIT': str(args.elevation_rate_limit),
+        'MONGO_URI': 'mongomock://localhost',
+        'CACHE_DIR': os.path.join(scratch, 'cache'),
+        'IRRADIANCE_STORE_DIR': os.path.join(scratch, 'irradiance'),
+        'TILE_CACHE_DIR': os.path.join(scratch, 'tiles')
+    })
+    if args.dem_dir:
+        os.environ['DEM_TILE_DIR'] = args.dem_dir
+
+def load_app(args):
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from app import app
+    from benchmarks.stubs import LatencyProxy, mongomock_client, seed_locations
+    from database.db_connection import get_db, set_client
+    from routes.solar_routes import fetch_monthly_irradiance, pvgis_cache
+
+    set_client(LatencyProxy(mongomock_client(), args.mongo_latency))
+    seed_locations(get_db().locations, args.locations)
+    pvgis_cache.get_or_fetch(*PVGIS_POINT, fetch_monthly_irradiance)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    return app
+
+def build_requests(scenario, count, seed):
+    rng = random.Random(f'{seed}-{scenario.name}')
+    return [scenario.build(rng) for _ in range(count)]
+
+def measure_allocations(client, scenario, requests):
+    """Mean peak and retained traced memory per request, in KiB"""
+    tracemalloc.start()
+    peaks, retained = [], []
+    try:
+        for path, body in requests:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            client.open(path, method=scenario.method, json=body).get_data()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        'alloc_peak_kib': round(sum(peaks) / len(peaks) / 1024, 1),
+        'alloc_retained_kib': round(sum(retained) / len(retained) / 1024, 1)
+    }
+
+def run_client(app, scenario, args):
+    client = app.test_client()
+    for path, body in build_requests(scenario, args.warmup, args.seed + 1):
+        client.open(path, method=scenario.method, json=body).get_data()
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for path, body in build_requests(scenario, args.requests, args.seed):
+        request_started = time.perf_counter()
+        response = client.open(path, method=scenario.method, json=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        errors += response.status_code >= 400
+    stats = summarize(latencies, time.perf_counter() - started, errors)
+
+    allocation_requests = build_requests(scenario, min(args.requests, args.allocation_requests), args.seed + 2)
+    stats.update(measure_allocations(client, scenario, allocation_requests))
+    return stats
+
+def run_server(base_url, scenario, args):
+    import requests as http
+
+    sessions = threading.local()
+
+    def send(item):
+        path, body = item
+        if not hasattr(sessions, 'session'):
+            sessions.session = http.Session()
+        request_started = time.perf_counter()
+        response = sessions.session.request(scenario.method, base_url + path, json=body)
+        response.content
+        return time.perf_counter() - request_started, response.status_code >= 400
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(send, build_requests(scenario, args.warmup, args.seed + 1)))
+        started = time.perf_counter()
+        outcomes = list(pool.map(send, build_requests(scenario, args.requests, args.seed)))
+        wall = time.perf_counter() - started
+
+    return summarize([latency for latency, _ in outcomes], wall, sum(error for _, error in outcomes))
+
+def start_server(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(__file__)).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                               text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def print_table(mode, results):
+    print(f'\n[{mode}]')
+    header = f'{"scenario":32} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"rps":>9} {"errors":>6}'
+    if mode == 'client':
+        header += f' {"peak KiB":>9} {"kept KiB":>9}'
+    print(header)
+    for name, stats in results.items():
+        line = (f'{name:32} {stats["p50_ms"]:9.2f} {stats["p95_ms"]:9.2f} {stats["p99_ms"]:9.2f} '
+                f'{stats["rps"]:9.1f} {stats["errors"]:6d}')
+        if mode == 'client':
+            line += f' {stats["alloc_peak_kib"]:9.1f} {stats["alloc_retained_kib"]:9.1f}'
+        print(line)
+
+def compare(report, baseline_path, threshold):
+    """Print p50/p95/rps changes against a saved baseline; return the regressions"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f'\nCompared with {baseline["meta"]["commit"]} ({baseline_path}), regression threshold {threshold:.0%}')
+
+    regressions = []
+    for mode, results in report['results'].items():
+        for name, stats in results.items():
+            before = baseline['results'].get(mode, {}).get(name)
+            if before is None:
+                continue
+            p50_change = stats['p50_ms'] / before['p50_ms'] - 1 if before['p50_ms'] else 0.0
+            p95_change = stats['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+            rps_change = stats['rps'] / before['rps'] - 1 if before['rps'] else 0.0
+            regressed = p95_change > threshold
+            if regressed:
+                regressions.append(f'{mode}/{name}')
+            print(f'{mode:6} {name:32} p50 {p50_change:+7.1%}  p95 {p95_change:+7.1%}  rps {rps_change:+7.1%}'
+                  + ('  REGRESSION' if regressed else ''))
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--only', nargs='*', help='Scenario name prefixes, e.g. terrain solar.nearest')
+    parser.add_argument('--mode', choices=['client', 'server', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=100, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads against the local server')
+    parser.add_argument('--allocation-requests', type=int, default=10,
+                        help='Requests per scenario traced for allocations (test client only)')
+    parser.add_argument('--upstream-latency', type=float, default=0.0,
+                        help='Milliseconds added to every OpenTopoData and PVGIS stand-in response')
+    parser.add_argument('--upstream-rate-limit', type=float, default=0.0,
+                        help='Calls per second each stand-in service accepts before answering 429 (0: unlimited)')
+    parser.add_argument('--elevation-rate-limit', type=float, default=0.0,
+                        help="The app's OpenTopoData token bucket rate (0: unlimited)")
+    parser.add_argument('--mongo-latency', type=float, default=0.0,
+                        help='Milliseconds added to every Mongo call')
+    parser.add_argument('--locations', type=int, default=1000, help='Sites seeded into the Mongo stand-in')
+    parser.add_argument('--dem-dir', help='DEM tile directory (default: the app setting)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', nargs='?', const='', metavar='PATH',
+                        help='Save the results, by default to benchmarks/baselines/<commit>.json')
+    parser.add_argument('--compare', metavar='PATH', help='Baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative p95 increase counted as a regression')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from benchmarks.stubs import UpstreamServer
+    upstream = UpstreamServer(args.upstream_latency, args.upstream_rate_limit).start()
+    configure_environment(args, upstream)
+    app = load_app(args)
+
+    from benchmarks.scenarios import select_scenarios
+    scenarios = select_scenarios(args.only)
+    if not scenarios:
+        sys.exit('No scenario matches --only')
+
+    modes = ['client', 'server'] if args.mode == 'both' else [args.mode]
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': {key: value for key, value in vars(args).items() if key not in ('save', 'compare')}
+        },
+        'results': {}
+    }
+
+    for mode in modes:
+        results = report['results'][mode] = {}
+        server, base_url = start_server(app) if mode == 'server' else (None, None)
+        try:
+            for scenario in scenarios:
+                results[scenario.name] = (run_client(app, scenario, args) if mode == 'client'
+                                          else run_server(base_url, scenario, args))
+        finally:
+            if server is not None:
+                server.shutdown()
+        print_table(mode, results)
+    print('\n' + upstream.summary())
+
+    if args.save is not None:
+        path = args.save or os.path.join(BASELINE_DIR, f'{report["meta"]["commit"]}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved {path}')
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        if regressions:
+            sys.exit(f'{len(regressions)} scenario(s) regressed: {", ".join(regressions)}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Requests the benchmark drives, one scenario per route shape"""
+import random
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+class Scenario(NamedTuple):
+    name: str
+    method: str
+    # Builds ``(path, json_body)`` for one request from the shared random generator
+    build: Callable[[random.Random], tuple]
+
+def us_point(rng: random.Random):
+    return round(rng.uniform(31.0, 37.0), 5), round(rng.uniform(-120.0, -100.0), 5)
+
+def us_sites(rng: random.Random, count: int) -> List[Dict]:
+    return [dict(zip(('latitude', 'longitude'), us_point(rng))) for _ in range(count)]
+
+def get(path: str) -> Callable:
+    return lambda rng: (path, None)
+
+def terrain_point(rng):
+    lat, lng = us_point(rng)
+    return f'/api/terrain-analysis/?lat={lat}&lng={lng}', None
+
+def terrain_detailed(rng):
+    lat, lng = us_point(rng)
+    return f'/api/terrain-analysis/detailed?lat={lat}&lng={lng}', None
+
+def nearest(rng):
+    lat, lng = us_point(rng)
+    return f'/api/solar/nearest?dataset=solar-irradiance&lat={lat}&lon={lng}&k=3', None
+
+def interpolate(rng):
+    lat, lng = us_point(rng)
+    return f'/api/solar/interpolate?dataset=wind-speed&lat={lat}&lon={lng}&k=3', None
+
+SCENARIOS = [
+    # /api/solar
+    Scenario('solar.solar_data', 'GET', get('/api/solar/solar-data')),
+    Scenario('solar.dataset', 'GET', get('/api/solar/datasets/wind-speed')),
+    Scenario('solar.nearest', 'GET', nearest),
+    Scenario('solar.interpolate', 'GET', interpolate),
+    Scenario('solar.irradiance_daily', 'GET', get('/api/solar/irradiance/daily?lat=33.45&lon=-112.07')),
+    Scenario('solar.irradiance_typical_day', 'GET', get('/api/solar/irradiance/typical-day?lat=33.45&lon=-112.07')),
+    Scenario('solar.pvgis_monthly', 'GET', get('/api/solar/pvgis?lat=33.45&lon=-112.07')),
+    # /api/site-selection
+    Scenario('site_selection.page', 'GET', get('/api/site-selection/?limit=100')),
+    Scenario('site_selection.clusters', 'GET', get('/api/site-selection/clusters?bbox=31,-120,37,-100&zoom=6')),
+    Scenario('site_selection.rank_grid', 'POST', lambda rng: ('/api/site-selection/rank', {
+        'bbox': [32.0, -115.0, 34.0, -111.0], 'spacing': 0.05, 'k': 10
+    })),
+    Scenario('site_selection.rank_locations', 'POST', lambda rng: ('/api/site-selection/rank', {
+        'source': 'locations', 'k': 10
+    })),
+    # /api/predictions
+    Scenario('predictions.single', 'POST', lambda rng: ('/api/predictions/', dict(
+        zip(('latitude', 'longitude'), us_point(rng)), roughness='Medium'
+    ))),
+    Scenario('predictions.pvgis_cached', 'POST', lambda rng: ('/api/predictions/', {
+        'latitude': 33.45, 'longitude': -112.07, 'roughness': 'Medium'
+    })),
+    Scenario('predictions.batch_50', 'POST', lambda rng: ('/api/predictions/', {
+        'sites': [dict(site, roughness='Medium') for site in us_sites(rng, 50)]
+    })),
+    Scenario('predictions.hourly_json', 'POST', lambda rng: ('/api/predictions/', {
+        'latitude': 33.45, 'longitude': -112.07, 'roughness': 'Medium', 'include_hourly': True
+    })),
+    Scenario('predictions.hourly_f32', 'POST', lambda rng: ('/api/predictions/?format=f32', {
+        'latitude': 33.45, 'longitude': -112.07, 'roughness': 'Medium', 'include_hourly': True
+    })),
+    # /api/cost-estimation
+    Scenario('cost_estimation.single', 'POST', lambda rng: ('/api/cost-estimation/', {
+        'location': 'Arizona', 'annual_kwh': 15000, 'seed': 1
+    })),
+    Scenario('cost_estimation.batch_20', 'POST', lambda rng: ('/api/cost-estimation/', {
+        'sites': [dict(site, annual_kwh=15000) for site in us_sites(rng, 20)], 'scenarios': 2000, 'seed': 1
+    })),
+    # /api/terrain-analysis
+    Scenario('terrain.point', 'GET', terrain_point),
+    Scenario('terrain.batch_100', 'POST', lambda rng: ('/api/terrain-analysis/batch', {
+        'locations': us_sites(rng, 100)
+    })),
+    Scenario('terrain.batch_100_msgpack', 'POST', lambda rng: ('/api/terrain-analysis/batch?format=msgpack', {
+        'locations': us_sites(rng, 100)
+    })),
+    Scenario('terrain.detailed', 'GET', terrain_detailed),
+    # /api/heatmap
+    Scenario('heatmap.json_tile', 'GET', get('/api/heatmap/6/11/25.json?size=32')),
+    # Static files
+    Scenario('static.index', 'GET', get('/')),
+    Scenario('static.page', 'GET', get('/site-selection.html')),
+    Scenario('static.asset', 'GET', get('/assets/css/site-selection.css')),
+    Scenario('static.component', 'GET', get('/components/header.html'))
+]
+
+def select_scenarios(patterns: Optional[List[str]]) -> List[Scenario]:
+    """Scenarios whose name starts with any of the patterns (all when none are given)"""
+    if not patterns:
+        return list(SCENARIOS)
+    return [scenario for scenario in SCENARIOS if any(scenario.name.startswith(p) for p in patterns)]
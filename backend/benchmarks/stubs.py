@@ -0,0 +1,209 @@
+"""Local stand-ins for the upstream services, with configurable latency"""
+import inspect
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DAYS_PER_MONTH = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+
+def synthetic_elevation(lat, lng):
+    """Smooth, deterministic terrain so repeated runs see the same answers"""
+    return round(300 + 250 * math.sin(math.radians(lat * 7)) * math.cos(math.radians(lng * 5)), 1)
+
+def synthetic_monthly_irradiance(lat):
+    """PVGIS-style monthly records (kWh/m²/month) with a latitude-dependent seasonal cycle"""
+    records = []
+    for month, days in enumerate(DAYS_PER_MONTH, start=1):
+        season = math.cos(2 * math.pi * (month - 6.5) / 12) * (1 if lat >= 0 else -1)
+        daily = max(0.5, 5.5 - abs(lat) / 20 + 1.5 * season)
+        records.append({'year': 2020, 'month': month, 'H(i)_m': round(daily * days, 2)})
+    return records
+
+def synthetic_hourly_series(lat):
+    """PVGIS ``seriescalc``-style hourly records for 2020 that add up to the monthly totals"""
+    daylight = [math.sin(math.pi * (hour - 5.5) / 13) if 6 <= hour <= 18 else 0.0 for hour in range(24)]
+    shape = [weight / sum(daylight) for weight in daylight]
+    month_days = DAYS_PER_MONTH[:1] + [29] + DAYS_PER_MONTH[2:]
+
+    records = []
+    for record, days in zip(synthetic_monthly_irradiance(lat), month_days):
+        daily_wh = record['H(i)_m'] * 1000 / days
+        temperature = 15 + 10 * math.cos(2 * math.pi * (record['month'] - 7) / 12) * (1 if lat >= 0 else -1)
+        for day in range(1, days + 1):
+            for hour in range(24):
+                irradiance = round(daily_wh * shape[hour], 2)
+                records.append({
+                    'time': f"2020{record['month']:02d}{day:02d}:{hour:02d}10",
+                    'P': round(irradiance * 0.86, 2),
+                    'G(i)': irradiance,
+                    'H_sun': round(max(0.0, 60 * daylight[hour]), 2),
+                    'T2m': round(temperature + 4 * daylight[hour], 2),
+                    'WS10m': 3.0,
+                    'Int': 0.0
+                })
+    return records
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """Answers OpenTopoData (``/opentopodata``) and PVGIS (``/pvgis/seriescalc``) requests"""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        service = url.path.strip('/').split('/')[0]
+        if not self.server.admit(service):
+            self.send_json({'status': 'INVALID_REQUEST', 'error': 'Too many requests'}, 429, {'Retry-After': '0.1'})
+            return
+
+        if url.path.startswith('/opentopodata'):
+            self.server.count_locations(len(query.get('locations', [''])[0].split('|')))
+            results = []
+            for location in query.get('locations', [''])[0].split('|'):
+                lat, lng = (float(v) for v in location.split(','))
+                results.append({'location': {'lat': lat, 'lng': lng}, 'elevation': synthetic_elevation(lat, lng)})
+            self.send_json({'status': 'OK', 'results': results})
+        elif url.path.startswith('/pvgis/seriescalc'):
+            lat = float(query['lat'][0])
+            self.send_json({
+                'inputs': {'location': {'latitude': lat, 'longitude': float(query['lon'][0])}},
+                'outputs': {'hourly': synthetic_hourly_series(lat)},
+                'meta': {'outputs': {'hourly': {'type': 'time series', 'timestamp': 'hourly averages'}}}
+            })
+        else:
+            self.send_json({'error': 'Not found'}, 404)
+
+    def send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class UpstreamServer(ThreadingHTTPServer):
+    """Counts calls per service and, like the real APIs, answers 429 above ``rate_limit`` calls per second"""
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0.0, rate_limit=0.0):
+        super().__init__(('127.0.0.1', 0), UpstreamHandler)
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.calls = {}
+        self.rejected = 0
+        self.locations = 0
+        self._last_admitted = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def admit(self, service):
+        """Count a call and decide whether it is served; accepted calls pay the latency"""
+        with self._lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rate_limit and now - self._last_admitted.get(service, -math.inf) < 1 / self.rate_limit:
+                self.rejected += 1
+                return False
+            self._last_admitted[service] = now
+            self.calls[service] = self.calls.get(service, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+        return True
+
+    def count_locations(self, count):
+        with self._lock:
+            self.locations += count
+
+    def summary(self):
+        calls = ', '.join(f'{service}: {count}' for service, count in sorted(self.calls.items()))
+        return (f'Upstream stand-in answered {self.requests} requests ({calls or "none served"}; '
+                f'{self.locations} elevation locations, {self.rejected} rate limited)')
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class LatencyProxy:
+    """Wraps a (mongomock) client, database or collection and delays every call on it
+
+    Attribute and item access return wrapped objects, so
+    ``client[db].collection.find(...)`` pays the latency once per call.
+    """
+
+    def __init__(self, target, latency_ms):
+        self._target = target
+        self._latency = latency_ms / 1000
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if inspect.isroutine(value):
+            def call(*args, **kwargs):
+                if self._latency:
+                    time.sleep(self._latency)
+                return value(*args, **kwargs)
+            return call
+        return LatencyProxy(value, self._latency * 1000)
+
+    def __getitem__(self, name):
+        return LatencyProxy(self._target[name], self._latency * 1000)
+
+def geo_within(value, query) -> bool:
+    """Evaluate ``$geoWithin`` for a GeoJSON point in mongomock, which has no geo operators
+
+    Covers the shapes the site filters send: ``$centerSphere`` exactly and a
+    ``$geometry`` polygon by its longitude/latitude bounds, which matches the
+    axis-aligned bbox polygons (MongoDB itself draws their edges as geodesics).
+    """
+    if not isinstance(value, dict) or value.get('type') != 'Point':
+        return False
+    lng, lat = value['coordinates'][:2]
+
+    if '$centerSphere' in query:
+        (center_lng, center_lat), radius = query['$centerSphere']
+        lat1, lat2 = math.radians(center_lat), math.radians(lat)
+        haversine = (math.sin((lat2 - lat1) / 2) ** 2
+                     + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(lng - center_lng) / 2) ** 2)
+        return 2 * math.asin(min(1.0, math.sqrt(haversine))) <= radius
+
+    geometry = query.get('$geometry', {})
+    if geometry.get('type') == 'Polygon':
+        ring = geometry['coordinates'][0]
+        lngs = [point[0] for point in ring]
+        lats = [point[1] for point in ring]
+        return min(lngs) <= lng <= max(lngs) and min(lats) <= lat <= max(lats)
+
+    raise NotImplementedError(f'$geoWithin {sorted(query)} is not supported by the mongomock stand-in')
+
+def mongomock_client():
+    """A mongomock client that also runs the ``$geoWithin`` filters of the site queries"""
+    import mongomock
+    import mongomock.filtering
+    mongomock.filtering._filterer_inst._operator_map.setdefault('$geoWithin', geo_within)
+    return mongomock.MongoClient()
+
+def seed_locations(collection, count, bbox=(31.0, -120.0, 37.0, -100.0)):
+    """Insert ``count`` sites spread over a grid inside the bounding box"""
+    min_lat, min_lng, max_lat, max_lng = bbox
+    side = max(1, int(math.ceil(math.sqrt(count))))
+    documents = []
+    for i in range(count):
+        lat = min_lat + (max_lat - min_lat) * (i // side) / side
+        lng = min_lng + (max_lng - min_lng) * (i % side) / side
+        documents.append({
+            'name': f'Site {i}',
+            'geometry': {'type': 'Point', 'coordinates': [round(lng, 5), round(lat, 5)]},
+            'elevation': synthetic_elevation(lat, lng),
+            'slope': round(abs(math.sin(i)) * 12, 2)
+        })
+    if documents:
+        collection.insert_many(documents)
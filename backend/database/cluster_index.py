@@ -0,0 +1,214 @@
+import math
+import os
+import threading
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional
+
+# Zoom levels with precomputed clusters; deeper zooms list the points themselves
+CLUSTER_MAX_ZOOM = int(os.environ.get('CLUSTER_MAX_ZOOM', 16))
+
+# Side of a cluster cell in screen pixels; a power of two up to the tile size
+CLUSTER_CELL_PX = int(os.environ.get('CLUSTER_CELL_PX', 64))
+TILE_SIZE_PX = 256
+
+# Web Mercator cuts off the poles here
+MAX_MERCATOR_LAT = 85.05112878
+
+def project(lats, lngs):
+    """Web Mercator coordinates in [0, 1], x east and y south"""
+    lats = np.clip(np.asarray(lats, dtype=float), -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT)
+    x = (np.asarray(lngs, dtype=float) + 180.0) / 360.0
+    sin_lat = np.sin(np.radians(lats))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return np.clip(x, 0.0, 1.0), np.clip(y, 0.0, 1.0)
+
+def unproject(x, y):
+    lngs = np.asarray(x) * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * np.asarray(y)))))
+    return lats, lngs
+
+class ZoomLevel(NamedTuple):
+    """Clusters of one zoom level, sorted by cell key (row-major)"""
+    keys: np.ndarray
+    counts: np.ndarray
+    sum_x: np.ndarray
+    sum_y: np.ndarray
+    score_sums: np.ndarray
+    score_counts: np.ndarray
+    first: np.ndarray  # lowest point index in the cell, the point itself when alone
+
+def aggregate(keys, counts, sum_x, sum_y, score_sums, score_counts, first) -> ZoomLevel:
+    """Combine entries sharing a cell key"""
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else np.array([], dtype=np.int64)
+
+    def reduce(values, ufunc=np.add):
+        return ufunc.reduceat(values[order], starts) if len(starts) else values[:0]
+
+    return ZoomLevel(
+        keys[starts], reduce(counts), reduce(sum_x), reduce(sum_y),
+        reduce(score_sums), reduce(score_counts), reduce(first, np.minimum)
+    )
+
+def parent_level(level: ZoomLevel, bits: int) -> ZoomLevel:
+    """Merge each 2x2 block of cells of a level with ``bits`` bits per axis"""
+    rows, cols = level.keys >> bits, level.keys & ((1 << bits) - 1)
+    keys = ((rows >> 1) << (bits - 1)) | (cols >> 1)
+    return aggregate(keys, *level[1:])
+
+def merge_level(old: ZoomLevel, new: ZoomLevel) -> ZoomLevel:
+    """Fold a level built from new points into an existing one
+
+    Only the new keys are looked up: cells already present add the new
+    totals, other cells are inserted at their sorted position. The old
+    arrays are copied once rather than re-sorted, and are left untouched
+    for readers still holding them.
+    """
+    positions = np.searchsorted(old.keys, new.keys)
+    existing = positions < len(old.keys)
+    existing[existing] = old.keys[positions[existing]] == new.keys[existing]
+    fresh = ~existing
+
+    # Old cells move right by the number of new cells inserted before them
+    inserted_at = positions[fresh]
+    targets = positions[existing] + np.searchsorted(inserted_at, positions[existing], side='right')
+
+    merged = [np.insert(values, inserted_at, new_values[fresh]) for values, new_values in zip(old, new)]
+    for values, new_values in zip(merged[1:-1], new[1:-1]):
+        values[targets] += new_values[existing]
+    merged[-1][targets] = np.minimum(merged[-1][targets], new.first[existing])
+    return ZoomLevel(*merged)
+
+class ClusterIndex:
+    """Points grouped into a hierarchy of grid clusters, one level per zoom
+
+    At zoom ``z`` the map is ``256 * 2**z`` pixels wide and cells are
+    ``CLUSTER_CELL_PX`` pixels square, so the four cells of a 2x2 block at one
+    zoom are exactly one cell of the zoom above. The deepest level is built from
+    the points and every coarser level from the one below it. Each cluster keeps
+    its count, coordinate sums for the centroid and its score sum, so new points
+    are merged in by looking up their cells, without re-sorting the existing
+    clusters. Each level's arrays are still copied once per ``add`` so readers
+    keep a consistent snapshot; large indexes should be fed in large batches.
+    """
+
+    def __init__(self, max_zoom: int = CLUSTER_MAX_ZOOM, cell_px: int = CLUSTER_CELL_PX):
+        if cell_px < 1 or cell_px > TILE_SIZE_PX or cell_px & (cell_px - 1):
+            raise ValueError('The cluster cell size must be a power of two up to 256 pixels')
+        self.max_zoom = max_zoom
+        self.base_bits = int(math.log2(TILE_SIZE_PX // cell_px))
+        self.lats = np.empty(0)
+        self.lngs = np.empty(0)
+        self.scores = np.empty(0)
+        self.ids = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.levels: List[ZoomLevel] = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.lats)
+
+    def bits(self, zoom: int) -> int:
+        return zoom + self.base_bits
+
+    def build_levels(self, lats, lngs, scores, offset: int) -> List[ZoomLevel]:
+        x, y = project(lats, lngs)
+        bits = self.bits(self.max_zoom)
+        side = 1 << bits
+        rows = np.minimum((y * side).astype(np.int64), side - 1)
+        cols = np.minimum((x * side).astype(np.int64), side - 1)
+        known = ~np.isnan(scores)
+
+        levels = [aggregate(
+            (rows << bits) | cols, np.ones(len(x), dtype=np.int64), x, y,
+            np.where(known, scores, 0.0), known.astype(np.int64), offset + np.arange(len(x), dtype=np.int64)
+        )]
+        for zoom in range(self.max_zoom, 0, -1):
+            levels.append(parent_level(levels[-1], self.bits(zoom)))
+        return levels[::-1]
+
+    def add(self, lats, lngs, scores=None, ids=None, names=None):
+        """Merge new points into every zoom level; queries keep seeing a consistent snapshot"""
+        lats = np.asarray(lats, dtype=float)
+        lngs = np.asarray(lngs, dtype=float)
+        scores = np.full(len(lats), np.nan) if scores is None else np.asarray(scores, dtype=float)
+        if not len(lats):
+            return
+
+        with self._lock:
+            added = self.build_levels(lats, lngs, scores, len(self.lats))
+            if self.levels:
+                added = [merge_level(old, new) for old, new in zip(self.levels, added)]
+            # Point arrays grow before the levels referring to them are published
+            self.ids = np.concatenate((self.ids, np.asarray(ids if ids is not None else [None] * len(lats), dtype=object)))
+            self.names = np.concatenate((self.names, np.asarray(names if names is not None else [None] * len(lats), dtype=object)))
+            self.scores = np.concatenate((self.scores, scores))
+            self.lngs = np.concatenate((self.lngs, lngs))
+            self.lats = np.concatenate((self.lats, lats))
+            self.levels = added
+
+    def point(self, i: int, lat=None, lng=None) -> Dict:
+        score = self.scores[i]
+        entry = {
+            'latitude': round(float(self.lats[i] if lat is None else lat), 6),
+            'longitude': round(float(self.lngs[i] if lng is None else lng), 6),
+            'count': 1,
+            'mean_score': None if np.isnan(score) else round(float(score), 4)
+        }
+        if self.ids[i] is not None:
+            entry['id'] = self.ids[i]
+        if self.names[i] is not None:
+            entry['name'] = self.names[i]
+        return entry
+
+    def clusters(self, min_lat, min_lng, max_lat, max_lng, zoom: int, limit: Optional[int] = None) -> List[Dict]:
+        """Clusters and single points whose cell or position lies in the bbox
+
+        Raises ValueError when more than ``limit`` would be returned.
+        """
+        if not self.levels:
+            return []
+        if zoom > self.max_zoom:
+            return self._points(min_lat, min_lng, max_lat, max_lng, limit)
+
+        level = self.levels[max(zoom, 0)]
+        bits = self.bits(max(zoom, 0))
+        side = 1 << bits
+        (x0, x1), (y1, y0) = project([min_lat, max_lat], [min_lng, max_lng])
+        row0, row1 = int(y0 * side), min(int(y1 * side), side - 1)
+        col0, col1 = int(x0 * side), min(int(x1 * side), side - 1)
+
+        # Rows are contiguous key ranges; columns are filtered within them
+        start, stop = np.searchsorted(level.keys, [row0 << bits, (row1 + 1) << bits])
+        cols = level.keys[start:stop] & (side - 1)
+        selected = start + np.flatnonzero((cols >= col0) & (cols <= col1))
+        if limit is not None and len(selected) > limit:
+            raise ValueError(f'{len(selected)} clusters in the bbox, the limit is {limit}; zoom out or narrow the bbox')
+
+        counts = level.counts[selected]
+        lats, lngs = unproject(level.sum_x[selected] / counts, level.sum_y[selected] / counts)
+        score_counts = level.score_counts[selected]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_scores = level.score_sums[selected] / score_counts
+
+        results = []
+        for i, count in enumerate(counts.tolist()):
+            if count == 1:
+                results.append(self.point(int(level.first[selected[i]])))
+                continue
+            results.append({
+                'latitude': round(float(lats[i]), 6),
+                'longitude': round(float(lngs[i]), 6),
+                'count': count,
+                'mean_score': None if score_counts[i] == 0 else round(float(mean_scores[i]), 4),
+                'cluster': True
+            })
+        return results
+
+    def _points(self, min_lat, min_lng, max_lat, max_lng, limit):
+        lats, lngs = self.lats, self.lngs
+        inside = np.flatnonzero((lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng))
+        if limit is not None and len(inside) > limit:
+            raise ValueError(f'{len(inside)} points in the bbox, the limit is {limit}; narrow the bbox')
+        return [self.point(int(i)) for i in inside]
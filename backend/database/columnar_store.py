@@ -0,0 +1,368 @@
+import os
+import csv
+import json
+import time
+import uuid
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional
+from database.dataset_registry import DATASETS_DIR, DATASET_RELOAD_INTERVAL
+
+# ``datasets/<name>.columns/`` holds a manifest and one flat file per column
+COLUMNAR_SUFFIX = '.columns'
+MANIFEST_NAME = 'manifest.json'
+
+# Rows buffered in memory before they are appended to the column files
+INGEST_CHUNK_ROWS = 65536
+
+FLOAT_DTYPE = '<f4'
+CODE_DTYPE = '<i4'
+MISSING_CODE = -1
+
+class ColumnarDataset:
+    """A dataset stored as memory-mapped column files described by a small manifest
+
+    Only the manifest is read up front. Each column is mapped on first use,
+    so memory grows with the columns and pages a query actually touches.
+    Numeric columns are float32 with NaN for missing values; text columns are
+    int32 codes into the manifest's ``categories``, with -1 for missing.
+    """
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.mtime = None
+        self.manifest = None
+        self.etag = None
+        self.error = None
+        self.checked_at = 0.0
+        self._arrays = {}
+        self._lock = threading.Lock()
+
+    def load(self):
+        self.mtime = os.stat(self.manifest_path).st_mtime_ns
+        self.checked_at = time.monotonic()
+        try:
+            with open(self.manifest_path, 'rb') as f:
+                raw = f.read()
+            self.manifest = json.loads(raw)
+        except ValueError as e:
+            self.manifest = self.etag = None
+            self.error = e
+            return
+        self.error = None
+        self.etag = hashlib.sha1(raw).hexdigest()
+
+    def __len__(self):
+        return self.manifest['rows']
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.manifest['columns'])
+
+    def kind(self, field) -> Optional[str]:
+        column = self.manifest['columns'].get(field)
+        return column['kind'] if column is not None else None
+
+    def _array(self, field) -> np.ndarray:
+        array = self._arrays.get(field)
+        if array is not None:
+            return array
+        with self._lock:
+            array = self._arrays.get(field)
+            if array is None:
+                column = self.manifest['columns'][field]
+                path = os.path.join(self.directory, column['file'])
+                if len(self) == 0:
+                    array = np.empty(0, dtype=column['dtype'])
+                else:
+                    array = np.memmap(path, dtype=column['dtype'], mode='r', shape=(len(self),))
+                self._arrays[field] = array
+        return array
+
+    def column(self, field) -> np.ndarray:
+        """Read-only float32 view of a numeric column"""
+        if self.kind(field) != 'numeric':
+            raise KeyError(f'{field} is not a numeric column of {self.name}')
+        return self._array(field)
+
+    def codes(self, field) -> np.ndarray:
+        if self.kind(field) != 'category':
+            raise KeyError(f'{field} is not a text column of {self.name}')
+        return self._array(field)
+
+    def categories(self, field) -> List[str]:
+        return self.manifest['columns'][field]['categories']
+
+    def values(self, field, indices) -> np.ndarray:
+        """Python values of a column at some rows, None where missing"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if self.kind(field) == 'numeric':
+            # str() of a float32 is its shortest repr, so 5.8 comes back as 5.8
+            return np.array([None if np.isnan(v) else float(str(v)) for v in self.column(field)[indices]], dtype=object)
+        lookup = np.array(self.categories(field) + [None], dtype=object)
+        return lookup[self.codes(field)[indices]]
+
+    def record(self, i) -> Dict:
+        """Row ``i`` as a dict shaped like a JSON dataset record"""
+        record = {}
+        for field in self.fields:
+            value = self.values(field, [i])[0]
+            if value is not None:
+                record[field] = value
+        return record
+
+class ColumnarRecords:
+    """List-like view creating record dicts on demand, optionally over a subset of ``rows``"""
+
+    def __init__(self, dataset: ColumnarDataset, rows: Optional[np.ndarray] = None):
+        self.dataset = dataset
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.dataset) if self.rows is None else len(self.rows)
+
+    def __getitem__(self, i):
+        return self.dataset.record(int(i) if self.rows is None else int(self.rows[i]))
+
+class ColumnarWriter:
+    """Append rows chunk by chunk and publish them as a columnar dataset
+
+    Column kinds are fixed by the first chunk: a column is numeric when every
+    non-empty value in it parses as a number. Files are written under a fresh
+    generation prefix and the manifest is swapped in last, so readers never
+    see a half-written dataset.
+    """
+
+    def __init__(self, name, directory=DATASETS_DIR, source=None):
+        self.name = name
+        self.directory = os.path.join(directory, name + COLUMNAR_SUFFIX)
+        self.source = source
+        self.generation = uuid.uuid4().hex[:8]
+        self.rows = 0
+        self.columns = None
+        self._files = {}
+        self._category_index = {}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _start(self, chunk: List[Dict]):
+        fields = []
+        for row in chunk:
+            for field in row:
+                if field not in fields:
+                    fields.append(field)
+
+        self.columns = {}
+        for position, field in enumerate(fields):
+            numeric = all(parse_number(row.get(field)) is not None or is_missing(row.get(field)) for row in chunk)
+            kind = 'numeric' if numeric else 'category'
+            self.columns[field] = {
+                'kind': kind,
+                'dtype': FLOAT_DTYPE if numeric else CODE_DTYPE,
+                'file': f'{position}-{safe_filename(field)}.{self.generation}.{"f32" if numeric else "i32"}'
+            }
+            if not numeric:
+                self.columns[field]['categories'] = []
+                self._category_index[field] = {}
+            self._files[field] = open(os.path.join(self.directory, self.columns[field]['file']), 'wb')
+
+    def append(self, chunk: List[Dict]):
+        if not chunk:
+            return
+        if self.columns is None:
+            self._start(chunk)
+
+        unknown = {field for row in chunk for field in row} - set(self.columns)
+        if unknown:
+            raise ValueError(f'Row {self.rows + 1} onwards has columns not in the first chunk: {", ".join(sorted(unknown))}')
+
+        for field, column in self.columns.items():
+            if column['kind'] == 'numeric':
+                array = parse_numeric_column([row.get(field) for row in chunk])
+                if array is not None:
+                    self._files[field].write(array.tobytes())
+                    continue
+                # Find the offending row for the error message
+                array = np.empty(len(chunk), dtype=FLOAT_DTYPE)
+                for i, row in enumerate(chunk):
+                    value = row.get(field)
+                    number = parse_number(value)
+                    if number is None and not is_missing(value):
+                        raise ValueError(f'Row {self.rows + i + 1}: {field} must be numeric, got {value!r}')
+                    array[i] = np.nan if number is None else number
+            else:
+                index = self._category_index[field]
+                categories = column['categories']
+                array = np.empty(len(chunk), dtype=CODE_DTYPE)
+                for i, row in enumerate(chunk):
+                    value = row.get(field)
+                    if is_missing(value):
+                        array[i] = MISSING_CODE
+                        continue
+                    value = str(value)
+                    code = index.get(value)
+                    if code is None:
+                        code = index[value] = len(categories)
+                        categories.append(value)
+                    array[i] = code
+            self._files[field].write(array.tobytes())
+        self.rows += len(chunk)
+
+    def close(self) -> Dict:
+        """Publish the manifest and remove files of earlier generations"""
+        for f in self._files.values():
+            f.close()
+
+        manifest = {
+            'name': self.name,
+            'rows': self.rows,
+            'columns': self.columns or {},
+            'source': self.source,
+            'created_at': time.time()
+        }
+        for field in ('latitude', 'longitude'):
+            column = manifest['columns'].get(field)
+            if column is not None and column['kind'] == 'numeric' and self.rows:
+                values = np.memmap(os.path.join(self.directory, column['file']), dtype=FLOAT_DTYPE, mode='r')
+                manifest.setdefault('bounds', {})[field] = [float(np.nanmin(values)), float(np.nanmax(values))]
+
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        tmp_path = f'{path}.{self.generation}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+        current = {column['file'] for column in manifest['columns'].values()} | {MANIFEST_NAME}
+        for filename in os.listdir(self.directory):
+            if filename not in current and not filename.endswith('.tmp'):
+                # Readers holding a mapping of an old file keep it until they drop it
+                os.remove(os.path.join(self.directory, filename))
+        return manifest
+
+def is_missing(value) -> bool:
+    return value is None or value == ''
+
+def parse_number(value) -> Optional[float]:
+    if isinstance(value, bool) or is_missing(value):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_numeric_column(values) -> Optional[np.ndarray]:
+    """Parse a chunk of one column at NumPy speed; None if any value is not a number"""
+    if any(isinstance(value, bool) for value in values):
+        return None
+    try:
+        return np.array(['nan' if is_missing(value) else value for value in values], dtype=FLOAT_DTYPE)
+    except (TypeError, ValueError):
+        return None
+
+def safe_filename(field) -> str:
+    cleaned = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(field))
+    return cleaned or 'column'
+
+def iter_source_rows(path, fmt=None) -> Iterator[Dict]:
+    """Rows of a CSV, JSON array or newline-delimited JSON file
+
+    CSV and NDJSON are streamed; a JSON array has to be parsed whole.
+    """
+    if fmt is None:
+        fmt = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(os.path.splitext(path)[1].lower(), 'json')
+
+    if fmt == 'csv':
+        with open(path, 'r', newline='') as f:
+            yield from csv.DictReader(f)
+    elif fmt == 'ndjson':
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, list):
+            raise ValueError('A JSON source must be an array of records')
+        yield from data
+
+def ingest(rows: Iterable[Dict], name, directory=DATASETS_DIR, source=None,
+           chunk_rows=INGEST_CHUNK_ROWS, progress=None) -> Dict:
+    """Convert an iterable of records to a columnar dataset and return its manifest"""
+    writer = ColumnarWriter(name, directory, source)
+    chunk = []
+    for row in rows:
+        if not isinstance(row, dict):
+            raise ValueError(f'Row {writer.rows + len(chunk) + 1} is not an object')
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            writer.append(chunk)
+            chunk = []
+            if progress is not None:
+                progress(writer.rows)
+    writer.append(chunk)
+    return writer.close()
+
+class ColumnarRegistry:
+    """Every ``datasets/<name>.columns`` directory, reopened when its manifest changes"""
+
+    def __init__(self, directory=DATASETS_DIR, reload_interval=DATASET_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            entry[:-len(COLUMNAR_SUFFIX)] for entry in os.listdir(self.directory)
+            if entry.endswith(COLUMNAR_SUFFIX)
+            and os.path.isfile(os.path.join(self.directory, entry, MANIFEST_NAME))
+        )
+
+    def get(self, name):
+        """Return the current dataset, or None if it has not been ingested"""
+        dataset = self._datasets.get(name)
+        now = time.monotonic()
+
+        if dataset is not None and now - dataset.checked_at < self.reload_interval:
+            return dataset
+
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset is None:
+                directory = os.path.join(self.directory, name + COLUMNAR_SUFFIX)
+                if os.path.basename(name) != name or not os.path.isfile(os.path.join(directory, MANIFEST_NAME)):
+                    return None
+                dataset = ColumnarDataset(name, directory)
+                dataset.load()
+                self._datasets[name] = dataset
+                return dataset
+
+            try:
+                mtime = os.stat(dataset.manifest_path).st_mtime_ns
+            except OSError:
+                # The dataset was removed
+                del self._datasets[name]
+                return None
+
+            if mtime != dataset.mtime:
+                # Swap in a fresh object; earlier readers keep their own mappings
+                dataset = ColumnarDataset(name, dataset.directory)
+                dataset.load()
+                self._datasets[name] = dataset
+            else:
+                dataset.checked_at = now
+            return dataset
+
+_registry = None
+
+def get_columnar_registry():
+    """Return the process-wide registry; datasets are opened on first use"""
+    global _registry
+    if _registry is None:
+        _registry = ColumnarRegistry()
+    return _registry
@@ -0,0 +1,115 @@
+import os
+import json
+import gzip
+import time
+import hashlib
+import threading
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DATASETS_DIR = os.environ.get('DATASETS_DIR', os.path.join(PROJECT_ROOT, 'datasets'))
+
+# How often, in seconds, a dataset's mtime is checked for changes
+DATASET_RELOAD_INTERVAL = float(os.environ.get('DATASET_RELOAD_INTERVAL', 1))
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+class Dataset:
+    """A parsed dataset together with its pre-encoded API response"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.mtime = None
+        self.data = None
+        self.body = None
+        self.gzip_body = None
+        self.etag = None
+        self.error = None
+        self.checked_at = 0.0
+
+    def load(self):
+        """Parse the file and encode the ``{"success": true, "data": ...}`` envelope once"""
+        self.mtime = os.stat(self.path).st_mtime_ns
+        self.checked_at = time.monotonic()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        except ValueError as e:
+            # Invalid JSON or bytes that are not UTF-8
+            self.data = self.body = self.gzip_body = self.etag = None
+            self.error = e
+            return
+
+        self.error = None
+        self.body = json.dumps(
+            {'success': True, 'data': self.data},
+            separators=(',', ':')
+        ).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, mtime=0) if len(self.body) >= GZIP_MIN_SIZE else None
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+class DatasetRegistry:
+    """Every ``datasets/*.json`` file, loaded once and reloaded when its mtime changes"""
+
+    def __init__(self, directory=DATASETS_DIR, reload_interval=DATASET_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._datasets = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        if not os.path.isdir(self.directory):
+            return
+        for filename in sorted(os.listdir(self.directory)):
+            name, ext = os.path.splitext(filename)
+            if ext == '.json':
+                self.get(name)
+
+    def names(self):
+        return sorted(self._datasets)
+
+    def get(self, name):
+        """Return the current dataset, or None if there is no such file"""
+        dataset = self._datasets.get(name)
+        now = time.monotonic()
+
+        if dataset is not None and now - dataset.checked_at < self.reload_interval:
+            return dataset
+
+        with self._lock:
+            dataset = self._datasets.get(name)
+            if dataset is None:
+                path = os.path.join(self.directory, name + '.json')
+                if os.path.basename(name) != name or not os.path.isfile(path):
+                    return None
+                dataset = Dataset(name, path)
+                dataset.load()
+                self._datasets[name] = dataset
+                return dataset
+
+            try:
+                mtime = os.stat(dataset.path).st_mtime_ns
+            except OSError:
+                # The file was removed
+                del self._datasets[name]
+                return None
+
+            if mtime != dataset.mtime:
+                # Swap in a fresh object so readers never see a half-reloaded dataset
+                dataset = Dataset(name, dataset.path)
+                dataset.load()
+                self._datasets[name] = dataset
+            else:
+                dataset.checked_at = now
+            return dataset
+
+_registry = None
+
+def get_dataset_registry():
+    """Return the process-wide registry, loading every dataset on first use"""
+    global _registry
+    if _registry is None:
+        _registry = DatasetRegistry()
+        _registry.load_all()
+    return _registry
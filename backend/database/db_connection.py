@@ -1,4 +1,66 @@
+import os
+import threading
 import pymongo
+from pymongo import monitoring
+from utils.metrics import record_span
 
-client = pymongo.MongoClient("mongodb://localhost:27017")
-db = client["solar_energy_db"]
+MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017')
+MONGO_DB_NAME = os.environ.get('MONGO_DB_NAME', 'solar_energy_db')
+
+# Connection pool settings passed straight to pymongo.MongoClient
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+
+_client = None
+_client_lock = threading.Lock()
+
+class CommandTimer(monitoring.CommandListener):
+    """Record every Mongo command's server round trip as a ``mongo.<command>`` span"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_span(f'mongo.{event.command_name}', event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record_span(f'mongo.{event.command_name}', event.duration_micros / 1e6, 'error')
+
+def create_client(uri=MONGO_URI):
+    """Create a client for the URI; ``mongomock://`` gives an in-process stand-in"""
+    if uri.startswith('mongomock://'):
+        import mongomock
+        return mongomock.MongoClient()
+
+    return pymongo.MongoClient(
+        uri,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        event_listeners=[CommandTimer()]
+    )
+
+def get_client():
+    """Return the shared client, connecting on first use rather than at import"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client()
+    return _client
+
+def set_client(client):
+    """Replace the shared client, e.g. with a stand-in for a local mongod"""
+    global _client
+    with _client_lock:
+        _client = client
+
+def get_db():
+    return get_client()[MONGO_DB_NAME]
+
+def __getattr__(name):
+    # Keep ``from database.db_connection import db`` working without connecting at import
+    if name == 'db':
+        return get_db()
+    raise AttributeError(name)
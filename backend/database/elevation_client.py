@@ -0,0 +1,232 @@
+import math
+import time
+import random
+import threading
+import numpy as np
+import requests
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from requests.adapters import HTTPAdapter
+from typing import List, Optional
+from utils.metrics import span
+
+# First retry delay in seconds, doubled on every further attempt up to the cap
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+# Responses worth retrying; other errors are answered with NaN straight away
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class ElevationUnavailable(RuntimeError):
+    """The API cannot answer a lookup within its deadline"""
+
+class TokenBucket:
+    """Spaces calls to ``rate`` per second on average, allowing bursts of ``capacity``
+
+    Callers reserve a token and sleep until it is theirs, so waiting threads
+    are served in arrival order. ``pause`` holds every caller back, e.g. for
+    a server's ``Retry-After``. A rate of zero or less disables the limit.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, blocking until it is available; returns the seconds waited"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.rate > 0:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, -self.tokens / self.rate)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def delay(self, calls: int) -> float:
+        """Seconds until ``calls`` more tokens would be granted, without taking any"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.blocked_until - now, 0.0)
+            if self.rate > 0:
+                tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                wait = max(wait, (calls - tokens) / self.rate)
+        return wait
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class _Lookup:
+    __slots__ = ('lat', 'lng', 'future', 'queued_at')
+
+    def __init__(self, lat, lng):
+        self.lat = lat
+        self.lng = lng
+        self.future = Future()
+        self.queued_at = time.monotonic()
+
+class ElevationClient:
+    """Micro-batching OpenTopoData client
+
+    Points requested from any thread are queued and sent together once the
+    oldest has waited ``window`` seconds or ``max_locations`` are pending, so
+    concurrent single-point lookups share one multi-location call. Calls go
+    through a token bucket, back off exponentially on 429 and 5xx responses
+    (honouring ``Retry-After``) and reuse keep-alive connections from a
+    pooled session. Points the API could not answer come back as NaN.
+
+    A lookup fails with ElevationUnavailable rather than wait longer than
+    ``deadline`` seconds: up front when the calls already queued, waiting
+    for a sender or under way would not leave the rate limit room for it,
+    otherwise once the deadline passes.
+    The rate limit is enforced per client, hence per process.
+    """
+
+    def __init__(self, url: str, max_locations: int = 100, window: float = 0.02, rate: float = 1.0,
+                 burst: float = 1.0, max_retries: int = 3, max_connections: int = 4, timeout: float = 10.0,
+                 deadline: float = 30.0):
+        self.url = url
+        self.max_locations = max_locations
+        self.window = window
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.deadline = deadline
+        self.bucket = TokenBucket(rate, burst)
+
+        self.session = requests.Session()
+        self.session.headers['Accept'] = 'application/json'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._queue: List[_Lookup] = []
+        # Batches handed to the senders that have not finished, queued or in flight
+        self._outstanding = 0
+        self._changed = threading.Condition()
+        self._dispatcher = None
+        self._senders = ThreadPoolExecutor(max_connections, thread_name_prefix='elevation-client')
+
+    def elevations(self, lats, lngs) -> np.ndarray:
+        """Elevations for the points, NaN where the API had no answer"""
+        lookups = self.submit(lats, lngs)
+        expires = time.monotonic() + self.deadline
+        with span('opentopodata.wait') as wait:
+            try:
+                return np.array([
+                    lookup.future.result(timeout=max(expires - time.monotonic(), 0)) for lookup in lookups
+                ], dtype=float)
+            except FutureTimeout:
+                wait.fail()
+                # Points still queued are dropped; a call already under way finishes without them
+                for lookup in lookups:
+                    lookup.future.cancel()
+                with self._changed:
+                    self._queue = [lookup for lookup in self._queue if not lookup.future.cancelled()]
+                raise ElevationUnavailable(f'Elevation lookup exceeded {self.deadline:g} s') from None
+
+    def submit(self, lats, lngs) -> List[_Lookup]:
+        lookups = [_Lookup(float(lat), float(lng)) for lat, lng in zip(lats, lngs)]
+        if not lookups:
+            return lookups
+        with self._changed:
+            calls = self._outstanding + math.ceil((len(self._queue) + len(lookups)) / self.max_locations)
+            if self.bucket.delay(calls) > self.deadline:
+                raise ElevationUnavailable(
+                    f'{len(lookups)} remote elevation lookups would exceed the rate limit budget of {self.deadline:g} s'
+                )
+            self._queue.extend(lookups)
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name='elevation-batcher', daemon=True)
+                self._dispatcher.start()
+            self._changed.notify()
+        return lookups
+
+    def _dispatch(self):
+        while True:
+            with self._changed:
+                while not self._queue:
+                    self._changed.wait()
+                while len(self._queue) < self.max_locations:
+                    remaining = self._queue[0].queued_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                batch = self._queue[:self.max_locations]
+                del self._queue[:self.max_locations]
+                self._outstanding += 1
+            self._senders.submit(self._send, batch)
+
+    def _send(self, batch: List[_Lookup]):
+        try:
+            self._answer(batch)
+        finally:
+            with self._changed:
+                self._outstanding -= 1
+
+    def _answer(self, batch: List[_Lookup]):
+        # Lookups whose caller gave up are skipped
+        batch = [lookup for lookup in batch if lookup.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        # Identical points from different callers are asked for once
+        points = list(dict.fromkeys((lookup.lat, lookup.lng) for lookup in batch))
+        try:
+            answers = dict(zip(points, self._request(points)))
+        except Exception as e:
+            # Anything _request does not treat as a missing answer is a bug; hand it to the callers
+            for lookup in batch:
+                lookup.future.set_exception(e)
+            return
+
+        for lookup in batch:
+            elevation = answers.get((lookup.lat, lookup.lng))
+            lookup.future.set_result(np.nan if elevation is None else float(elevation))
+
+    def _request(self, points) -> List[Optional[float]]:
+        """One multi-location call, retried with backoff; None for every point on failure"""
+        params = {'locations': '|'.join(f'{lat},{lng}' for lat, lng in points)}
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            with span('opentopodata.request') as call:
+                call.event('locations', len(points))
+                try:
+                    response = self.session.get(self.url, params=params, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout):
+                    call.fail()
+                    response = None
+
+                if response is not None and response.status_code == 200:
+                    try:
+                        results = response.json()['results'][:len(points)]
+                    except (KeyError, TypeError, ValueError):
+                        call.fail()
+                        return [None] * len(points)
+                    return [result.get('elevation') for result in results] + [None] * (len(points) - len(results))
+                if response is not None and response.status_code not in RETRY_STATUSES:
+                    call.fail()
+                    return [None] * len(points)
+
+                call.fail()
+                if attempt < self.max_retries:
+                    call.event('retry')
+                    self.bucket.pause(self.retry_delay(attempt, response))
+        return [None] * len(points)
+
+    @staticmethod
+    def retry_delay(attempt: int, response) -> float:
+        """``Retry-After`` when the server sent one, otherwise exponential backoff with jitter"""
+        if response is not None:
+            try:
+                return min(float(response.headers['Retry-After']), BACKOFF_MAX)
+            except (KeyError, ValueError):
+                pass
+        return min(BACKOFF_BASE * 2 ** attempt, BACKOFF_MAX) * random.uniform(0.5, 1.0)
@@ -0,0 +1,298 @@
+import os
+import math
+import threading
+import numpy as np
+from database.elevation_client import ElevationClient
+from utils.cache import get_cache
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Directory holding 1x1 degree DEM tiles named like N12E077.hgt (SRTM/ASTER)
+# or N12E077.npy (raw elevation grid, north-west corner first)
+DEM_TILE_DIR = os.environ.get('DEM_TILE_DIR', os.path.join(PROJECT_ROOT, 'datasets', 'dem'))
+
+# The remote API is only consulted for points not covered by a local tile
+ELEVATION_REMOTE_FALLBACK = os.environ.get('ELEVATION_REMOTE_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+OPENTOPODATA_URL = os.environ.get('OPENTOPODATA_URL', 'https://api.opentopodata.org/v1/aster30m')
+OPENTOPODATA_TIMEOUT = float(os.environ.get('OPENTOPODATA_TIMEOUT', 10))
+OPENTOPODATA_MAX_LOCATIONS = 100  # OpenTopoData accepts at most 100 locations per request
+
+# The public API allows one call per second; raise these for a self-hosted instance.
+# Each process (the server and every job worker) has its own bucket, so
+# set the rate to the shared quota divided by the number of processes.
+OPENTOPODATA_RATE_LIMIT = float(os.environ.get('OPENTOPODATA_RATE_LIMIT', 1))
+OPENTOPODATA_BURST = float(os.environ.get('OPENTOPODATA_BURST', 1))
+OPENTOPODATA_MAX_RETRIES = int(os.environ.get('OPENTOPODATA_MAX_RETRIES', 3))
+OPENTOPODATA_MAX_CONNECTIONS = int(os.environ.get('OPENTOPODATA_MAX_CONNECTIONS', 4))
+
+# Longest a request waits for remote elevations; beyond it the lookup fails instead of queueing
+OPENTOPODATA_DEADLINE = float(os.environ.get('OPENTOPODATA_DEADLINE', 30))
+
+# How long a lookup waits for others to share its call
+OPENTOPODATA_BATCH_WINDOW_MS = float(os.environ.get('OPENTOPODATA_BATCH_WINDOW_MS', 20))
+
+HGT_VOID = -32768
+
+# Remote answers are cached at ~11 m resolution; terrain does not change
+elevation_cache = get_cache('elevation', ttl=30 * 24 * 3600, max_entries=100000, precision=4)
+
+class DemTileStore:
+    """Memory-mapped DEM tiles sampled with bilinear interpolation.
+
+    Tiles are opened lazily on first use and kept mapped, so a lookup only
+    reads the pages holding the four surrounding grid cells.
+    """
+
+    def __init__(self, tile_dir: str = DEM_TILE_DIR):
+        self.tile_dir = tile_dir
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def tile_name(lat_floor: int, lng_floor: int) -> str:
+        """Return the SRTM-style name of the tile whose south-west corner is given"""
+        return '{}{:02d}{}{:03d}'.format(
+            'N' if lat_floor >= 0 else 'S', abs(lat_floor),
+            'E' if lng_floor >= 0 else 'W', abs(lng_floor)
+        )
+
+    def _open_tile(self, lat_floor: int, lng_floor: int):
+        name = self.tile_name(lat_floor, lng_floor)
+
+        hgt_path = os.path.join(self.tile_dir, name + '.hgt')
+        if os.path.isfile(hgt_path):
+            # .hgt files are square grids of big-endian int16 samples
+            side = int(math.isqrt(os.path.getsize(hgt_path) // 2))
+            return np.memmap(hgt_path, dtype='>i2', mode='r', shape=(side, side))
+
+        npy_path = os.path.join(self.tile_dir, name + '.npy')
+        if os.path.isfile(npy_path):
+            return np.load(npy_path, mmap_mode='r')
+
+        return None
+
+    def get_tile(self, lat_floor: int, lng_floor: int):
+        key = (lat_floor, lng_floor)
+        if key not in self._tiles:
+            with self._lock:
+                if key not in self._tiles:
+                    self._tiles[key] = self._open_tile(lat_floor, lng_floor)
+        return self._tiles[key]
+
+    def sample(self, lats, lngs) -> np.ndarray:
+        """Bilinearly sample elevations, NaN where no tile or a void cell is hit"""
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=float))
+        elevations = np.full(lats.shape, np.nan)
+
+        lat_floors = np.floor(lats).astype(int)
+        lng_floors = np.floor(lngs).astype(int)
+        keys = np.stack((lat_floors, lng_floors), axis=-1).reshape(-1, 2)
+
+        for lat_floor, lng_floor in np.unique(keys, axis=0):
+            tile = self.get_tile(int(lat_floor), int(lng_floor))
+            if tile is None:
+                continue
+
+            mask = (lat_floors == lat_floor) & (lng_floors == lng_floor)
+            rows_count, cols_count = tile.shape
+
+            # Row 0 is the northern edge of the tile, column 0 the western edge
+            row = (lat_floor + 1 - lats[mask]) * (rows_count - 1)
+            col = (lngs[mask] - lng_floor) * (cols_count - 1)
+            row0 = np.clip(np.floor(row).astype(int), 0, rows_count - 2)
+            col0 = np.clip(np.floor(col).astype(int), 0, cols_count - 2)
+            row_frac = row - row0
+            col_frac = col - col0
+
+            corners = [
+                np.asarray(tile[row0 + dr, col0 + dc], dtype=float)
+                for dr, dc in ((0, 0), (0, 1), (1, 0), (1, 1))
+            ]
+            for corner in corners:
+                corner[corner == HGT_VOID] = np.nan
+
+            top = corners[0] * (1 - col_frac) + corners[1] * col_frac
+            bottom = corners[2] * (1 - col_frac) + corners[3] * col_frac
+            elevations[mask] = top * (1 - row_frac) + bottom * row_frac
+
+        return elevations
+
+    def window(self, lat: float, lng: float, radius_cells: int):
+        """Return the raw DEM grid centred on a point, or None without a local tile
+
+        The result is ``(grid, cell_degrees)`` where ``grid`` is a float32 array
+        of ``2 * radius_cells + 1`` rows and columns, north row first, with NaN
+        for voids and cells outside the available tiles. Tiles are assumed to
+        share the resolution of the tile under the centre point.
+        """
+        center_tile = self.get_tile(int(math.floor(lat)), int(math.floor(lng)))
+        if center_tile is None:
+            return None
+
+        cells_per_degree = center_tile.shape[0] - 1
+        size = 2 * radius_cells + 1
+        grid = np.full((size, size), np.nan, dtype=np.float32)
+
+        # Global grid indices counted from the north pole and the antimeridian
+        center_row = int(round((90 - lat) * cells_per_degree))
+        center_col = int(round((lng + 180) * cells_per_degree))
+        row_start, row_stop = center_row - radius_cells, center_row + radius_cells + 1
+        col_start, col_stop = center_col - radius_cells, center_col + radius_cells + 1
+
+        first_lat = 89 - (row_stop - 1) // cells_per_degree
+        last_lat = 89 - row_start // cells_per_degree
+        first_lng = col_start // cells_per_degree - 180
+        last_lng = (col_stop - 1) // cells_per_degree - 180
+
+        for lat_floor in range(first_lat, last_lat + 1):
+            for lng_floor in range(first_lng, last_lng + 1):
+                tile = self.get_tile(lat_floor, lng_floor)
+                if tile is None or tile.shape[0] - 1 != cells_per_degree:
+                    continue
+
+                tile_row = (89 - lat_floor) * cells_per_degree
+                tile_col = (lng_floor + 180) * cells_per_degree
+                r0, r1 = max(row_start, tile_row), min(row_stop, tile_row + cells_per_degree + 1)
+                c0, c1 = max(col_start, tile_col), min(col_stop, tile_col + cells_per_degree + 1)
+                if r0 >= r1 or c0 >= c1:
+                    continue
+
+                # Copy, as a float32 tile would otherwise hand back a read-only view of the map
+                block = np.array(tile[r0 - tile_row:r1 - tile_row, c0 - tile_col:c1 - tile_col], dtype=np.float32)
+                block[block == HGT_VOID] = np.nan
+                grid[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = block
+
+        return grid, 1.0 / cells_per_degree
+
+    def windows(self, lats, lngs, radius_cells: int):
+        """Return the DEM windows around many points as one stack
+
+        The result is ``(grids, cell_degrees)``: a float32 array of shape
+        ``(points, size, size)`` laid out like ``window`` and the cell size of
+        each point. Points without a local tile get an all-NaN window and a NaN
+        cell size. Windows lying inside a single tile are gathered from it in
+        one indexing pass; only those crossing a tile edge go through ``window``.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=float))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=float))
+        size = 2 * radius_cells + 1
+        grids = np.full((lats.size, size, size), np.nan, dtype=np.float32)
+        cell_degrees = np.full(lats.size, np.nan)
+        offsets = np.arange(-radius_cells, radius_cells + 1)
+
+        lat_floors = np.floor(lats).astype(int)
+        lng_floors = np.floor(lngs).astype(int)
+        keys = np.stack((lat_floors, lng_floors), axis=-1)
+
+        for lat_floor, lng_floor in np.unique(keys, axis=0):
+            tile = self.get_tile(int(lat_floor), int(lng_floor))
+            if tile is None:
+                continue
+
+            members = np.flatnonzero((lat_floors == lat_floor) & (lng_floors == lng_floor))
+            cells_per_degree = tile.shape[0] - 1
+            cell_degrees[members] = 1.0 / cells_per_degree
+
+            # Same global rounding as ``window``, shifted to the tile's own rows and columns
+            rows = np.round((90 - lats[members]) * cells_per_degree).astype(int) - (89 - lat_floor) * cells_per_degree
+            cols = np.round((lngs[members] + 180) * cells_per_degree).astype(int) - (lng_floor + 180) * cells_per_degree
+            inside = ((rows >= radius_cells) & (rows + radius_cells <= cells_per_degree)
+                      & (cols >= radius_cells) & (cols + radius_cells <= cells_per_degree))
+
+            if inside.any():
+                row_index = (rows[inside, None] + offsets)[:, :, None]
+                col_index = (cols[inside, None] + offsets)[:, None, :]
+                block = np.asarray(tile[row_index, col_index], dtype=np.float32)
+                block[block == HGT_VOID] = np.nan
+                grids[members[inside]] = block
+
+            for i in members[~inside]:
+                grids[i] = self.window(lats[i], lngs[i], radius_cells)[0]
+
+        return grids, cell_degrees
+
+_tile_store = None
+
+def get_tile_store() -> DemTileStore:
+    """Return the process-wide tile store"""
+    global _tile_store
+    if _tile_store is None:
+        _tile_store = DemTileStore()
+    return _tile_store
+
+_elevation_client = None
+_elevation_client_lock = threading.Lock()
+
+def get_elevation_client() -> ElevationClient:
+    """Return the process-wide OpenTopoData client"""
+    global _elevation_client
+    with _elevation_client_lock:
+        if _elevation_client is None:
+            _elevation_client = ElevationClient(
+                OPENTOPODATA_URL,
+                max_locations=OPENTOPODATA_MAX_LOCATIONS,
+                window=OPENTOPODATA_BATCH_WINDOW_MS / 1000,
+                rate=OPENTOPODATA_RATE_LIMIT,
+                burst=OPENTOPODATA_BURST,
+                max_retries=OPENTOPODATA_MAX_RETRIES,
+                max_connections=OPENTOPODATA_MAX_CONNECTIONS,
+                timeout=OPENTOPODATA_TIMEOUT,
+                deadline=OPENTOPODATA_DEADLINE
+            )
+        return _elevation_client
+
+def fetch_remote_elevations(lats, lngs) -> np.ndarray:
+    """Fetch elevations from OpenTopoData, NaN for points the API could not answer
+
+    Lookups from concurrent requests are batched into shared calls by the client.
+    """
+    return get_elevation_client().elevations(np.asarray(lats, dtype=float), np.asarray(lngs, dtype=float))
+
+def _fetch_remote_elevation(lat: float, lng: float):
+    elevation = fetch_remote_elevations([lat], [lng])[0]
+    return None if np.isnan(elevation) else float(elevation)
+
+def fetch_cached_elevations(lats, lngs) -> np.ndarray:
+    """Remote elevations, answered from the elevation cache where possible"""
+    if len(lats) == 1:
+        # Single lookups go through get_or_fetch so concurrent requests coalesce
+        elevation = elevation_cache.get_or_fetch(lats[0], lngs[0], _fetch_remote_elevation)
+        return np.array([np.nan if elevation is None else elevation])
+
+    keys = [elevation_cache.make_key(lat, lng) for lat, lng in zip(lats, lngs)]
+    elevations = np.full(len(keys), np.nan)
+    uncached = []
+    for i, key in enumerate(keys):
+        hit, elevation = elevation_cache.get(key)
+        if hit:
+            elevations[i] = elevation
+        else:
+            uncached.append(i)
+
+    if uncached:
+        quantized = np.array([elevation_cache.quantize(lats[i], lngs[i]) for i in uncached])
+        fetched = fetch_remote_elevations(quantized[:, 0], quantized[:, 1])
+        for i, elevation in zip(uncached, fetched):
+            if not np.isnan(elevation):
+                elevations[i] = elevation
+                elevation_cache.set(keys[i], float(elevation))
+
+    return elevations
+
+def get_elevations(lats, lngs) -> np.ndarray:
+    """Look up elevations from local tiles, then the remote API if enabled"""
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lngs = np.atleast_1d(np.asarray(lngs, dtype=float))
+    elevations = get_tile_store().sample(lats, lngs)
+
+    missing = np.isnan(elevations)
+    if ELEVATION_REMOTE_FALLBACK and missing.any():
+        elevations[missing] = fetch_cached_elevations(lats[missing], lngs[missing])
+
+    return elevations
+
+def get_elevation(lat: float, lng: float):
+    """Look up a single elevation, or None when no source has it"""
+    elevation = get_elevations([lat], [lng])[0]
+    return None if np.isnan(elevation) else float(elevation)
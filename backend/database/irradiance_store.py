@@ -0,0 +1,213 @@
+import os
+import re
+import json
+import time
+import codecs
+import threading
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional
+from utils.cache import get_cache
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+IRRADIANCE_STORE_DIR = os.environ.get('IRRADIANCE_STORE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'irradiance'))
+
+SERIES_DTYPE = '<f4'
+
+# Memory-mapped hourly series; the irradiance store is their persistent copy
+series_cache = get_cache('irradiance-series', ttl=24 * 3600, max_entries=256, precision=2, disk_dir=None)
+
+# Opening of the ``outputs.hourly`` record list; the ``meta`` section's
+# ``"hourly"`` key holds an object, so it is not mistaken for the series
+HOURLY_ARRAY = re.compile(r'"hourly"\s*:\s*\[')
+
+# Characters kept between reads while looking for the series, in case the key is split
+KEY_OVERLAP = 32
+
+class HourlySeries:
+    """One location's hourly values as a (fields, hours) float32 array
+
+    Hours are consecutive and start at ``start`` (UTC, minute resolution),
+    so timestamps and calendar groupings are derived rather than stored.
+    """
+
+    def __init__(self, fields: List[str], start: str, values: np.ndarray, meta: Optional[Dict] = None):
+        self.fields = list(fields)
+        self.start = np.datetime64(start, 'm')
+        self.values = values
+        self.meta = meta or {}
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def field(self, name) -> np.ndarray:
+        try:
+            return self.values[self.fields.index(name)]
+        except ValueError:
+            raise LookupError(f'Series has no field {name}')
+
+    def timestamps(self) -> np.ndarray:
+        return self.start + np.arange(len(self), dtype=np.int64) * np.timedelta64(60, 'm')
+
+    def calendar(self) -> Dict[str, np.ndarray]:
+        """Day, month and UTC hour of every value"""
+        times = self.timestamps()
+        days = times.astype('datetime64[D]')
+        return {
+            'day': days,
+            'month': times.astype('datetime64[M]'),
+            'hour': ((times - days) // np.timedelta64(1, 'h')).astype(np.int64)
+        }
+
+def parse_record_time(value) -> np.datetime64:
+    """PVGIS timestamps look like ``20200101:0010`` (UTC)"""
+    text = str(value)
+    if len(text) != 13 or text[8] != ':':
+        raise ValueError(f'Unexpected PVGIS time {value!r}')
+    return np.datetime64(f'{text[:4]}-{text[4:6]}-{text[6:8]}T{text[9:11]}:{text[11:13]}', 'm')
+
+def iter_hourly_records(chunks: Iterable[bytes]) -> Iterator[Dict]:
+    """Yield the ``outputs.hourly`` records of a PVGIS JSON body as it arrives
+
+    Only the record being decoded and the unread tail of the last chunk are
+    held in memory, so the full body is never buffered or parsed into one tree.
+    """
+    text = codecs.getincrementaldecoder('utf-8')()
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    in_series = False
+    exhausted = False
+
+    while True:
+        if not in_series:
+            match = HOURLY_ARRAY.search(buffer)
+            if match:
+                buffer, pos, in_series = buffer[match.end():], 0, True
+                continue
+            buffer = buffer[-KEY_OVERLAP:]
+        else:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer):
+                if buffer[pos] == ']':
+                    return
+                try:
+                    record, pos = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely a record cut off at the end of the chunk
+                    if exhausted:
+                        raise ValueError('PVGIS hourly series is malformed or truncated')
+                else:
+                    if not isinstance(record, dict):
+                        raise ValueError('PVGIS hourly records must be objects')
+                    yield record
+                    continue
+            buffer, pos = buffer[pos:], 0
+
+        if exhausted:
+            if in_series:
+                raise ValueError('PVGIS hourly series is malformed or truncated')
+            raise ValueError('PVGIS response has no hourly series')
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += text.decode(b'', final=True)
+        else:
+            buffer += text.decode(chunk)
+
+def parse_hourly_series(chunks: Iterable[bytes]) -> HourlySeries:
+    """Collect the numeric fields of a streamed PVGIS hourly series into float32 columns
+
+    The fields are those of the first record; missing or non-numeric values
+    become NaN. Records must be one hour apart.
+    """
+    records = iter_hourly_records(chunks)
+    first = next(records, None)
+    if first is None:
+        raise ValueError('PVGIS hourly series is empty')
+
+    fields = [key for key, value in first.items()
+              if key != 'time' and isinstance(value, (int, float)) and not isinstance(value, bool)]
+    start = parse_record_time(first.get('time'))
+    rows = [[first[field] for field in fields]]
+    last_time = first.get('time')
+    for record in records:
+        rows.append([record.get(field) for field in fields])
+        last_time = record.get('time')
+
+    values = np.array(rows, dtype=float).T.astype(SERIES_DTYPE)
+    hours = (parse_record_time(last_time) - start) // np.timedelta64(1, 'h')
+    if hours != len(rows) - 1:
+        raise ValueError('PVGIS hourly records are not one hour apart')
+    return HourlySeries(fields, str(start), values)
+
+class IrradianceStore:
+    """Hourly series saved per quantized location as a ``.npy`` array and a JSON sidecar
+
+    Arrays are memory-mapped when loaded, so aggregating a year reads only
+    the fields a query uses and nothing is parsed again.
+    """
+
+    def __init__(self, directory=IRRADIANCE_STORE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def _paths(self, lat, lng):
+        stem = os.path.join(self.directory, f'{lat}_{lng}')
+        return stem + '.npy', stem + '.json'
+
+    def load(self, lat, lng) -> Optional[HourlySeries]:
+        array_path, meta_path = self._paths(lat, lng)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            values = np.load(array_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if values.shape != (len(meta['fields']), meta['hours']):
+            return None
+        return HourlySeries(meta['fields'], meta['start'], values, meta)
+
+    def save(self, lat, lng, series: HourlySeries, source=None) -> HourlySeries:
+        """Write the series and return it backed by the stored file"""
+        array_path, meta_path = self._paths(lat, lng)
+        meta = {
+            'fields': series.fields,
+            'start': str(series.start),
+            'hours': len(series),
+            'source': source,
+            'stored_at': time.time()
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            # The sidecar is replaced last, so readers never pair it with a partial array
+            tmp_array = f'{array_path}.{os.getpid()}.tmp.npy'
+            np.save(tmp_array, np.ascontiguousarray(series.values, dtype=SERIES_DTYPE))
+            os.replace(tmp_array, array_path)
+            tmp_meta = f'{meta_path}.{os.getpid()}.tmp'
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(tmp_meta, meta_path)
+        return self.load(lat, lng) or series
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_irradiance_store() -> IrradianceStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = IrradianceStore()
+        return _store
+
+def stored_series(lat, lng) -> Optional[HourlySeries]:
+    """The series already held for a location, from memory or the store; never downloads"""
+    key = series_cache.make_key(lat, lng)
+    hit, series = series_cache.get(key)
+    if hit:
+        return series
+    series = get_irradiance_store().load(*series_cache.quantize(lat, lng))
+    if series is not None:
+        series_cache.set(key, series)
+    return series
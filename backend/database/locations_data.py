@@ -1,4 +1,84 @@
-from database.db_connection import db
+import threading
+import pymongo
+from bson import ObjectId
+from database.db_connection import get_db
+
+# Sites store their position as a GeoJSON point: {"type": "Point", "coordinates": [lng, lat]}
+GEO_FIELD = 'geometry'
+
+EARTH_RADIUS_KM = 6378.1
+
+_indexes_ready = False
+_indexes_lock = threading.Lock()
+
+def get_locations_collection():
+    return get_db().locations
+
+def ensure_location_indexes():
+    """Create the 2dsphere index used by the bbox and near filters, once per process"""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    with _indexes_lock:
+        if not _indexes_ready:
+            get_locations_collection().create_index([(GEO_FIELD, pymongo.GEOSPHERE)])
+            _indexes_ready = True
+
+def build_location_query(bbox=None, near=None, radius_km=None, after=None):
+    """Translate the site-selection filters into a Mongo query"""
+    geo_filters = []
+
+    if bbox is not None:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        geo_filters.append({'$geoWithin': {'$geometry': {
+            'type': 'Polygon',
+            'coordinates': [[
+                [min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat],
+                [min_lng, max_lat], [min_lng, min_lat]
+            ]]
+        }}})
+
+    if near is not None:
+        # $centerSphere keeps the natural _id order, unlike $near, so cursors still work
+        lat, lng = near
+        geo_filters.append({'$geoWithin': {'$centerSphere': [[lng, lat], radius_km / EARTH_RADIUS_KM]}})
+
+    if len(geo_filters) == 1:
+        query = {GEO_FIELD: geo_filters[0]}
+    elif geo_filters:
+        query = {'$and': [{GEO_FIELD: geo_filter} for geo_filter in geo_filters]}
+    else:
+        query = {}
+
+    if after is not None:
+        query['_id'] = {'$gt': ObjectId(after)}
+
+    return query
+
+def find_locations(bbox=None, near=None, radius_km=None, after=None, fields=None, limit=None):
+    """Return a cursor over matching sites in ``_id`` order"""
+    if bbox is not None or near is not None:
+        ensure_location_indexes()
+
+    query = build_location_query(bbox, near, radius_km, after)
+    projection = {field: 1 for field in fields} if fields else None
+
+    cursor = get_locations_collection().find(query, projection).sort('_id', pymongo.ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
 
 def get_locations():
-    return db.locations.find()
+    return get_locations_collection().find()
+
+def serialize_document(value):
+    """Convert ObjectIds (including nested ones) so documents can be JSON encoded"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: serialize_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [serialize_document(item) for item in value]
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
@@ -0,0 +1,259 @@
+import threading
+import numpy as np
+from scipy.spatial import cKDTree
+from database.dataset_registry import get_dataset_registry
+from database.columnar_store import ColumnarDataset, ColumnarRecords, get_columnar_registry
+
+EARTH_RADIUS_KM = 6371.0088
+
+def to_unit_vectors(lats, lngs) -> np.ndarray:
+    """Project coordinates onto the unit sphere so chord distance orders like great-circle distance"""
+    lat_rad = np.radians(np.asarray(lats, dtype=float))
+    lng_rad = np.radians(np.asarray(lngs, dtype=float))
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack((cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)))
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+def km_to_chord(distance_km):
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+class SpatialIndex:
+    """KD-tree over the latitude/longitude records of a dataset.
+
+    Nearest and radius queries use a 3-D tree on the unit sphere; bbox queries
+    binary-search a latitude-sorted copy, so both stay logarithmic in the
+    number of records.
+    """
+
+    def __init__(self, records):
+        located = [
+            r for r in records
+            if isinstance(r, dict) and r.get('latitude') is not None and r.get('longitude') is not None
+        ]
+        self.records = located
+        self._columnar = None
+        self._rows = None
+        self._columns = {}
+
+        # Fields that can be interpolated between neighbours
+        sample = located[0] if located else {}
+        self.numeric_fields = [
+            key for key, value in sample.items()
+            if key not in ('latitude', 'longitude')
+            and isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        self.categorical_fields = [
+            key for key in sample
+            if key not in ('latitude', 'longitude') and key not in self.numeric_fields
+        ]
+        self._build(
+            np.array([r['latitude'] for r in located], dtype=float),
+            np.array([r['longitude'] for r in located], dtype=float)
+        )
+
+    @classmethod
+    def from_columnar(cls, dataset):
+        """Index a memory-mapped columnar dataset without materializing its records
+
+        Only the coordinate columns are read in full; other columns are paged
+        in as queries touch them.
+        """
+        index = cls.__new__(cls)
+        if dataset.kind('latitude') != 'numeric' or dataset.kind('longitude') != 'numeric':
+            raise ValueError(f'{dataset.name} has no numeric latitude and longitude columns')
+        lats = np.asarray(dataset.column('latitude'), dtype=float)
+        lngs = np.asarray(dataset.column('longitude'), dtype=float)
+        located = ~(np.isnan(lats) | np.isnan(lngs))
+
+        index._columnar = dataset
+        index._rows = None if located.all() else np.flatnonzero(located)
+        index.records = ColumnarRecords(dataset, index._rows)
+        index._columns = {}
+        fields = [field for field in dataset.fields if field not in ('latitude', 'longitude')]
+        index.numeric_fields = [field for field in fields if dataset.kind(field) == 'numeric']
+        index.categorical_fields = [field for field in fields if dataset.kind(field) == 'category']
+        index._build(lats[located], lngs[located])
+        return index
+
+    def _build(self, lats, lngs):
+        self.lats = lats
+        self.lngs = lngs
+        self.tree = cKDTree(to_unit_vectors(lats, lngs)) if len(lats) else None
+        self._lat_order = np.argsort(lats, kind='stable')
+        self._sorted_lats = lats[self._lat_order]
+
+    def __len__(self):
+        return len(self.records)
+
+    def column(self, field, dtype=float) -> np.ndarray:
+        """Values of one field for every record, in index order
+
+        Numeric columns of a columnar dataset are its float32 mappings.
+        """
+        if self._columnar is not None and dtype is float:
+            if field not in self.numeric_fields:
+                return np.full(len(self), np.nan)
+            values = self._columnar.column(field)
+            return values if self._rows is None else values[self._rows]
+
+        key = (field, dtype)
+        if key not in self._columns:
+            if self._columnar is not None:
+                rows = np.arange(len(self)) if self._rows is None else self._rows
+                values = self._columnar.values(field, rows) if field in self._columnar.fields else [None] * len(self)
+                self._columns[key] = np.array(values, dtype=dtype)
+            else:
+                missing = np.nan if dtype is float else None
+                self._columns[key] = np.array([r.get(field, missing) for r in self.records], dtype=dtype)
+        return self._columns[key]
+
+    def values_at(self, field, indices) -> np.ndarray:
+        """Values of one field at some index positions, None where missing"""
+        if self._columnar is None:
+            return self.column(field, dtype=object)[indices]
+        if field not in self._columnar.fields:
+            return np.full(len(indices), None, dtype=object)
+        rows = indices if self._rows is None else self._rows[indices]
+        return self._columnar.values(field, rows)
+
+    def nearest(self, lat, lng, k=1):
+        """Return ``(indices, distances_km)`` of the k closest records"""
+        if self.tree is None:
+            return np.array([], dtype=int), np.array([])
+        k = min(k, len(self.records))
+        chords, indices = self.tree.query(to_unit_vectors([lat], [lng])[0], k=k)
+        return np.atleast_1d(indices), chord_to_km(np.atleast_1d(chords))
+
+    def within_radius(self, lat, lng, radius_km):
+        """Return ``(indices, distances_km)`` of records within the radius, closest first"""
+        if self.tree is None:
+            return np.array([], dtype=int), np.array([])
+        point = to_unit_vectors([lat], [lng])[0]
+        indices = np.array(self.tree.query_ball_point(point, km_to_chord(radius_km)), dtype=int)
+        distances = chord_to_km(np.linalg.norm(self.tree.data[indices] - point, axis=1))
+        order = np.argsort(distances)
+        return indices[order], distances[order]
+
+    def within_bbox(self, min_lat, min_lng, max_lat, max_lng):
+        """Return indices of records inside the box; min_lng > max_lng crosses the antimeridian"""
+        start = np.searchsorted(self._sorted_lats, min_lat, side='left')
+        stop = np.searchsorted(self._sorted_lats, max_lat, side='right')
+        candidates = self._lat_order[start:stop]
+        lngs = self.lngs[candidates]
+        if min_lng <= max_lng:
+            inside = (lngs >= min_lng) & (lngs <= max_lng)
+        else:
+            inside = (lngs >= min_lng) | (lngs <= max_lng)
+        return np.sort(candidates[inside])
+
+    def interpolate(self, lat, lng, k=4, power=2):
+        """Inverse-distance weighted estimate of every numeric field at a point
+
+        Categorical fields are taken from the nearest record.
+        """
+        indices, distances = self.nearest(lat, lng, k)
+        if len(indices) == 0:
+            return None
+
+        values = {}
+        if distances[0] < 1e-9:
+            weights = (distances < 1e-9).astype(float)
+        else:
+            weights = 1.0 / distances ** power
+        weights /= weights.sum()
+
+        for field in self.numeric_fields:
+            field_values = np.array([self.records[i].get(field, np.nan) for i in indices], dtype=float)
+            valid = ~np.isnan(field_values)
+            if valid.any():
+                values[field] = float(np.dot(weights[valid], field_values[valid]) / weights[valid].sum())
+        for field in self.categorical_fields:
+            values[field] = self.records[indices[0]].get(field)
+
+        return {
+            'values': values,
+            'neighbours': [
+                dict(self.records[i], distance_km=round(float(d), 3), weight=round(float(w), 4))
+                for i, d, w in zip(indices, distances, weights)
+            ]
+        }
+
+    def interpolate_values(self, lats, lngs, field, k=4, power=2, max_distance_km=None) -> np.ndarray:
+        """Vectorized inverse-distance weighting of one numeric field at many points
+
+        Points whose nearest record is farther than ``max_distance_km`` get NaN.
+        """
+        lats = np.asarray(lats, dtype=float)
+        result = np.full(lats.shape, np.nan)
+        if self.tree is None:
+            return result
+
+        values = self.column(field)
+        k = min(k, len(self.records))
+        chords, indices = self.tree.query(to_unit_vectors(lats.ravel(), np.ravel(lngs)), k=k)
+        chords = chords.reshape(len(chords), -1)
+        indices = indices.reshape(len(indices), -1)
+        distances = chord_to_km(chords)
+
+        with np.errstate(divide='ignore'):
+            weights = 1.0 / distances ** power
+        exact = distances[:, 0] < 1e-9
+        weights[exact] = (distances[exact] < 1e-9).astype(float)
+
+        neighbour_values = values[indices]
+        valid = ~np.isnan(neighbour_values)
+        weights = np.where(valid, weights, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimate = (weights * np.where(valid, neighbour_values, 0.0)).sum(axis=1) / weights.sum(axis=1)
+
+        if max_distance_km is not None:
+            estimate[distances[:, 0] > max_distance_km] = np.nan
+        result.ravel()[:] = estimate
+        return result
+
+    def nearest_values(self, lats, lngs, field, max_distance_km=None) -> np.ndarray:
+        """Value of a field at the nearest record for many points, None beyond the cutoff"""
+        lats = np.asarray(lats, dtype=float)
+        result = np.full(lats.shape, None, dtype=object)
+        if self.tree is None:
+            return result
+
+        chords, indices = self.tree.query(to_unit_vectors(lats.ravel(), np.ravel(lngs)), k=1)
+        values = self.values_at(field, indices)
+        if max_distance_km is not None:
+            values[chord_to_km(chords) > max_distance_km] = None
+        result.ravel()[:] = values
+        return result
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_spatial_index(name):
+    """Return the index for a registry dataset, rebuilding it when the dataset reloads
+
+    An ingested columnar copy (``datasets/<name>.columns``) takes precedence
+    over ``datasets/<name>.json``.
+    """
+    dataset = get_columnar_registry().get(name)
+    if dataset is None or dataset.error is not None:
+        dataset = get_dataset_registry().get(name)
+        if dataset is None or dataset.error is not None or not isinstance(dataset.data, list):
+            return None
+
+    with _indexes_lock:
+        cached = _indexes.get(name)
+        if cached is not None and cached[0] is dataset:
+            return cached[1]
+
+    if isinstance(dataset, ColumnarDataset):
+        try:
+            index = SpatialIndex.from_columnar(dataset)
+        except ValueError:
+            return None
+    else:
+        index = SpatialIndex(dataset.data)
+    with _indexes_lock:
+        _indexes[name] = (dataset, index)
+    return index
@@ -1,2 +1,230 @@
+import json
+import numpy as np
+from database.dataset_registry import get_dataset_registry
+from database.spatial_index import get_spatial_index
+from models.financial_model import DEFAULT_ASSUMPTIONS, simulate_project
+from models.pv_yield import predict_solar_yield
+from models.site_suitability import MAX_RESOURCE_DISTANCE_KM
+
+DEFAULT_SCENARIOS = 10000
+MAX_SCENARIOS = 100000
+
+# Largest sites x scenarios product accepted in one request
+MAX_SIMULATIONS = 20_000_000
+
+DEFAULT_CAPACITY_KW = 10.0
+
+# Costs, uncertainties and yearly rates that a project cannot have below zero
+NON_NEGATIVE_ASSUMPTIONS = (
+    'opex_per_kw_year', 'degradation', 'tariff_escalation_std', 'degradation_std',
+    'capex_uncertainty', 'om_uncertainty', 'yield_uncertainty'
+)
+
+# Dataset with located records whose ``location`` names match energy-costs.json
+LOCATED_DATASET = 'solar-irradiance'
+
+def tariff_table():
+    """Electricity price per kWh keyed by location name"""
+    dataset = get_dataset_registry().get('energy-costs')
+    if dataset is None or not isinstance(dataset.data, list):
+        return {}
+    return {
+        record['location']: float(record['cost_per_kwh'])
+        for record in dataset.data
+        if isinstance(record, dict) and record.get('location') and record.get('cost_per_kwh') is not None
+    }
+
+def site_tariffs(sites):
+    """Price per kWh and its source for each site
+
+    Uses the site's own ``cost_per_kwh``, then its ``location`` name, then the
+    name of the closest located record within range.
+    """
+    table = tariff_table()
+    tariffs = [None] * len(sites)
+    sources = [None] * len(sites)
+
+    needs_lookup = []
+    for i, site in enumerate(sites):
+        if site.get('cost_per_kwh') is not None:
+            tariffs[i], sources[i] = float(site['cost_per_kwh']), 'request'
+        elif site.get('location') in table:
+            tariffs[i], sources[i] = table[site['location']], 'dataset'
+        elif site.get('latitude') is not None and site.get('longitude') is not None:
+            needs_lookup.append(i)
+
+    index = get_spatial_index(LOCATED_DATASET)
+    if needs_lookup and index is not None:
+        names = index.nearest_values(
+            [sites[i]['latitude'] for i in needs_lookup],
+            [sites[i]['longitude'] for i in needs_lookup],
+            'location', max_distance_km=MAX_RESOURCE_DISTANCE_KM
+        )
+        for i, name in zip(needs_lookup, names):
+            if name in table:
+                tariffs[i], sources[i] = table[name], 'dataset'
+
+    return tariffs, sources
+
+def site_energy(sites):
+    """First-year energy (kWh) per site, simulating PV output where not given"""
+    energy = [None] * len(sites)
+    to_simulate = []
+    for i, site in enumerate(sites):
+        if site.get('annual_kwh') is not None:
+            energy[i] = float(site['annual_kwh'])
+        elif site.get('latitude') is not None and site.get('longitude') is not None:
+            to_simulate.append(i)
+
+    # Output scales with capacity, so sites sharing a PV config are simulated
+    # together per kWp and scaled afterwards
+    groups = {}
+    for i in to_simulate:
+        config = {k: v for k, v in (sites[i].get('config') or {}).items() if k != 'capacity_kw'}
+        groups.setdefault(json.dumps(config, sort_keys=True), []).append(i)
+
+    for key, members in groups.items():
+        results = predict_solar_yield([sites[i] for i in members], [dict(json.loads(key), capacity_kw=1.0)])
+        for i, result in zip(members, results):
+            if result.get('specific_yield_kwh_per_kwp') is not None:
+                energy[i] = result['specific_yield_kwh_per_kwp'] * sites[i]['capacity_kw']
+
+    return energy
+
+def parse_cost_sites(input_data):
+    """Sites from ``sites`` or the top-level fields, with numeric values checked
+
+    Every site must carry what its tariff and energy can be found from; whether
+    the lookups succeed is only known later.
+    """
+    if not isinstance(input_data, dict) or not input_data:
+        raise ValueError('The request body must be a JSON object describing a site or a list of sites')
+    sites = input_data.get('sites')
+    if sites is None:
+        sites = [input_data]
+    if not isinstance(sites, list) or not sites or not all(isinstance(site, dict) for site in sites):
+        raise ValueError('sites must be a non-empty list of objects')
+
+    parsed = []
+    for site in sites:
+        site = dict(site)
+        try:
+            for field in ('latitude', 'longitude', 'annual_kwh', 'cost_per_kwh'):
+                if site.get(field) is not None:
+                    site[field] = float(site[field])
+            site['capacity_kw'] = float(site.get('capacity_kw', DEFAULT_CAPACITY_KW))
+        except (TypeError, ValueError):
+            raise ValueError('Site values must be numeric')
+        if not all(np.isfinite(value) for value in site.values() if isinstance(value, float)):
+            raise ValueError('Site values must be finite')
+        if site['capacity_kw'] <= 0:
+            raise ValueError('capacity_kw must be positive')
+        if site.get('annual_kwh') is not None and site['annual_kwh'] < 0:
+            raise ValueError('annual_kwh must not be negative')
+        if site.get('cost_per_kwh') is not None and site['cost_per_kwh'] < 0:
+            raise ValueError('cost_per_kwh must not be negative')
+        if (site.get('latitude') is None) != (site.get('longitude') is None):
+            raise ValueError('Sites need both latitude and longitude')
+        if site.get('latitude') is not None and (abs(site['latitude']) > 90 or abs(site['longitude']) > 180):
+            raise ValueError('Coordinates out of range')
+        if site.get('cost_per_kwh') is None and not site.get('location') and site.get('latitude') is None:
+            raise ValueError('Each site needs cost_per_kwh, a location or coordinates for its tariff')
+        if site.get('annual_kwh') is None and site.get('latitude') is None:
+            raise ValueError('Each site needs annual_kwh or coordinates for its energy estimate')
+        parsed.append(site)
+    return parsed
+
+def parse_assumptions(overrides):
+    if not isinstance(overrides, dict):
+        raise ValueError('assumptions must be an object')
+    unknown = set(overrides) - set(DEFAULT_ASSUMPTIONS)
+    if unknown:
+        raise ValueError(f'Unknown assumptions: {", ".join(sorted(unknown))}')
+    try:
+        assumptions = {key: float(value) for key, value in dict(DEFAULT_ASSUMPTIONS, **overrides).items()}
+    except (TypeError, ValueError):
+        raise ValueError('Assumptions must be numeric')
+    if not all(np.isfinite(value) for value in assumptions.values()):
+        raise ValueError('Assumptions must be finite')
+    assumptions['lifetime_years'] = int(assumptions['lifetime_years'])
+    if not 1 <= assumptions['lifetime_years'] <= 50:
+        raise ValueError('lifetime_years must be between 1 and 50')
+    if assumptions['capex_per_kw'] <= 0:
+        raise ValueError('capex_per_kw must be positive')
+    for key in ('discount_rate', 'tariff_escalation', 'om_escalation'):
+        if assumptions[key] <= -1:
+            raise ValueError(f'{key} must be greater than -1')
+    for key in NON_NEGATIVE_ASSUMPTIONS:
+        if assumptions[key] < 0:
+            raise ValueError(f'{key} must not be negative')
+    return assumptions
+
+def site_assumption_sets(input_data, sites):
+    """Assumptions per site: the request-wide overrides refined by each site's own"""
+    shared = input_data.get('assumptions') or {}
+    if not isinstance(shared, dict):
+        raise ValueError('assumptions must be an object')
+    site_assumptions = []
+    for site in sites:
+        own = site.get('assumptions') or {}
+        if not isinstance(own, dict):
+            raise ValueError('assumptions must be an object')
+        site_assumptions.append(parse_assumptions(dict(shared, **own)))
+    return site_assumptions
+
 def estimate_savings(input_data):
-    return {'roi': 10.5, 'savings': 20000}  # Placeholder model logic
\ No newline at end of file
+    """Monte Carlo financial appraisal for one site or a batch of sites
+
+    Each site needs a tariff (``cost_per_kwh``, a known ``location`` or
+    coordinates near one) and energy (``annual_kwh`` or coordinates for a PV
+    simulation of ``capacity_kw``). ``assumptions`` override the defaults for
+    every site and may be refined per site. A single site returns one result
+    object and raises ValueError when no tariff or energy is found for it; a
+    batch returns a list with an ``error`` entry for such sites.
+    """
+    sites = parse_cost_sites(input_data)
+
+    try:
+        scenarios = int(input_data.get('scenarios', DEFAULT_SCENARIOS))
+    except (TypeError, ValueError):
+        raise ValueError('scenarios must be an integer')
+    if not 100 <= scenarios <= MAX_SCENARIOS:
+        raise ValueError(f'scenarios must be between 100 and {MAX_SCENARIOS}')
+    if len(sites) * scenarios > MAX_SIMULATIONS:
+        raise ValueError(f'At most {MAX_SIMULATIONS} site x scenario simulations per request')
+
+    site_assumptions = site_assumption_sets(input_data, sites)
+
+    seed = input_data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError('seed must be a non-negative integer')
+
+    tariffs, tariff_sources = site_tariffs(sites)
+    energy = site_energy(sites)
+    rng = np.random.default_rng(seed)
+
+    results = []
+    for i, site in enumerate(sites):
+        if tariffs[i] is None:
+            results.append({'site': i, 'error': 'No tariff for this site; pass cost_per_kwh or location'})
+            continue
+        if energy[i] is None:
+            results.append({'site': i, 'error': 'No energy estimate for this site; pass annual_kwh'})
+            continue
+
+        result = simulate_project(energy[i], site['capacity_kw'], tariffs[i], site_assumptions[i], scenarios, rng)
+        results.append(dict(
+            result,
+            site=i,
+            cost_per_kwh=tariffs[i],
+            tariff_source=tariff_sources[i],
+            annual_kwh=round(energy[i], 2),
+            capacity_kw=site['capacity_kw'],
+            scenarios=scenarios
+        ))
+
+    if input_data.get('sites') is None:
+        if 'error' in results[0]:
+            raise ValueError(results[0]['error'])
+        return results[0]
+    return results
@@ -1,2 +1,81 @@
+import math
+from models.pv_yield import predict_solar_yield
+from models.raster_terrain import site_roughness
+from models.terrain_metrics import classify_roughness
+from models.wind_yield import DEFAULT_TURBINE, predict_wind_yield
+
+# Largest site x config product accepted in one request
+MAX_COMBINATIONS = 5000
+
+# Hourly series are only returned for small requests
+MAX_HOURLY_COMBINATIONS = 10
+
+def parse_sites(input_data):
+    """Sites from ``sites`` or from a single top-level latitude/longitude"""
+    sites = input_data.get('sites')
+    if sites is None:
+        sites = [input_data]
+    if not isinstance(sites, list) or not sites:
+        raise ValueError('sites must be a non-empty list')
+
+    parsed = []
+    for site in sites:
+        try:
+            lat = float(site['latitude'])
+            lng = float(site['longitude'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Each site needs numeric latitude and longitude')
+        if abs(lat) > 90 or abs(lng) > 180:
+            raise ValueError('Coordinates out of range')
+        parsed.append(dict(site, latitude=lat, longitude=lng))
+    return parsed
+
+def terrain_roughness(sites):
+    """Roughness class per site, from the request or the local DEM
+
+    Sites outside DEM coverage get None, which the wind model treats as Medium.
+    """
+    classes = [site.get('roughness') for site in sites]
+    missing = [i for i, site in enumerate(sites) if classes[i] is None and site.get('roughness_length') is None]
+    if missing:
+        roughness = site_roughness([sites[i]['latitude'] for i in missing], [sites[i]['longitude'] for i in missing])
+        for i, value in zip(missing, roughness.tolist()):
+            if not math.isnan(value):
+                classes[i] = classify_roughness(value)
+    return classes
+
 def predict_energy(input_data):
-    return {'solar_output': 5000, 'wind_output': 3000}  # Placeholder model logic
\ No newline at end of file
+    """Predict annual energy output for one site or a batch of sites
+
+    Solar is simulated for every site x PV config and wind for every site x
+    turbine. A single site with a single config (or turbine) returns
+    ``solar_output`` (``wind_output``) as a number in kWh/year; batches
+    return one entry per combination, site-major.
+    """
+    input_data = input_data or {}
+    sites = parse_sites(input_data)
+    configs = input_data.get('configs') or [input_data.get('config', {})]
+    if not isinstance(configs, list) or not all(isinstance(c, dict) for c in configs):
+        raise ValueError('configs must be a list of objects')
+    if len(sites) * len(configs) > MAX_COMBINATIONS:
+        raise ValueError(f'At most {MAX_COMBINATIONS} site/config combinations per request')
+
+    include_hourly = bool(input_data.get('include_hourly'))
+    if include_hourly and len(sites) * len(configs) > MAX_HOURLY_COMBINATIONS:
+        raise ValueError(f'include_hourly is limited to {MAX_HOURLY_COMBINATIONS} combinations')
+
+    turbines = input_data.get('turbines') or [DEFAULT_TURBINE]
+    if not isinstance(turbines, list) or len(sites) * len(turbines) > MAX_COMBINATIONS:
+        raise ValueError(f'turbines must be a list of at most {MAX_COMBINATIONS} site/turbine combinations')
+
+    solar_results = predict_solar_yield(sites, configs, include_hourly)
+    wind_results = predict_wind_yield(sites, turbines, terrain_roughness(sites))
+
+    return {
+        'solar_output': solar_results[0].get('annual_kwh') if len(solar_results) == 1
+        else [result.get('annual_kwh') for result in solar_results],
+        'wind_output': wind_results[0].get('aep_kwh') if len(wind_results) == 1
+        else [result.get('aep_kwh') for result in wind_results],
+        'solar_results': solar_results,
+        'wind_results': wind_results
+    }
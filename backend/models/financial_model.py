@@ -0,0 +1,127 @@
+import numpy as np
+from typing import Dict
+
+# Default project assumptions; each can be overridden per request
+DEFAULT_ASSUMPTIONS = {
+    'capex_per_kw': 1000.0,          # USD per kW installed
+    'opex_per_kw_year': 17.0,        # USD per kW per year
+    'lifetime_years': 25,
+    'discount_rate': 0.07,
+    'tariff_escalation': 0.02,       # mean yearly tariff growth
+    'tariff_escalation_std': 0.01,
+    'degradation': 0.005,            # mean yearly output loss
+    'degradation_std': 0.0015,
+    'om_escalation': 0.025,
+    'capex_uncertainty': 0.10,       # relative standard deviation
+    'om_uncertainty': 0.15,
+    'yield_uncertainty': 0.05
+}
+
+PERCENTILES = [5, 10, 50, 90, 95]
+
+# Bisection steps for IRR; 60 halvings of the bracket are far below a basis point
+IRR_ITERATIONS = 60
+IRR_BOUNDS = (-0.99, 1.0)
+
+def sample_scenarios(rng: np.random.Generator, scenarios: int, assumptions: Dict) -> Dict[str, np.ndarray]:
+    """Draw the uncertain inputs for every scenario"""
+    return {
+        'capex_factor': np.maximum(1 + assumptions['capex_uncertainty'] * rng.standard_normal(scenarios), 0.1),
+        'om_factor': np.maximum(1 + assumptions['om_uncertainty'] * rng.standard_normal(scenarios), 0.0),
+        'yield_factor': np.maximum(1 + assumptions['yield_uncertainty'] * rng.standard_normal(scenarios), 0.0),
+        'tariff_escalation': assumptions['tariff_escalation']
+        + assumptions['tariff_escalation_std'] * rng.standard_normal(scenarios),
+        'degradation': np.clip(
+            assumptions['degradation'] + assumptions['degradation_std'] * rng.standard_normal(scenarios), 0, 0.05
+        )
+    }
+
+def cash_flows(annual_kwh: float, capacity_kw: float, tariff: float, samples: Dict[str, np.ndarray],
+               assumptions: Dict):
+    """Upfront cost and yearly energy, O&M and net cash flow as (scenarios, years) arrays"""
+    years = np.arange(int(assumptions['lifetime_years']))  # 0 = first operating year
+
+    capex = capacity_kw * assumptions['capex_per_kw'] * samples['capex_factor']
+    energy = (annual_kwh * samples['yield_factor'])[:, None] * (1 - samples['degradation'][:, None]) ** years
+    tariffs = tariff * (1 + samples['tariff_escalation'][:, None]) ** years
+    om = (capacity_kw * assumptions['opex_per_kw_year'] * samples['om_factor'])[:, None] \
+        * (1 + assumptions['om_escalation']) ** years
+
+    return capex, energy, om, energy * tariffs - om
+
+def irr(capex: np.ndarray, cash: np.ndarray) -> np.ndarray:
+    """Internal rate of return per scenario by vectorized bisection, NaN without a root"""
+    columns = np.ascontiguousarray(cash.T[::-1])  # last year first, for Horner's rule
+    low = np.full(len(capex), IRR_BOUNDS[0])
+    high = np.full(len(capex), IRR_BOUNDS[1])
+
+    def npv_at(rate):
+        # Sum of cash_t / (1 + rate)^t as a polynomial in 1 / (1 + rate)
+        factor = 1 / (1 + rate)
+        total = np.zeros_like(rate)
+        for column in columns:
+            total += column
+            total *= factor
+        return total - capex
+
+    npv_low = npv_at(low)
+    has_root = np.sign(npv_low) != np.sign(npv_at(high))
+    for _ in range(IRR_ITERATIONS):
+        mid = (low + high) / 2
+        npv_mid = npv_at(mid)
+        same_side = np.sign(npv_mid) == np.sign(npv_low)
+        low = np.where(same_side, mid, low)
+        npv_low = np.where(same_side, npv_mid, npv_low)
+        high = np.where(same_side, high, mid)
+
+    return np.where(has_root, (low + high) / 2, np.nan)
+
+def payback_years(capex: np.ndarray, cash: np.ndarray) -> np.ndarray:
+    """Undiscounted payback with linear interpolation inside the year, inf if never reached"""
+    cumulative = np.cumsum(cash, axis=1)
+    reached = cumulative >= capex[:, None]
+    first = np.argmax(reached, axis=1)
+    rows = np.arange(len(capex))
+
+    before = np.where(first > 0, cumulative[rows, first - 1], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = (capex - before) / cash[rows, first]
+    payback = first + np.clip(fraction, 0, 1)
+    return np.where(reached.any(axis=1), payback, np.inf)
+
+def summarize(values: np.ndarray, digits: int = 2) -> Dict:
+    """Mean and percentile bands of the finite values"""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return {'mean': None, **{f'p{p}': None for p in PERCENTILES}}
+    bands = np.percentile(finite, PERCENTILES)
+    return {
+        'mean': round(float(finite.mean()), digits),
+        **{f'p{p}': round(float(v), digits) for p, v in zip(PERCENTILES, bands)}
+    }
+
+def simulate_project(annual_kwh: float, capacity_kw: float, tariff: float, assumptions: Dict,
+                     scenarios: int, rng: np.random.Generator) -> Dict:
+    """Monte Carlo NPV, IRR, LCOE and payback for one project"""
+    samples = sample_scenarios(rng, scenarios, assumptions)
+    capex, energy, om, cash = cash_flows(annual_kwh, capacity_kw, tariff, samples, assumptions)
+
+    discount = (1 + assumptions['discount_rate']) ** -np.arange(1, cash.shape[1] + 1)
+    npv = cash @ discount - capex
+    with np.errstate(invalid='ignore', divide='ignore'):
+        lcoe = (capex + om @ discount) / (energy @ discount)
+    project_irr = irr(capex, cash)
+    payback = payback_years(capex, cash)
+    lifetime_gain = cash.sum(axis=1) - capex
+
+    return {
+        'npv': summarize(npv),
+        'irr': summarize(project_irr, 4),
+        'lcoe': summarize(lcoe, 4),
+        'payback_years': summarize(payback),
+        'probability_npv_positive': round(float((npv > 0).mean()), 4),
+        'probability_no_payback': round(float(np.isinf(payback).mean()), 4),
+        'first_year_savings': summarize(cash[:, 0]),
+        'roi': round(float(np.median(lifetime_gain / capex) * 100), 2),
+        'savings': round(float(np.median(cash[:, 0])), 2)
+    }
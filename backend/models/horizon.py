@@ -0,0 +1,211 @@
+import os
+import numpy as np
+from typing import Dict, List, Optional
+from models.pv_yield import MONTH_START_HOURS, solar_position, split_irradiance
+from models.raster_terrain import load_site_windows
+from utils.cache import get_cache
+
+# Directions the horizon is traced in, evenly spaced clockwise from north
+HORIZON_AZIMUTHS = int(os.environ.get('HORIZON_AZIMUTHS', 72))
+
+# DEM cells each ray covers (about 6 km at 30 m); distant ridges beyond this are ignored
+HORIZON_RADIUS_CELLS = int(os.environ.get('HORIZON_RADIUS_CELLS', 200))
+
+# Ray samples at every cell up to NEAR_STEPS, then FAR_STEPS geometrically spaced ones
+NEAR_STEPS = 32
+FAR_STEPS = 48
+
+# Height of the modules above the ground, meters
+OBSERVER_HEIGHT_M = 1.5
+
+# Earth curvature with standard atmospheric refraction
+EARTH_RADIUS_M = 6371000.0
+REFRACTION_COEFFICIENT = 0.13
+
+# Clearness index of the reference year used to weight beam and diffuse losses
+REFERENCE_CLEARNESS = 0.55
+
+# Sites whose DEM windows are ray-marched together, bounds peak memory
+HORIZON_CHUNK_SITES = 32
+
+horizon_cache = get_cache('horizon', ttl=30 * 24 * 3600, max_entries=4096, precision=3)
+
+def horizon_azimuths(count: int = HORIZON_AZIMUTHS) -> np.ndarray:
+    return np.arange(count) * (360.0 / count)
+
+def march_steps(radius: int) -> np.ndarray:
+    """Distances in cells sampled along a ray
+
+    Every cell close to the site, then steps growing with distance: far terrain
+    subtends a small angle, so sparse samples there change the horizon little.
+    """
+    near = np.arange(1, min(NEAR_STEPS, radius) + 1)
+    if radius <= NEAR_STEPS:
+        return near.astype(float)
+    far = np.geomspace(NEAR_STEPS, radius, FAR_STEPS)[1:]
+    return np.unique(np.concatenate((near, np.round(far)))).astype(float)
+
+def trace_horizons(dems: np.ndarray, cell_x: np.ndarray, cell_y: np.ndarray,
+                   azimuths: np.ndarray) -> np.ndarray:
+    """Horizon elevation angle (degrees) seen from the centre of each DEM window
+
+    ``dems`` is a (sites, size, size) stack of void-free windows, north row
+    first, with per-site cell sizes in meters. Every azimuth is marched out
+    along ``march_steps`` and the steepest angle to the terrain, corrected for
+    earth curvature, is kept. Returns a (sites, azimuths) array.
+    """
+    sites, size, _ = dems.shape
+    radius = size // 2
+    step = np.minimum(cell_x, cell_y)[:, None, None]
+    distances = step * march_steps(radius)[None, None, :]  # (sites, 1, steps)
+
+    azimuth_rad = np.radians(azimuths)[None, :, None]
+    rows = radius - distances * np.cos(azimuth_rad) / cell_y[:, None, None]
+    cols = radius + distances * np.sin(azimuth_rad) / cell_x[:, None, None]
+    terrain = bilinear_sample(dems, rows, cols)
+    observer = dems[:, radius, radius][:, None, None] + OBSERVER_HEIGHT_M
+    drop = distances ** 2 * (1 - REFRACTION_COEFFICIENT) / (2 * EARTH_RADIUS_M)
+    angles = np.degrees(np.arctan2(terrain - drop - observer, distances))
+    return angles.max(axis=2)
+
+def bilinear_sample(dems: np.ndarray, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """Interpolate each site's window at fractional (row, col) positions of shape (sites, ...)"""
+    sites, size, _ = dems.shape
+    rows = np.clip(rows, 0, size - 1)
+    cols = np.clip(cols, 0, size - 1)
+    row0 = np.minimum(rows.astype(np.int64), size - 2)
+    col0 = np.minimum(cols.astype(np.int64), size - 2)
+    row_frac = rows - row0
+    col_frac = cols - col0
+
+    flat = dems.reshape(-1)
+    index = np.arange(sites).reshape((sites,) + (1,) * (rows.ndim - 1)) * size * size + row0 * size + col0
+    top = flat[index] * (1 - col_frac) + flat[index + 1] * col_frac
+    bottom = flat[index + size] * (1 - col_frac) + flat[index + size + 1] * col_frac
+    return top * (1 - row_frac) + bottom * row_frac
+
+def horizon_at(horizons: np.ndarray, sun_azimuth: np.ndarray) -> np.ndarray:
+    """Horizon elevation in the direction of the sun, interpolated between traced azimuths
+
+    ``horizons`` is (sites, azimuths) and ``sun_azimuth`` (sites, hours).
+    """
+    count = horizons.shape[1]
+    position = sun_azimuth * (count / 360.0)
+    lower = np.floor(position).astype(np.int64) % count
+    fraction = position - np.floor(position)
+    return (np.take_along_axis(horizons, lower, axis=1) * (1 - fraction)
+            + np.take_along_axis(horizons, (lower + 1) % count, axis=1) * fraction)
+
+def sky_view_factors(horizons: np.ndarray) -> np.ndarray:
+    """Fraction of the isotropic diffuse sky a horizontal surface still sees"""
+    return np.mean(np.cos(np.radians(np.clip(horizons, 0, 90))) ** 2, axis=1)
+
+def hourly_shading_loss(lats, horizons: np.ndarray):
+    """Fraction of horizontal irradiance lost to terrain for every hour of the year
+
+    Beam irradiance is lost while the sun is below the horizon line and diffuse
+    irradiance in proportion to the obstructed sky. Returns the (sites, 8760)
+    loss fractions and the reference GHI they apply to, so callers can weight
+    them into monthly or annual figures.
+    """
+    cos_zenith, sun_azimuth, extraterrestrial = solar_position(lats)
+    horizontal_extra = extraterrestrial * np.maximum(cos_zenith, 0)
+    ghi, dni, dhi = split_irradiance(np.full(cos_zenith.shape, REFERENCE_CLEARNESS), cos_zenith, horizontal_extra)
+
+    sun_elevation = np.degrees(np.arcsin(cos_zenith))
+    blocked = sun_elevation < horizon_at(horizons, sun_azimuth)
+    lost = np.where(blocked, dni * np.maximum(cos_zenith, 0), 0.0)
+    lost += dhi * (1 - sky_view_factors(horizons))[:, None]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        loss = np.where(ghi > 0, np.minimum(lost / ghi, 1.0), 0.0)
+    return loss, ghi
+
+def summarize_shading(loss: np.ndarray, ghi: np.ndarray) -> Dict[str, np.ndarray]:
+    """Irradiance-weighted annual, monthly and month x hour-of-day losses"""
+    lost = loss * ghi
+    with np.errstate(invalid='ignore', divide='ignore'):
+        annual = lost.sum(axis=1) / ghi.sum(axis=1)
+        monthly = np.add.reduceat(lost, MONTH_START_HOURS, axis=1) / np.add.reduceat(ghi, MONTH_START_HOURS, axis=1)
+
+        # Hours are day-major, so months can be summed over whole days
+        month_start_days = MONTH_START_HOURS // 24
+        lost_by_hour = np.add.reduceat(lost.reshape(len(loss), -1, 24), month_start_days, axis=1)
+        ghi_by_hour = np.add.reduceat(ghi.reshape(len(ghi), -1, 24), month_start_days, axis=1)
+        profile = np.where(ghi_by_hour > 0, lost_by_hour / ghi_by_hour, 0.0)
+
+    return {
+        'annual': np.nan_to_num(annual),
+        'monthly': np.nan_to_num(monthly),
+        'profile': profile
+    }
+
+def load_windows(lats: np.ndarray, lngs: np.ndarray, radius_cells: int):
+    """DEM windows of the sites that have one: ``(indices, dems, cell_x, cell_y)``"""
+    indices, dems, cell_x, cell_y = load_site_windows(lats, lngs, radius_cells)
+    return indices.tolist(), dems, cell_x, cell_y
+
+def compute_horizons(lats: np.ndarray, lngs: np.ndarray, radius_cells: int = HORIZON_RADIUS_CELLS,
+                     azimuth_count: int = HORIZON_AZIMUTHS) -> List[Optional[Dict]]:
+    """Horizon profile and shading summary per site, None where no local DEM covers it"""
+    results = [None] * len(lats)
+    azimuths = horizon_azimuths(azimuth_count)
+
+    for start in range(0, len(lats), HORIZON_CHUNK_SITES):
+        chunk_lats = lats[start:start + HORIZON_CHUNK_SITES]
+        indices, dems, cell_x, cell_y = load_windows(chunk_lats, lngs[start:start + HORIZON_CHUNK_SITES], radius_cells)
+        if not indices:
+            continue
+
+        horizons = trace_horizons(dems, cell_x, cell_y, azimuths)
+        summary = summarize_shading(*hourly_shading_loss(chunk_lats[indices], horizons))
+        sky_view = sky_view_factors(horizons)
+
+        for row, i in enumerate(indices):
+            results[start + i] = {
+                'azimuths': azimuths.tolist(),
+                'elevations': np.round(horizons[row], 2).tolist(),
+                'sky_view_factor': round(float(sky_view[row]), 4),
+                'annual_loss': round(float(summary['annual'][row]), 4),
+                'monthly_loss': np.round(summary['monthly'][row], 4).tolist(),
+                'hourly_loss_profile': np.round(summary['profile'][row], 4).tolist()
+            }
+
+    return results
+
+def site_horizons(lats, lngs) -> List[Optional[Dict]]:
+    """Cached horizon analysis per site, computed at the cache's quantized coordinates
+
+    Sites sharing a quantized location share one entry; misses are computed
+    together so the ray marching stays vectorized.
+    """
+    keys = [horizon_cache.make_key(lat, lng) for lat, lng in zip(lats, lngs)]
+    results = [None] * len(keys)
+    missing = {}
+    for i, key in enumerate(keys):
+        hit, value = horizon_cache.get(key)
+        if hit:
+            results[i] = value
+        else:
+            missing.setdefault(key, []).append(i)
+
+    if missing:
+        points = np.array([horizon_cache.quantize(lats[group[0]], lngs[group[0]]) for group in missing.values()])
+        computed = compute_horizons(points[:, 0], points[:, 1])
+        for (key, group), value in zip(missing.items(), computed):
+            if value is not None:
+                horizon_cache.set(key, value)
+            for i in group:
+                results[i] = value
+
+    return results
+
+def hourly_site_shading(lat: float, lng: float) -> Optional[np.ndarray]:
+    """Loss fraction for each of the 8760 hours at one site, None without a local DEM"""
+    point = np.array([horizon_cache.quantize(lat, lng)])
+    indices, dems, cell_x, cell_y = load_windows(point[:, 0], point[:, 1], HORIZON_RADIUS_CELLS)
+    if not indices:
+        return None
+    horizons = trace_horizons(dems, cell_x, cell_y, horizon_azimuths())
+    loss, _ = hourly_shading_loss(point[:, 0], horizons)
+    return np.round(loss[0], 4)
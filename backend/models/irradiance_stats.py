@@ -0,0 +1,111 @@
+import numpy as np
+from typing import Dict, List
+from database.irradiance_store import HourlySeries
+
+# Hourly means of power or irradiance; their hourly values add up to energy
+ENERGY_FIELDS = {'P', 'G(i)', 'Gb(i)', 'Gd(i)', 'Gr(i)'}
+
+FIELD_UNITS = {
+    'P': 'W',
+    'G(i)': 'W/m2',
+    'Gb(i)': 'W/m2',
+    'Gd(i)': 'W/m2',
+    'Gr(i)': 'W/m2',
+    'H_sun': 'degrees',
+    'T2m': 'C',
+    'WS10m': 'm/s'
+}
+
+STATS = ('sum', 'mean', 'min', 'max')
+
+def default_stat(field) -> str:
+    return 'sum' if field in ENERGY_FIELDS else 'mean'
+
+def aggregate_unit(field, stat) -> str:
+    """Energy sums are reported in kWh (per m² for irradiance), everything else as measured"""
+    if stat == 'sum' and field in ENERGY_FIELDS:
+        return 'kWh' if field == 'P' else 'kWh/m2'
+    return FIELD_UNITS.get(field, '')
+
+def group_reduce(values: np.ndarray, groups: np.ndarray, stat: str):
+    """Reduce consecutive runs of equal ``groups``; returns the group labels and results"""
+    if stat not in STATS:
+        raise ValueError(f'stat must be one of {", ".join(STATS)}')
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    values = values.astype(float)
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+
+    if stat in ('sum', 'mean'):
+        totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        result = totals if stat == 'sum' else totals / np.maximum(counts, 1)
+    elif stat == 'min':
+        result = np.minimum.reduceat(np.where(valid, values, np.inf), starts)
+    else:
+        result = np.maximum.reduceat(np.where(valid, values, -np.inf), starts)
+    return groups[starts], np.where(counts > 0, result, np.nan)
+
+def scale(values: np.ndarray, field, stat) -> np.ndarray:
+    return values / 1000.0 if stat == 'sum' and field in ENERGY_FIELDS else values
+
+def to_list(values: np.ndarray, decimals: int = 3) -> List:
+    """Rounded floats with NaN as None"""
+    return [None if np.isnan(value) else value for value in np.round(values, decimals).tolist()]
+
+def daily_aggregates(series: HourlySeries, field: str, stat: str) -> Dict:
+    days, values = group_reduce(series.field(field), series.calendar()['day'], stat)
+    return {'dates': [str(day) for day in days], 'values': np.round(scale(values, field, stat), 3)}
+
+def monthly_aggregates(series: HourlySeries, field: str, stat: str) -> Dict:
+    months, values = group_reduce(series.field(field), series.calendar()['month'], stat)
+    return {'months': [str(month) for month in months], 'values': np.round(scale(values, field, stat), 3)}
+
+def series_percentiles(series: HourlySeries, field: str, percentiles: List[float],
+                       period: str = 'daily', stat: str = None) -> Dict:
+    """Percentiles of the hourly values, or of their daily aggregates
+
+    The ``daylight`` period takes only hours with the sun above the horizon,
+    which keeps night-time zeros out of irradiance distributions.
+    """
+    stat = stat or default_stat(field)
+    if period == 'daily':
+        values = scale(group_reduce(series.field(field), series.calendar()['day'], stat)[1], field, stat)
+    elif period == 'hourly':
+        values = np.asarray(series.field(field), dtype=float)
+    elif period == 'daylight':
+        if 'H_sun' not in series.fields:
+            raise ValueError('The series has no sun height to select daylight hours')
+        values = np.asarray(series.field(field), dtype=float)[np.asarray(series.field('H_sun')) > 0]
+    else:
+        raise ValueError('period must be hourly, daylight or daily')
+
+    values = values[~np.isnan(values)]
+    if not len(values):
+        raise LookupError(f'No {field} values to summarize')
+    return {
+        'period': period,
+        'count': int(len(values)),
+        'percentiles': {f'p{q:g}': value for q, value in zip(percentiles, to_list(np.percentile(values, percentiles)))}
+    }
+
+def typical_day_profiles(series: HourlySeries, field: str) -> Dict:
+    """Mean value at each UTC hour of the day, per calendar month (12 x 24)"""
+    calendar = series.calendar()
+    month_of_year = calendar['month'].astype(np.int64) % 12
+    cells = month_of_year * 24 + calendar['hour']
+
+    values = np.asarray(series.field(field), dtype=float)
+    valid = ~np.isnan(values)
+    totals = np.bincount(cells[valid], weights=values[valid], minlength=12 * 24)
+    counts = np.bincount(cells[valid], minlength=12 * 24)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        profiles = (totals / counts).reshape(12, 24)
+    return {'hour_of_day': list(range(24)), 'profiles': np.round(profiles, 3)}
+
+def monthly_irradiation_records(series: HourlySeries) -> List[Dict]:
+    """Monthly in-plane irradiation in the PVGIS ``H(i)_m`` form (kWh/m²/month)"""
+    months, values = group_reduce(series.field('G(i)'), series.calendar()['month'], 'sum')
+    return [
+        {'year': int(str(month)[:4]), 'month': int(str(month)[5:7]), 'H(i)_m': round(float(value) / 1000.0, 2)}
+        for month, value in zip(months, values) if not np.isnan(value)
+    ]
@@ -0,0 +1,161 @@
+import os
+import numpy as np
+from models.cost_savings import estimate_savings, parse_cost_sites, site_assumption_sets
+from models.energy_prediction import MAX_COMBINATIONS, parse_sites, predict_energy
+from models.pv_yield import check_configs, check_irradiance_inputs
+from models.site_ranking import (
+    grid_chunks, grid_shape, parse_ranking_area, parse_ranking_options, parse_ranking_spacing, rank_sites
+)
+from models.terrain_metrics import (
+    analyze_terrain_batch, fetch_elevation_batch, parse_batch_coordinates, parse_batch_include
+)
+from models.wind_yield import DEFAULT_TURBINE, check_wind_sites, parse_turbines
+from utils.jobs import JobType
+
+# Largest inputs a job may cover; synchronous endpoints keep their own, lower limits.
+# Terrain results (about 1-3 KB a point) are merged in the server process before
+# they are written, so the point limit also bounds the server's memory.
+JOB_MAX_POINTS = int(os.environ.get('JOB_MAX_POINTS', 100_000))
+JOB_MAX_SITES = int(os.environ.get('JOB_MAX_SITES', 100_000))
+JOB_MAX_CANDIDATES = int(os.environ.get('JOB_MAX_CANDIDATES', 50_000_000))
+
+# Work handed to a worker at a time
+TERRAIN_CHUNK_POINTS = 2000
+SITE_CHUNK_SIZE = 250
+RANKING_CHUNK_CANDIDATES = 200_000
+
+def split(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def offset_sites(results, offset):
+    """Renumber the ``site`` field of a chunk's results to positions in the whole job"""
+    return [dict(result, site=result['site'] + offset) for result in results]
+
+def plan_terrain(params):
+    lats, lngs = parse_batch_coordinates(params, JOB_MAX_POINTS)
+    include_horizon = 'horizon' in parse_batch_include(params, max_horizon_points=None)
+    # Elevations are looked up here, in the server process, so remote lookups share its
+    # rate limiter; each worker would otherwise call OpenTopoData at the full rate
+    elevations = fetch_elevation_batch(lats, lngs)
+    chunks = [
+        (lats[i:i + TERRAIN_CHUNK_POINTS].tolist(), lngs[i:i + TERRAIN_CHUNK_POINTS].tolist(),
+         elevations[i:i + TERRAIN_CHUNK_POINTS], include_horizon)
+        for i in range(0, len(lats), TERRAIN_CHUNK_POINTS)
+    ]
+    return chunks, {}
+
+def run_terrain(chunk):
+    lats, lngs, elevations, include_horizon = chunk
+    return {
+        'locations': [[lat, lng] for lat, lng in zip(lats, lngs)],
+        'results': analyze_terrain_batch(lats, lngs, elevations, include_horizon=include_horizon)
+    }
+
+def merge_terrain(partials, context):
+    locations = [location for partial in partials for location in partial['locations']]
+    return {
+        'count': len(locations),
+        'locations': locations,
+        'results': [result for partial in partials for result in partial['results']]
+    }
+
+def plan_energy(params):
+    sites = parse_sites(params)
+    if len(sites) > JOB_MAX_SITES:
+        raise ValueError(f'Too many sites, the limit is {JOB_MAX_SITES}')
+    if params.get('include_hourly'):
+        raise ValueError('include_hourly is not available for jobs')
+    configs = params.get('configs') or [params.get('config', {})]
+    if not isinstance(configs, list) or not all(isinstance(config, dict) for config in configs):
+        raise ValueError('configs must be a list of objects')
+    check_configs(configs)
+    check_irradiance_inputs(sites)
+    turbines = parse_turbines(params.get('turbines') or [DEFAULT_TURBINE])
+    check_wind_sites(sites)
+    # Keep every chunk within the synchronous endpoint's combination limit
+    size = max(1, min(SITE_CHUNK_SIZE, MAX_COMBINATIONS // max(len(configs), len(turbines), 1)))
+    chunks = [(dict(params, sites=chunk), offset) for chunk, offset in zip(split(sites, size), range(0, len(sites), size))]
+    return chunks, {}
+
+def run_energy(chunk):
+    params, offset = chunk
+    prediction = predict_energy(params)
+    return {
+        'solar_results': offset_sites(prediction['solar_results'], offset),
+        'wind_results': offset_sites(prediction['wind_results'], offset)
+    }
+
+def merge_energy(partials, context):
+    solar_results = [result for partial in partials for result in partial['solar_results']]
+    wind_results = [result for partial in partials for result in partial['wind_results']]
+    return {
+        'solar_output': [result.get('annual_kwh') for result in solar_results],
+        'wind_output': [result.get('aep_kwh') for result in wind_results],
+        'solar_results': solar_results,
+        'wind_results': wind_results
+    }
+
+def plan_cost(params):
+    if params.get('sites') is None:
+        raise ValueError('Cost jobs take a sites list')
+    sites = parse_cost_sites(params)
+    if len(sites) > JOB_MAX_SITES:
+        raise ValueError(f'Too many sites, the limit is {JOB_MAX_SITES}')
+    site_assumption_sets(params, sites)
+    seed = params.get('seed')
+    chunks = []
+    for index, offset in enumerate(range(0, len(sites), SITE_CHUNK_SIZE)):
+        chunk = dict(params, sites=params['sites'][offset:offset + SITE_CHUNK_SIZE])
+        if isinstance(seed, int) and not isinstance(seed, bool):
+            # Each chunk draws its own stream, so results do not depend on scheduling
+            chunk['seed'] = seed + index
+        chunks.append((chunk, offset))
+    return chunks, {}
+
+def run_cost(chunk):
+    params, offset = chunk
+    return offset_sites(estimate_savings(params), offset)
+
+def merge_cost(partials, context):
+    return {'results': [result for partial in partials for result in partial]}
+
+def plan_ranking(params):
+    source, bbox, _, _ = parse_ranking_area(params)
+    if source != 'grid':
+        raise ValueError('Ranking jobs only scan grids')
+    spacing = parse_ranking_spacing(params, bbox, JOB_MAX_CANDIDATES)
+    k, weights, constraints = parse_ranking_options(params)
+    rows, cols = grid_shape(*bbox, spacing)
+    rows_per_chunk = max(1, RANKING_CHUNK_CANDIDATES // cols)
+    chunks = [
+        (bbox, spacing, range(first, min(first + rows_per_chunk, rows)), k, weights, constraints)
+        for first in range(0, rows, rows_per_chunk)
+    ]
+    return chunks, {'k': k, 'weights': weights, 'constraints': constraints}
+
+def run_ranking(chunk):
+    bbox, spacing, row_range, k, weights, constraints = chunk
+    return rank_sites(grid_chunks(*bbox, spacing, row_range=row_range), k, weights, constraints,
+                      JOB_MAX_CANDIDATES, keep_scores=True)
+
+def merge_ranking(partials, context):
+    # Bands are in grid order and each is already sorted, so a stable sort keeps earlier ties first.
+    # Unrounded scores, since candidates a rounded score ties would otherwise swap places
+    candidates = [entry for partial in partials for entry in partial['results']]
+    scores = np.array([score for partial in partials for score in partial['scores']], dtype=float)
+    ranked = [candidates[i] for i in np.argsort(-scores, kind='stable')[:context['k']]]
+    for rank, entry in enumerate(ranked, start=1):
+        entry['rank'] = rank
+    return dict(
+        context,
+        scanned=sum(partial['scanned'] for partial in partials),
+        feasible=sum(partial['feasible'] for partial in partials),
+        results=ranked
+    )
+
+JOB_TYPES = {
+    'terrain': JobType(plan_terrain, run_terrain, merge_terrain),
+    'energy': JobType(plan_energy, run_energy, merge_energy, ('solar_results', 'wind_results')),
+    'cost': JobType(plan_cost, run_cost, merge_cost),
+    'ranking': JobType(plan_ranking, run_ranking, merge_ranking)
+}
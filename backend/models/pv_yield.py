@@ -0,0 +1,316 @@
+import numpy as np
+from typing import Dict, List, Optional
+from database.irradiance_store import stored_series
+from database.spatial_index import get_spatial_index
+from models.irradiance_stats import group_reduce
+from models.site_suitability import MAX_RESOURCE_DISTANCE_KM
+
+HOURS_PER_YEAR = 8760
+DAYS_PER_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+MONTH_START_HOURS = np.concatenate(([0], np.cumsum(DAYS_PER_MONTH)[:-1])) * 24
+SOLAR_CONSTANT = 1367.0  # W/m²
+
+# Site/config combinations simulated per chunk, bounds peak memory
+CHUNK_SIZE = 256
+
+DEFAULT_CONFIG = {
+    'capacity_kw': 1.0,
+    'tilt': None,               # defaults to the site latitude, capped at 60°
+    'azimuth': None,            # degrees clockwise from north; defaults to facing the equator
+    'losses': 14.0,             # system losses in percent, as used for PVGIS
+    'temp_coefficient': -0.004, # relative power change per °C
+    'noct': 45.0,               # nominal operating cell temperature, °C
+    'albedo': 0.2
+}
+
+# Hour of year -> day of year (1-based) and local solar time at the middle of the hour
+_HOURS = np.arange(HOURS_PER_YEAR)
+DAY_OF_YEAR = _HOURS // 24 + 1
+SOLAR_TIME = _HOURS % 24 + 0.5
+MONTH_OF_HOUR = np.repeat(np.arange(12), DAYS_PER_MONTH * 24)
+
+def solar_position(lats: np.ndarray):
+    """Cosine of the zenith angle and sun azimuth (degrees from north) for every hour
+
+    Times are local solar time, so the result only depends on latitude.
+    Returns two (sites, 8760) arrays and the hourly extraterrestrial
+    irradiance normal to the sun (W/m²).
+    """
+    lat = np.radians(np.asarray(lats, dtype=float))[:, None]
+    day_angle = 2 * np.pi * (DAY_OF_YEAR - 1) / 365
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + DAY_OF_YEAR) / 365)
+    hour_angle = np.radians(15.0 * (SOLAR_TIME - 12))
+
+    cos_zenith = (np.sin(lat) * np.sin(declination)
+                  + np.cos(lat) * np.cos(declination) * np.cos(hour_angle))
+    azimuth = np.degrees(np.arctan2(
+        np.sin(hour_angle),
+        np.cos(hour_angle) * np.sin(lat) - np.tan(declination) * np.cos(lat)
+    )) + 180.0
+
+    extraterrestrial = SOLAR_CONSTANT * (1 + 0.033 * np.cos(day_angle))
+    return np.clip(cos_zenith, -1, 1), azimuth % 360, extraterrestrial
+
+def hourly_irradiance(lats: np.ndarray, monthly_daily_ghi: np.ndarray):
+    """Split monthly mean daily GHI (kWh/m²/day, shape sites x 12) into hourly components
+
+    A monthly clearness index scales extraterrestrial radiation so each month
+    reproduces its GHI; the Erbs correlation separates diffuse and direct.
+    Returns cos(zenith), sun azimuth, GHI, DNI and DHI as (sites, 8760) arrays.
+    """
+    cos_zenith, azimuth, extraterrestrial = solar_position(lats)
+    horizontal_extra = extraterrestrial * np.maximum(cos_zenith, 0)
+
+    # Clearness index per site and month
+    monthly_extra = np.add.reduceat(horizontal_extra, MONTH_START_HOURS, axis=1) / 1000  # kWh/m²
+    monthly_target = np.asarray(monthly_daily_ghi, dtype=float) * DAYS_PER_MONTH
+    with np.errstate(invalid='ignore', divide='ignore'):
+        clearness = np.clip(np.nan_to_num(monthly_target / monthly_extra), 0, 0.85)
+    ghi, dni, dhi = split_irradiance(clearness[:, MONTH_OF_HOUR], cos_zenith, horizontal_extra)
+    return cos_zenith, azimuth, ghi, dni, dhi
+
+def split_irradiance(kt, cos_zenith, horizontal_extra):
+    """GHI, DNI and DHI from the hourly clearness index and horizontal extraterrestrial irradiance"""
+    ghi = kt * horizontal_extra
+    diffuse_fraction = np.where(
+        kt <= 0.22, 1 - 0.09 * kt,
+        np.where(kt <= 0.8,
+                 0.9511 - 0.1604 * kt + 4.388 * kt ** 2 - 16.638 * kt ** 3 + 12.336 * kt ** 4,
+                 0.165)
+    )
+    dhi = ghi * diffuse_fraction
+    # Near the horizon direct irradiance is unreliable; treat it as diffuse
+    dni = np.where(cos_zenith > 0.087, (ghi - dhi) / np.maximum(cos_zenith, 0.087), 0.0)
+    dhi = np.where(cos_zenith > 0.087, dhi, ghi)
+    return ghi, dni, dhi
+
+def ambient_temperature(lats: np.ndarray) -> np.ndarray:
+    """Synthetic hourly air temperature (°C) from latitude: annual, seasonal and daily cycles"""
+    lat = np.asarray(lats, dtype=float)[:, None]
+    annual_mean = np.clip(28 - 0.45 * np.abs(lat), -10, 28)
+    seasonal_amplitude = np.minimum(15, 0.3 * np.abs(lat))
+    warmest_day = np.where(lat >= 0, 200, 17)
+    seasonal = seasonal_amplitude * np.cos(2 * np.pi * (DAY_OF_YEAR - warmest_day) / 365)
+    daily = 5 * np.cos(2 * np.pi * (SOLAR_TIME - 15) / 24)
+    return annual_mean + seasonal + daily
+
+def check_configs(configs: List[Dict]):
+    """Raise ValueError for PV config values the simulation cannot use
+
+    ``tilt`` and ``azimuth`` may be null to take their latitude defaults.
+    """
+    for config in configs:
+        for key, default in DEFAULT_CONFIG.items():
+            value = config.get(key, default)
+            if value is None and default is None:
+                continue
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{key} must be a number')
+            if not np.isfinite(value):
+                raise ValueError(f'{key} must be finite')
+        if float(config.get('capacity_kw', DEFAULT_CONFIG['capacity_kw'])) <= 0:
+            raise ValueError('capacity_kw must be positive')
+        if not 0 <= float(config.get('losses', DEFAULT_CONFIG['losses'])) < 100:
+            raise ValueError('losses must be between 0 and 100')
+
+def check_irradiance_inputs(sites: List[Dict]):
+    """Raise ValueError for irradiance given with a site that is not usable"""
+    for site in sites:
+        monthly = site.get('monthly_irradiance')
+        if monthly is not None:
+            if not isinstance(monthly, list) or len(monthly) != 12:
+                raise ValueError('monthly_irradiance must be a list of 12 numbers')
+            try:
+                monthly = np.array(monthly, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError('monthly_irradiance must be a list of 12 numbers')
+            if not np.all(np.isfinite(monthly)) or (monthly < 0).any():
+                raise ValueError('monthly_irradiance values must be non-negative numbers')
+        if site.get('solar_irradiance') is not None:
+            try:
+                value = float(site['solar_irradiance'])
+            except (TypeError, ValueError):
+                raise ValueError('solar_irradiance must be a number')
+            if not np.isfinite(value) or value < 0:
+                raise ValueError('solar_irradiance must be a non-negative number')
+
+def normalize_configs(configs: List[Dict], lats: np.ndarray) -> Dict[str, np.ndarray]:
+    """Fill config defaults; tilt and azimuth defaults depend on each site's latitude
+
+    Returns (sites, configs) arrays for every parameter.
+    """
+    columns = {}
+    for key, default in DEFAULT_CONFIG.items():
+        values = [config.get(key, default) for config in configs]
+        columns[key] = np.array([np.nan if v is None else v for v in values], dtype=float)[None, :]
+
+    lat = np.asarray(lats, dtype=float)[:, None]
+    tilt = np.where(np.isnan(columns['tilt']), np.minimum(np.abs(lat), 60), columns['tilt'])
+    azimuth = np.where(np.isnan(columns['azimuth']), np.where(lat >= 0, 180.0, 0.0), columns['azimuth'])
+
+    shape = (lat.shape[0], len(configs))
+    normalized = {key: np.broadcast_to(value, shape) for key, value in columns.items()}
+    normalized['tilt'] = np.broadcast_to(tilt, shape)
+    normalized['azimuth'] = np.broadcast_to(azimuth, shape)
+    return normalized
+
+def simulate(lats, monthly_daily_ghi, configs: List[Dict], include_hourly: bool = False) -> Dict[str, np.ndarray]:
+    """Simulate hourly AC output for every site x config combination
+
+    Returns annual and monthly energy (kWh), capacity factor and peak power
+    as (sites, configs[, 12]) arrays, plus hourly kW output when requested.
+    """
+    lats = np.asarray(lats, dtype=float)
+    site_count, config_count = len(lats), len(configs)
+    params = normalize_configs(configs, lats)
+
+    cos_zenith, sun_azimuth, ghi, dni, dhi = hourly_irradiance(lats, monthly_daily_ghi)
+    sin_zenith = np.sqrt(np.maximum(1 - cos_zenith ** 2, 0))
+    sun_azimuth_rad = np.radians(sun_azimuth)
+    temperature = ambient_temperature(lats)
+
+    annual = np.zeros((site_count, config_count))
+    monthly = np.zeros((site_count, config_count, 12))
+    peak = np.zeros((site_count, config_count))
+    hourly = np.zeros((site_count, config_count, HOURS_PER_YEAR), dtype=np.float32) if include_hourly else None
+
+    site_index, config_index = np.divmod(np.arange(site_count * config_count), config_count)
+    for start in range(0, len(site_index), CHUNK_SIZE):
+        s = site_index[start:start + CHUNK_SIZE]
+        c = config_index[start:start + CHUNK_SIZE]
+
+        tilt = np.radians(params['tilt'][s, c])[:, None]
+        panel_azimuth = np.radians(params['azimuth'][s, c])[:, None]
+
+        # Plane-of-array irradiance with an isotropic sky model
+        cos_incidence = (cos_zenith[s] * np.cos(tilt)
+                         + sin_zenith[s] * np.sin(tilt) * np.cos(sun_azimuth_rad[s] - panel_azimuth))
+        poa = (dni[s] * np.maximum(cos_incidence, 0)
+               + dhi[s] * (1 + np.cos(tilt)) / 2
+               + ghi[s] * params['albedo'][s, c][:, None] * (1 - np.cos(tilt)) / 2)
+
+        # NOCT cell temperature model and temperature derating
+        cell_temperature = temperature[s] + (params['noct'][s, c][:, None] - 20) / 800 * poa
+        derate = 1 + params['temp_coefficient'][s, c][:, None] * (cell_temperature - 25)
+        power = (params['capacity_kw'][s, c][:, None] * poa / 1000 * derate
+                 * (1 - params['losses'][s, c][:, None] / 100))
+        power = np.maximum(power, 0)
+
+        annual[s, c] = power.sum(axis=1)
+        monthly[s, c] = np.add.reduceat(power, MONTH_START_HOURS, axis=1)
+        peak[s, c] = power.max(axis=1)
+        if include_hourly:
+            hourly[s, c] = power
+
+    capacity = params['capacity_kw']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        capacity_factor = annual / (capacity * HOURS_PER_YEAR)
+        specific_yield = annual / capacity
+
+    return {
+        'annual_kwh': annual,
+        'monthly_kwh': monthly,
+        'peak_kw': peak,
+        'capacity_factor': capacity_factor,
+        'specific_yield': specific_yield,
+        'tilt': np.array(params['tilt']),
+        'azimuth': np.array(params['azimuth']),
+        'hourly_kw': hourly
+    }
+
+def pvgis_monthly_ghi(lat: float, lng: float) -> Optional[np.ndarray]:
+    """Monthly mean daily GHI (kWh/m²/day) from an already stored PVGIS hourly series, if any
+
+    The series is requested for a horizontal plane, so its ``G(i)`` is global
+    horizontal irradiance.
+    """
+    series = stored_series(lat, lng)
+    if series is None or 'G(i)' not in series.fields:
+        return None
+    _, hourly_means = group_reduce(series.field('G(i)'), series.calendar()['month'], 'mean')
+    if len(hourly_means) != 12:
+        return None
+    return hourly_means * 24 / 1000.0
+
+def site_irradiance(sites: List[Dict]):
+    """Monthly mean daily GHI (sites x 12) and the source used for each site
+
+    Order of preference: a value given with the site, a stored PVGIS hourly series,
+    then interpolation of the irradiance dataset. Sites with no data get NaN.
+    """
+    lats = np.array([site['latitude'] for site in sites], dtype=float)
+    lngs = np.array([site['longitude'] for site in sites], dtype=float)
+    monthly = np.full((len(sites), 12), np.nan)
+    sources = [None] * len(sites)
+
+    needs_dataset = []
+    for i, site in enumerate(sites):
+        if site.get('monthly_irradiance') is not None:
+            monthly[i] = np.asarray(site['monthly_irradiance'], dtype=float)
+            sources[i] = 'request'
+        elif site.get('solar_irradiance') is not None:
+            monthly[i] = float(site['solar_irradiance'])
+            sources[i] = 'request'
+        else:
+            cached = pvgis_monthly_ghi(lats[i], lngs[i])
+            if cached is not None:
+                monthly[i] = cached
+                sources[i] = 'pvgis'
+            else:
+                needs_dataset.append(i)
+
+    index = get_spatial_index('solar-irradiance')
+    if needs_dataset and index is not None:
+        rows = np.array(needs_dataset)
+        values = index.interpolate_values(lats[rows], lngs[rows], 'solar_irradiance',
+                                          max_distance_km=MAX_RESOURCE_DISTANCE_KM)
+        for i, value in zip(rows, values):
+            if not np.isnan(value):
+                monthly[i] = value
+                sources[i] = 'dataset'
+
+    return lats, monthly, sources
+
+def predict_solar_yield(sites: List[Dict], configs: List[Dict], include_hourly: bool = False) -> List[Dict]:
+    """Per site x config yield summaries, site-major order
+
+    Raises ValueError for invalid configs or irradiance inputs.
+    """
+    check_configs(configs)
+    check_irradiance_inputs(sites)
+    lats, monthly_ghi, sources = site_irradiance(sites)
+    usable = np.array([source is not None for source in sources])
+
+    results = [None] * (len(sites) * len(configs))
+    if usable.any():
+        simulation = simulate(lats[usable], monthly_ghi[usable], configs, include_hourly)
+        for row, site_number in enumerate(np.flatnonzero(usable)):
+            for c in range(len(configs)):
+                result = {
+                    'site': int(site_number),
+                    'config': c,
+                    'irradiance_source': sources[site_number],
+                    'tilt': round(float(simulation['tilt'][row, c]), 2),
+                    'azimuth': round(float(simulation['azimuth'][row, c]), 2),
+                    'annual_kwh': round(float(simulation['annual_kwh'][row, c]), 2),
+                    'specific_yield_kwh_per_kwp': round(float(simulation['specific_yield'][row, c]), 2),
+                    'capacity_factor': round(float(simulation['capacity_factor'][row, c]), 4),
+                    'peak_kw': round(float(simulation['peak_kw'][row, c]), 3),
+                    'monthly_kwh': np.round(simulation['monthly_kwh'][row, c], 2).tolist()
+                }
+                if include_hourly:
+                    # Left as an array for numeric_response
+                    result['hourly_kw'] = simulation['hourly_kw'][row, c]
+                results[site_number * len(configs) + c] = result
+
+    for site_number in np.flatnonzero(~usable):
+        for c in range(len(configs)):
+            results[site_number * len(configs) + c] = {
+                'site': int(site_number),
+                'config': c,
+                'error': 'No irradiance data near this site; pass solar_irradiance'
+            }
+
+    return results
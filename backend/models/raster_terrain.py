@@ -0,0 +1,322 @@
+import os
+import numpy as np
+from scipy import ndimage
+from typing import Dict, List, Optional, Tuple
+from database.elevation_provider import get_tile_store
+
+# Cells on each side of the site in the analyzed DEM window (about 1 km at 30 m)
+WINDOW_RADIUS_CELLS = int(os.environ.get('TERRAIN_WINDOW_RADIUS_CELLS', 16))
+
+METERS_PER_DEGREE = 111320.0
+
+# D8 neighbour offsets (row, col), in the same order as the compass labels
+D8_OFFSETS = [(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)]
+D8_LABELS = ['North', 'Northeast', 'East', 'Southeast', 'South', 'Southwest', 'West', 'Northwest']
+
+# Sites whose DEM windows are analyzed as one stack, bounds peak memory
+SITE_CHUNK = int(os.environ.get('TERRAIN_SITE_CHUNK', 1024))
+
+# Cells the stencil kernels process at a time; blocks of this size stay in cache
+# across the kernel's operations instead of streaming the grid from memory for each
+BLOCK_CELLS = 1 << 16
+
+# Pending donors are counted in units of this in the flow accumulation state, above
+# any accumulated cell count, so one int32 array holds both
+PENDING_DONOR = np.int32(1 << 27)
+
+def grid_blocks(shape):
+    """``(block, padded_block)`` index pairs covering a grid or a stack of windows
+
+    ``padded_block`` indexes the same cells in the grid padded by one cell on
+    each side, halo included. Stacks are split between windows, grids between rows.
+    """
+    rows, cols = shape[-2:]
+    if len(shape) == 3:
+        step = max(1, BLOCK_CELLS // (rows * cols))
+        for start in range(0, shape[0], step):
+            block = (slice(start, start + step),)
+            yield block, block
+    else:
+        step = max(1, BLOCK_CELLS // cols)
+        for start in range(0, rows, step):
+            yield (slice(start, start + step),), (slice(start, start + step + 2),)
+
+def block_of(cell_size, block):
+    """A scalar cell size, or the rows of a per-window (sites, 1, 1) array in ``block``"""
+    cell_size = np.asarray(cell_size)
+    return cell_size[block] if cell_size.ndim == 3 else cell_size
+
+def pad_grid(dem: np.ndarray, **kwargs) -> np.ndarray:
+    # Only the grid axes are padded, so no window of a stack sees its neighbour
+    return np.pad(dem, [(0, 0)] * (dem.ndim - 2) + [(1, 1), (1, 1)], **kwargs)
+
+def fill_voids(dem: np.ndarray) -> np.ndarray:
+    """Replace NaN cells with the value of the nearest valid cell
+
+    A (sites, rows, cols) stack is filled window by window.
+    """
+    invalid = np.isnan(dem)
+    if not invalid.any():
+        return dem
+    if dem.ndim == 3:
+        filled = dem.copy()
+        for i in np.flatnonzero(invalid.any(axis=(1, 2))):
+            filled[i] = fill_voids(dem[i])
+        return filled
+    if invalid.all():
+        raise ValueError('DEM window has no valid cells')
+    _, (rows, cols) = ndimage.distance_transform_edt(invalid, return_indices=True)
+    return dem[rows, cols]
+
+def horn_slope_aspect(padded: np.ndarray, cell_x, cell_y) -> Tuple[np.ndarray, np.ndarray]:
+    """Slope and aspect of the interior of an edge-padded block"""
+    # Horn (1981): [-1, 0, 1] differences smoothed by [1, 2, 1] across them. Neighbouring
+    # elevations are differenced first, which float32 does exactly, then the small
+    # differences are smoothed
+    across = padded[..., :, 2:] - padded[..., :, :-2]
+    dz_dx = across[..., 1:-1, :] * 2
+    dz_dx += across[..., :-2, :]
+    dz_dx += across[..., 2:, :]
+    # Rows run north to south, so the difference is taken to be positive uphill to the north
+    along = padded[..., :-2, :] - padded[..., 2:, :]
+    dz_dy = along[..., :, 1:-1] * 2
+    dz_dy += along[..., :, :-2]
+    dz_dy += along[..., :, 2:]
+    dz_dx *= np.asarray(1 / (8 * cell_x), dtype=np.float32)
+    dz_dy *= np.asarray(1 / (8 * cell_y), dtype=np.float32)
+
+    slope = dz_dx * dz_dx
+    slope += dz_dy * dz_dy
+    np.sqrt(slope, out=slope)
+    np.arctan(slope, out=slope)
+    slope *= np.float32(180 / np.pi)
+
+    # The downhill direction (-dz_dx, -dz_dy) is the uphill one turned by 180°
+    aspect = np.arctan2(dz_dx, dz_dy)
+    aspect *= np.float32(180 / np.pi)
+    aspect += np.float32(180)
+    aspect[aspect >= 360] = 0
+    aspect[(dz_dx == 0) & (dz_dy == 0)] = -1
+    return slope, aspect
+
+def slope_aspect(dem: np.ndarray, cell_x, cell_y) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-cell slope in degrees and aspect in degrees clockwise from north
+
+    Aspect is the direction the slope faces; flat cells get -1.
+    """
+    padded = pad_grid(dem.astype(np.float32, copy=False), mode='edge')
+    slope = np.empty(dem.shape, dtype=np.float32)
+    aspect = np.empty(dem.shape, dtype=np.float32)
+    for block, padded_block in grid_blocks(dem.shape):
+        slope[block], aspect[block] = horn_slope_aspect(
+            padded[padded_block], block_of(cell_x, block), block_of(cell_y, block)
+        )
+    return slope, aspect
+
+def triple_variance(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Variance of three values a, b, c from their steps b - a and c - b"""
+    variance = first + second
+    variance *= variance
+    variance += first * first
+    variance += second * second
+    variance *= np.float32(1 / 9)
+    return variance
+
+def neighbourhood_deviation(padded: np.ndarray) -> np.ndarray:
+    """3x3 standard deviation of the interior of an edge-padded block
+
+    By the law of total variance it is the mean variance within the three rows
+    plus the variance of the row means. Both come from differences of
+    neighbouring cells, so float32 keeps its precision at any elevation, where
+    the mean of squares minus the squared mean would cancel.
+    """
+    steps = padded[..., :, 1:] - padded[..., :, :-1]
+    within_rows = triple_variance(steps[..., :, :-1], steps[..., :, 1:])
+    variance = within_rows[..., 1:-1, :] + within_rows[..., :-2, :]
+    variance += within_rows[..., 2:, :]
+    variance *= np.float32(1 / 3)
+
+    rises = padded[..., 1:, :] - padded[..., :-1, :]
+    mean_rises = rises[..., :, 1:-1] + rises[..., :, :-2]
+    mean_rises += rises[..., :, 2:]
+    mean_rises *= np.float32(1 / 3)
+    variance += triple_variance(mean_rises[..., :-1, :], mean_rises[..., 1:, :])
+    return np.sqrt(variance, out=variance)
+
+def roughness_index(dem: np.ndarray) -> np.ndarray:
+    """Standard deviation of elevation in each 3x3 neighbourhood"""
+    padded = pad_grid(dem.astype(np.float32, copy=False), mode='edge')
+    roughness = np.empty(dem.shape, dtype=np.float32)
+    for block, padded_block in grid_blocks(dem.shape):
+        roughness[block] = neighbourhood_deviation(padded[padded_block])
+    return roughness
+
+def steepest_descent(padded: np.ndarray, direction: np.ndarray, cell_x, cell_y):
+    """Fill ``direction`` for the interior of an infinity-padded block"""
+    rows, cols = direction.shape[-2:]
+    dem = padded[..., 1:-1, 1:-1]
+    best_drop = np.zeros(direction.shape, dtype=np.float32)
+    drop = np.empty(direction.shape, dtype=np.float32)
+    steeper = np.empty(direction.shape, dtype=bool)
+    change = np.empty(direction.shape, dtype=np.int8)
+    direction.fill(-1)
+
+    for index, (dr, dc) in enumerate(D8_OFFSETS):
+        distance = np.asarray(np.hypot(dr * cell_y, dc * cell_x), dtype=np.float32)
+        np.subtract(dem, padded[..., 1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols], out=drop)
+        drop /= distance
+        np.greater(drop, best_drop, out=steeper)
+        np.maximum(best_drop, drop, out=best_drop)
+
+        # direction += (index - direction) * steeper, branch-free unlike a masked assignment
+        np.subtract(np.int8(index), direction, out=change)
+        change *= steeper.view(np.int8)
+        direction += change
+
+def d8_flow_direction(dem: np.ndarray, cell_x, cell_y) -> np.ndarray:
+    """Index into D8_OFFSETS of the steepest downhill neighbour, -1 for pits and flats"""
+    padded = pad_grid(dem.astype(np.float32, copy=False), mode='constant', constant_values=np.inf)
+    direction = np.empty(dem.shape, dtype=np.int8)
+    for block, padded_block in grid_blocks(dem.shape):
+        steepest_descent(padded[padded_block], direction[block], block_of(cell_x, block), block_of(cell_y, block))
+    return direction
+
+def flow_accumulation(direction: np.ndarray) -> np.ndarray:
+    """Number of cells draining through each cell, itself included
+
+    Cells are processed in waves from the ridges down: each wave passes its
+    accumulated count to its receivers, and a receiver joins the next wave once
+    all of its donors have been processed. A stack of windows is handled as
+    one grid, since D8 never points across a window edge.
+
+    Each cell's state is its pending donors times PENDING_DONOR plus the count
+    received so far, so a donor settles both with one scatter-add; receivers
+    are derived from the int8 directions rather than kept as a 64-bit array.
+    The waves scatter into cells all over the grid, so this stays memory bound
+    at about 80-100 ns a cell (``python -m benchmarks.raster``).
+    """
+    cols = direction.shape[-1]
+    flat_direction = direction.ravel()
+    size = flat_direction.size
+    if size >= PENDING_DONOR:
+        raise ValueError(f'Flow accumulation is limited to {PENDING_DONOR - 1} cells')
+
+    # Pits and flats (-1, the last offset) drain into a sink slot of their own at
+    # size + cell, which starts far above PENDING_DONOR and so never becomes ready
+    offsets = np.array([dr * cols + dc for dr, dc in D8_OFFSETS] + [size], dtype=np.intp)
+    receivers = np.arange(size, dtype=np.intp)
+    receivers += offsets[flat_direction]
+    state = np.empty(2 * size, dtype=np.int32)
+    state[:size] = np.bincount(receivers[flat_direction >= 0], minlength=size)
+    del receivers
+    frontier = np.flatnonzero(state[:size] == 0)
+    state[:size] *= PENDING_DONOR
+    state[size:] = np.int32(1 << 30)
+
+    # Scratch array used to drop duplicate receivers without sorting
+    slot = np.empty(size, dtype=np.int32)
+
+    while frontier.size:
+        targets = offsets[flat_direction[frontier]]
+        targets += frontier
+        settled = state[frontier]
+        settled += np.int32(1) - PENDING_DONOR
+        np.add.at(state, targets, settled)
+
+        ready = targets[state[targets] < PENDING_DONOR]
+        positions = np.arange(ready.size, dtype=np.int32)
+        slot[ready] = positions
+        frontier = ready[slot[ready] == positions]
+
+    accumulation = state[:size].astype(np.float64)
+    accumulation += 1
+    return accumulation.reshape(direction.shape)
+
+def analyze_dem(dem: np.ndarray, cell_x, cell_y) -> Dict[str, np.ndarray]:
+    """Run every raster metric over a DEM grid (north row first, sizes in meters)
+
+    ``dem`` may also be a (sites, rows, cols) stack of windows, with the cell
+    sizes given per site as (sites, 1, 1) arrays. A 3000 x 3000 grid takes
+    about 1.1 s on one core, most of it in flow_accumulation; the target of
+    well under a second for grids that size is not met yet.
+    """
+    dem = fill_voids(np.asarray(dem, dtype=np.float32))
+    slope, aspect = slope_aspect(dem, cell_x, cell_y)
+    direction = d8_flow_direction(dem, cell_x, cell_y)
+
+    return {
+        'slope': slope,
+        'aspect': aspect,
+        'roughness': roughness_index(dem),
+        'flow_direction': direction,
+        'flow_accumulation': flow_accumulation(direction)
+    }
+
+def load_site_windows(lats, lngs, radius_cells: int = WINDOW_RADIUS_CELLS):
+    """DEM windows of the sites that have one: ``(indices, dems, cell_x, cell_y)``
+
+    ``dems`` is a void-filled (sites, size, size) stack and the cell sizes are
+    per-site arrays in meters.
+    """
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lngs = np.atleast_1d(np.asarray(lngs, dtype=float))
+    grids, cell_degrees = get_tile_store().windows(lats, lngs, radius_cells)
+
+    indices = np.flatnonzero(~np.isnan(grids).all(axis=(1, 2)))
+    cell_y = cell_degrees[indices] * METERS_PER_DEGREE
+    cell_x = cell_y * np.maximum(np.cos(np.radians(lats[indices])), 1e-6)
+    return indices, fill_voids(grids[indices]), cell_x, cell_y
+
+def analyze_sites(lats, lngs, radius_cells: int = WINDOW_RADIUS_CELLS) -> List[Optional[Dict]]:
+    """Summarize the raster metrics at many sites, None where no local DEM covers one
+
+    The windows of ``SITE_CHUNK`` sites at a time are analyzed as one stack.
+    """
+    results = [None] * len(lats)
+    center = radius_cells
+
+    for start in range(0, len(lats), SITE_CHUNK):
+        indices, dems, cell_x, cell_y = load_site_windows(
+            lats[start:start + SITE_CHUNK], lngs[start:start + SITE_CHUNK], radius_cells
+        )
+        if not indices.size:
+            continue
+
+        grids = analyze_dem(dems, cell_x[:, None, None], cell_y[:, None, None])
+        slope = grids['slope']
+        avg_slopes = slope.mean(axis=(1, 2))
+        max_slopes = slope.max(axis=(1, 2))
+        roughness = grids['roughness'].mean(axis=(1, 2))
+        directions = grids['flow_direction'][:, center, center]
+        accumulation = grids['flow_accumulation'][:, center, center]
+        upstream_areas = accumulation * cell_x * cell_y
+
+        for row, i in enumerate(indices.tolist()):
+            direction = int(directions[row])
+            results[start + i] = {
+                'avg_slope': float(avg_slopes[row]),
+                'max_slope': float(max_slopes[row]),
+                'slope': float(slope[row, center, center]),
+                'aspect': float(grids['aspect'][row, center, center]),
+                'roughness_index': float(roughness[row]),
+                'flow_direction': D8_LABELS[direction] if direction >= 0 else 'None',
+                'flow_accumulation_cells': float(accumulation[row]),
+                'upstream_area_m2': float(upstream_areas[row])
+            }
+
+    return results
+
+def analyze_site(lat: float, lng: float, radius_cells: int = WINDOW_RADIUS_CELLS) -> Optional[Dict]:
+    """Summarize the raster metrics at a site, or None when no local DEM covers it"""
+    return analyze_sites([lat], [lng], radius_cells)[0]
+
+def site_roughness(lats, lngs, radius_cells: int = WINDOW_RADIUS_CELLS) -> np.ndarray:
+    """Mean roughness index (m) of the DEM window around each site, NaN where no local DEM covers it"""
+    roughness = np.full(len(lats), np.nan)
+    for start in range(0, len(lats), SITE_CHUNK):
+        indices, dems, _, _ = load_site_windows(
+            lats[start:start + SITE_CHUNK], lngs[start:start + SITE_CHUNK], radius_cells
+        )
+        if indices.size:
+            roughness[start + indices] = roughness_index(dems).mean(axis=(1, 2))
+    return roughness
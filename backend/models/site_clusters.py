@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from typing import Optional
+from database.cluster_index import ClusterIndex
+from database.locations_data import GEO_FIELD, get_locations_collection
+from database.spatial_index import get_spatial_index
+from models.site_ranking import RANKING_WEIGHTS, evaluate_chunk, location_chunks
+
+# Seconds between checks of the locations collection for new or removed sites
+CLUSTER_REFRESH_INTERVAL = float(os.environ.get('CLUSTER_REFRESH_INTERVAL', 5))
+
+class LocationClusters:
+    """Cluster index over the locations collection, scored with the default ranking weights
+
+    The first request builds the index. After that, requests never wait: a
+    stale index is refreshed in the background. Sites are read in ``_id``
+    order, so a refresh only scores and merges those inserted since the last.
+    When the number of located sites no longer matches the index (sites were
+    removed, or ids arrived out of order) a fresh index is built and swapped in.
+    """
+
+    def __init__(self):
+        self.index = None
+        self.last_id = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def get(self) -> ClusterIndex:
+        if self.index is None:
+            with self._lock:
+                if self.index is None:
+                    index = ClusterIndex()
+                    self.last_id = load_locations(index, None)
+                    self.checked_at = time.monotonic()
+                    self.index = index
+            return self.index
+
+        with self._lock:
+            stale = time.monotonic() - self.checked_at >= CLUSTER_REFRESH_INTERVAL and not self._refreshing
+            if stale:
+                self._refreshing = True
+        if stale:
+            threading.Thread(target=self.refresh, name='cluster-refresh', daemon=True).start()
+        return self.index
+
+    def refresh(self):
+        try:
+            self.last_id = load_locations(self.index, self.last_id)
+            located = get_locations_collection().count_documents({f'{GEO_FIELD}.coordinates': {'$exists': True}})
+            if located != len(self.index):
+                index = ClusterIndex()
+                last_id = load_locations(index, None)
+                self.last_id, self.index = last_id, index
+        finally:
+            with self._lock:
+                self.checked_at = time.monotonic()
+                self._refreshing = False
+
+def load_locations(index: ClusterIndex, after: Optional[str]) -> Optional[str]:
+    """Add the sites after ``after`` to the index; returns the last id added"""
+    for chunk in location_chunks(after=after):
+        scores, _, _ = evaluate_chunk(chunk, RANKING_WEIGHTS)
+        index.add(chunk['latitude'], chunk['longitude'], scores, ids=chunk['id'], names=chunk['name'])
+        after = chunk['id'][-1]
+    return after
+
+_location_clusters = LocationClusters()
+_dataset_clusters = {}
+_dataset_lock = threading.Lock()
+
+def get_location_clusters() -> ClusterIndex:
+    return _location_clusters.get()
+
+def get_dataset_clusters(name: str, field: Optional[str] = None) -> Optional[ClusterIndex]:
+    """Cluster index of a resource dataset, with ``field`` as the score; rebuilt when the dataset reloads"""
+    spatial_index = get_spatial_index(name)
+    if spatial_index is None:
+        return None
+    if field is not None and field not in spatial_index.numeric_fields:
+        raise ValueError(f'field must be one of {", ".join(spatial_index.numeric_fields)}')
+
+    with _dataset_lock:
+        cached = _dataset_clusters.get((name, field))
+        if cached is not None and cached[0] is spatial_index:
+            return cached[1]
+
+        index = ClusterIndex()
+        scores = spatial_index.column(field) if field is not None else None
+        index.add(spatial_index.lats, spatial_index.lngs, scores)
+        _dataset_clusters[(name, field)] = (spatial_index, index)
+        return index
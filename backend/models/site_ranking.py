@@ -0,0 +1,327 @@
+import heapq
+import itertools
+import os
+import numpy as np
+from typing import Dict, Iterable, Iterator, List, Optional
+from database.elevation_provider import get_tile_store
+from database.locations_data import GEO_FIELD, find_locations
+from database.spatial_index import get_spatial_index
+from models.cost_savings import LOCATED_DATASET, tariff_table
+from models.site_suitability import (
+    MAX_BUILDABLE_SLOPE, MAX_RESOURCE_DISTANCE_KM,
+    combine_scores, criterion_scores, grid_slopes, resource_values, scale
+)
+from models.terrain_metrics import calculate_flood_risks, grid_shape
+
+# Default relative importance of each ranking criterion
+RANKING_WEIGHTS = {
+    'irradiance': 0.30,
+    'wind': 0.15,
+    'land': 0.20,
+    'slope': 0.15,
+    'flood': 0.10,
+    'cost': 0.10
+}
+
+FLOOD_RISK_SCORES = {'Low': 1.0, 'Medium': 0.5, 'High': 0.0}
+
+# Electricity prices mapped onto 0..1; dearer power makes generation more valuable
+TARIFF_RANGE = (0.08, 0.25)  # USD/kWh
+
+# Candidates scored per vectorized step; bounds memory regardless of the scan size
+CHUNK_SIZE = int(os.environ.get('RANKING_CHUNK_SIZE', 65536))
+
+# Candidates a synchronous ranking request may scan (about 3 s a million); larger scans run as ranking jobs
+MAX_CANDIDATES = int(os.environ.get('RANKING_MAX_CANDIDATES', 2_000_000))
+
+MAX_TOP_K = 1000
+
+# Hard constraints: name -> (value, comparison)
+NUMERIC_CONSTRAINTS = {
+    'min_irradiance': ('irradiance', np.greater_equal),
+    'min_wind_speed': ('wind_speed', np.greater_equal),
+    'max_slope': ('slope', np.less_equal),
+    'min_elevation': ('elevation', np.greater_equal),
+    'max_elevation': ('elevation', np.less_equal),
+    'min_cost_per_kwh': ('cost_per_kwh', np.greater_equal),
+    'min_score': ('score', np.greater_equal)
+}
+CATEGORICAL_CONSTRAINTS = {
+    'land_suitability': 'land_suitability',
+    'flood_risk': 'flood_risk'
+}
+
+def parse_weights(weights: Optional[Dict]) -> Dict[str, float]:
+    if weights is None:
+        return dict(RANKING_WEIGHTS)
+    if not isinstance(weights, dict):
+        raise ValueError('weights must be an object')
+    unknown = set(weights) - set(RANKING_WEIGHTS)
+    if unknown:
+        raise ValueError(f'Unknown criteria: {", ".join(sorted(unknown))}')
+    try:
+        parsed = {name: float(weights.get(name, 0)) for name in RANKING_WEIGHTS}
+    except (TypeError, ValueError):
+        raise ValueError('Weights must be numeric')
+    if any(weight < 0 for weight in parsed.values()) or sum(parsed.values()) <= 0:
+        raise ValueError('Weights must be non-negative and not all zero')
+    return parsed
+
+def parse_constraints(constraints: Optional[Dict]) -> Dict:
+    if constraints is None:
+        return {}
+    if not isinstance(constraints, dict):
+        raise ValueError('constraints must be an object')
+    parsed = {}
+    for name, value in constraints.items():
+        if name in NUMERIC_CONSTRAINTS:
+            try:
+                parsed[name] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{name} must be a number')
+        elif name in CATEGORICAL_CONSTRAINTS:
+            if not isinstance(value, list):
+                raise ValueError(f'{name} must be a list of allowed classes')
+            parsed[name] = value
+        else:
+            raise ValueError(f'Unknown constraint: {name}')
+    return parsed
+
+def grid_chunks(min_lat, min_lng, max_lat, max_lng, spacing,
+                row_range: Optional[range] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield a regular grid a block of rows at a time
+
+    Each block is sampled with one extra row on either side so slopes at the
+    block edges match those of the full grid. ``row_range`` limits the scan
+    to some rows of the grid, e.g. one band per worker.
+    """
+    rows, cols = grid_shape(min_lat, min_lng, max_lat, max_lng, spacing)
+    grid_lngs = min_lng + np.arange(cols) * spacing
+    rows_per_chunk = max(1, CHUNK_SIZE // cols)
+    tile_store = get_tile_store()
+    if row_range is None:
+        row_range = range(rows)
+
+    for first in range(row_range.start, row_range.stop, rows_per_chunk):
+        last = min(first + rows_per_chunk, row_range.stop)
+        padded_first, padded_last = max(first - 1, 0), min(last + 1, rows)
+        lats, lngs = np.meshgrid(min_lat + np.arange(padded_first, padded_last) * spacing, grid_lngs, indexing='ij')
+
+        elevations = tile_store.sample(lats.ravel(), lngs.ravel()).reshape(lats.shape)
+        slopes = grid_slopes(lats, lngs, elevations)
+        block = slice(first - padded_first, last - padded_first)
+        yield {
+            'latitude': lats[block].ravel(),
+            'longitude': lngs[block].ravel(),
+            'elevation': elevations[block].ravel(),
+            'slope': slopes[block].ravel()
+        }
+
+def location_chunks(bbox=None, near=None, radius_km=None, after=None) -> Iterator[Dict[str, np.ndarray]]:
+    """Yield sites of the locations collection in chunks, in ``_id`` order
+
+    Stored ``elevation`` and ``slope`` fields are used when present; missing
+    elevations are sampled from local DEM tiles. ``after`` skips sites up to
+    and including that id.
+    """
+    cursor = find_locations(bbox=bbox, near=near, radius_km=radius_km, after=after)
+    try:
+        while True:
+            batch = list(itertools.islice(cursor, CHUNK_SIZE))
+            if not batch:
+                return
+            documents = [document for document in batch if isinstance(document.get(GEO_FIELD), dict)]
+            if not documents:
+                continue
+
+            coordinates = np.array([document[GEO_FIELD]['coordinates'][:2] for document in documents], dtype=float)
+            elevations = np.array([document.get('elevation', np.nan) for document in documents], dtype=float)
+            missing = np.isnan(elevations)
+            if missing.any():
+                elevations[missing] = get_tile_store().sample(coordinates[missing, 1], coordinates[missing, 0])
+
+            yield {
+                'latitude': coordinates[:, 1],
+                'longitude': coordinates[:, 0],
+                'elevation': elevations,
+                'slope': np.array([document.get('slope', np.nan) for document in documents], dtype=float),
+                'id': np.array([str(document['_id']) for document in documents], dtype=object),
+                'name': np.array([document.get('name') for document in documents], dtype=object)
+            }
+    finally:
+        cursor.close()
+
+def location_tariffs(lats, lngs) -> np.ndarray:
+    """Price per kWh of the nearest named location, NaN when out of range or unpriced"""
+    index = get_spatial_index(LOCATED_DATASET)
+    table = tariff_table()
+    if index is None or not table:
+        return np.full(np.shape(lats), np.nan)
+    names = index.nearest_values(lats, lngs, 'location', max_distance_km=MAX_RESOURCE_DISTANCE_KM)
+    return np.array([table.get(name, np.nan) for name in names], dtype=float)
+
+def evaluate_chunk(chunk: Dict[str, np.ndarray], weights: Dict[str, float]):
+    """Combined score, per-criterion 0..1 scores and raw values for a chunk"""
+    lats, lngs = chunk['latitude'], chunk['longitude']
+    elevations, slopes = chunk['elevation'], chunk['slope']
+
+    values = resource_values(lats, lngs)
+    scores = criterion_scores(lats, lngs, values=values)
+    del scores['terrain']
+    scores['slope'] = 1 - scale(slopes, 0, MAX_BUILDABLE_SLOPE)
+
+    known_terrain = ~(np.isnan(elevations) | np.isnan(slopes))
+    risks = calculate_flood_risks(elevations, slopes)
+    flood_risk = np.where(known_terrain, risks, None)
+    scores['flood'] = np.where(known_terrain, np.select(
+        [risks == risk for risk in FLOOD_RISK_SCORES], list(FLOOD_RISK_SCORES.values())
+    ), np.nan)
+
+    values.update(elevation=elevations, slope=slopes, flood_risk=flood_risk, cost_per_kwh=location_tariffs(lats, lngs))
+    scores['cost'] = scale(values['cost_per_kwh'], *TARIFF_RANGE)
+
+    values['score'] = combine_scores(scores, weights)
+    return values['score'], scores, values
+
+def constraint_mask(values: Dict[str, np.ndarray], constraints: Dict) -> np.ndarray:
+    """True where a candidate has a score and meets every hard constraint
+
+    A constrained value that is unknown fails the constraint.
+    """
+    feasible = ~np.isnan(values['score'])
+    for name, limit in constraints.items():
+        if name in NUMERIC_CONSTRAINTS:
+            field, compare = NUMERIC_CONSTRAINTS[name]
+            with np.errstate(invalid='ignore'):
+                feasible &= compare(values[field], limit)
+        else:
+            feasible &= np.isin(values[CATEGORICAL_CONSTRAINTS[name]], limit)
+    return feasible
+
+def describe_candidate(chunk, scores, values, weights, i) -> Dict:
+    """Ranked entry with the per-criterion breakdown of candidate ``i``"""
+    def number(value, digits):
+        return None if value is None or np.isnan(value) else round(float(value), digits)
+
+    entry = {
+        'latitude': round(float(chunk['latitude'][i]), 6),
+        'longitude': round(float(chunk['longitude'][i]), 6),
+        'score': number(values['score'][i], 4),
+        'criteria': {
+            name: {
+                'score': number(scores[name][i], 4),
+                'weight': weight,
+                'contribution': number(scores[name][i] * weight, 4)
+            }
+            for name, weight in weights.items()
+        },
+        'values': {
+            'irradiance': number(values['irradiance'][i], 3),
+            'wind_speed': number(values['wind_speed'][i], 3),
+            'land_suitability': values['land_suitability'][i],
+            'slope': number(values['slope'][i], 2),
+            'elevation': number(values['elevation'][i], 1),
+            'flood_risk': values['flood_risk'][i],
+            'cost_per_kwh': number(values['cost_per_kwh'][i], 4)
+        }
+    }
+    for key in ('id', 'name'):
+        if key in chunk:
+            entry[key] = chunk[key][i]
+    return entry
+
+def rank_sites(chunks: Iterable[Dict[str, np.ndarray]], k: int, weights: Dict[str, float],
+               constraints: Dict, max_candidates: int = MAX_CANDIDATES, keep_scores: bool = False) -> Dict:
+    """Keep the k best feasible candidates of a stream of chunks
+
+    Only a k-entry min-heap survives between chunks, so memory does not grow
+    with the number of candidates scanned. Ties keep the earlier candidate.
+    ``keep_scores`` adds the unrounded ``scores`` of the results, for merging
+    rankings of several scans.
+    """
+    heap: List = []
+    scanned = 0
+    feasible_count = 0
+
+    for chunk in chunks:
+        scanned += len(chunk['latitude'])
+        if scanned > max_candidates:
+            raise ValueError(f'More than {max_candidates} candidates; narrow the search area or submit a ranking job')
+
+        combined, scores, values = evaluate_chunk(chunk, weights)
+        candidates = np.flatnonzero(constraint_mask(values, constraints))
+        feasible_count += len(candidates)
+
+        if len(heap) == k:
+            candidates = candidates[combined[candidates] > heap[0][0]]
+        if len(candidates) > k:
+            best = np.argpartition(-combined[candidates], k - 1)[:k]
+            candidates = np.sort(candidates[best])
+
+        for i in candidates:
+            # Later candidates get a smaller tie-breaker, so they leave the heap first
+            item = (float(combined[i]), -(scanned - len(chunk['latitude']) + int(i)),
+                    describe_candidate(chunk, scores, values, weights, i))
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, item)
+
+    best = sorted(heap, key=lambda item: item[:2], reverse=True)
+    ranked = [item[2] for item in best]
+    for rank, entry in enumerate(ranked, start=1):
+        entry['rank'] = rank
+
+    ranking = {'scanned': scanned, 'feasible': feasible_count, 'results': ranked}
+    if keep_scores:
+        ranking['scores'] = [item[0] for item in best]
+    return ranking
+
+def parse_ranking_area(data):
+    """``(source, bbox, near, radius_km)`` of a ranking request"""
+    source = data.get('source', 'grid')
+    if source not in ('grid', 'locations'):
+        raise ValueError("source must be 'grid' or 'locations'")
+    try:
+        bbox = [float(v) for v in data['bbox']] if data.get('bbox') is not None else None
+        near = [float(v) for v in data['near']] if data.get('near') is not None else None
+        radius_km = float(data.get('radius_km', 10))
+    except (TypeError, ValueError):
+        raise ValueError('bbox, near and radius_km must be numeric')
+    if bbox is not None and (len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]):
+        raise ValueError('bbox must be [min_lat, min_lng, max_lat, max_lng]')
+    if near is not None and len(near) != 2:
+        raise ValueError('near must be [lat, lng]')
+    return source, bbox, near, radius_km
+
+def parse_ranking_source(data):
+    """Build the candidate chunk stream for a ranking request"""
+    source, bbox, near, radius_km = parse_ranking_area(data)
+    if source == 'locations':
+        return location_chunks(bbox=bbox, near=near, radius_km=radius_km if near is not None else None)
+    return grid_chunks(*bbox, parse_ranking_spacing(data, bbox))
+
+def parse_ranking_spacing(data, bbox, max_candidates=MAX_CANDIDATES):
+    """Grid spacing of a ranking request, checked against ``max_candidates``"""
+    if bbox is None:
+        raise ValueError('A grid ranking needs a bbox')
+    try:
+        spacing = float(data.get('spacing', 0.01))
+    except (TypeError, ValueError):
+        raise ValueError('spacing must be a number')
+    if spacing <= 0:
+        raise ValueError('spacing must be positive')
+    rows, cols = grid_shape(*bbox, spacing)
+    if rows * cols > max_candidates:
+        raise ValueError(f'Grid has {rows * cols} points, the limit is {max_candidates}')
+    return spacing
+
+def parse_ranking_options(data):
+    """``k``, weights and constraints of a ranking request"""
+    try:
+        k = int(data.get('k', 10))
+    except (TypeError, ValueError):
+        raise ValueError('k must be an integer')
+    if not 1 <= k <= MAX_TOP_K:
+        raise ValueError(f'k must be between 1 and {MAX_TOP_K}')
+    return k, parse_weights(data.get('weights')), parse_constraints(data.get('constraints'))
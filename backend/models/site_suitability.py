@@ -0,0 +1,111 @@
+import os
+import numpy as np
+from typing import Dict, Optional
+from database.spatial_index import get_spatial_index
+from database.elevation_provider import get_tile_store
+
+# Relative importance of each criterion in the combined suitability score
+SUITABILITY_WEIGHTS = {
+    'irradiance': 0.40,
+    'wind': 0.20,
+    'land': 0.25,
+    'terrain': 0.15
+}
+
+LAND_SUITABILITY_SCORES = {'High': 1.0, 'Medium': 0.6, 'Low': 0.2}
+
+# Resource readings are not extrapolated further than this from the nearest record
+MAX_RESOURCE_DISTANCE_KM = float(os.environ.get('MAX_RESOURCE_DISTANCE_KM', 500))
+
+# Ranges mapped linearly onto 0..1 scores
+IRRADIANCE_RANGE = (3.0, 7.0)    # kWh/m²/day
+WIND_SPEED_RANGE = (3.0, 9.0)    # m/s
+MAX_BUILDABLE_SLOPE = 15.0       # degrees
+
+def scale(values, low: float, high: float) -> np.ndarray:
+    return np.clip((np.asarray(values, dtype=float) - low) / (high - low), 0, 1)
+
+def resource_values(lats, lngs) -> Dict[str, np.ndarray]:
+    """Irradiance, wind speed and land suitability at each point from the datasets"""
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+    values = {}
+
+    solar_index = get_spatial_index('solar-irradiance')
+    values['irradiance'] = solar_index.interpolate_values(
+        lats, lngs, 'solar_irradiance', max_distance_km=MAX_RESOURCE_DISTANCE_KM
+    ) if solar_index is not None else np.full(lats.shape, np.nan)
+
+    wind_index = get_spatial_index('wind-speed')
+    values['wind_speed'] = wind_index.interpolate_values(
+        lats, lngs, 'wind_speed', max_distance_km=MAX_RESOURCE_DISTANCE_KM
+    ) if wind_index is not None else np.full(lats.shape, np.nan)
+
+    land_index = get_spatial_index('land-suitability')
+    values['land_suitability'] = land_index.nearest_values(
+        lats, lngs, 'land_suitability', max_distance_km=MAX_RESOURCE_DISTANCE_KM
+    ) if land_index is not None else np.full(lats.shape, None, dtype=object)
+
+    return values
+
+def criterion_scores(lats, lngs, slopes: Optional[np.ndarray] = None,
+                     values: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """0..1 score per criterion at each point; NaN where there is no data
+
+    ``values`` are the point's resource values if already looked up.
+    """
+    if values is None:
+        values = resource_values(lats, lngs)
+    land = values['land_suitability']
+
+    return {
+        'irradiance': scale(values['irradiance'], *IRRADIANCE_RANGE),
+        'wind': scale(values['wind_speed'], *WIND_SPEED_RANGE),
+        'land': np.array(
+            [LAND_SUITABILITY_SCORES.get(v, np.nan) for v in land.ravel()], dtype=float
+        ).reshape(land.shape),
+        'terrain': 1 - scale(slopes, 0, MAX_BUILDABLE_SLOPE)
+        if slopes is not None else np.full(np.shape(lats), np.nan)
+    }
+
+def combine_scores(scores: Dict[str, np.ndarray], weights: Dict[str, float] = SUITABILITY_WEIGHTS) -> np.ndarray:
+    """Weighted mean of the available criteria
+
+    Missing criteria are left out of the mean; points with no resource data
+    at all (terrain alone) are NaN.
+    """
+    total = 0.0
+    weight_sum = 0.0
+    for name, weight in weights.items():
+        score = scores[name]
+        available = ~np.isnan(score)
+        total = total + np.where(available, score * weight, 0.0)
+        weight_sum = weight_sum + np.where(available, weight, 0.0)
+
+    has_resource = np.zeros(np.shape(scores['irradiance']), dtype=bool)
+    for name in ('irradiance', 'wind', 'land'):
+        has_resource |= ~np.isnan(scores[name])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        combined = total / weight_sum
+    return np.where(has_resource, combined, np.nan)
+
+def grid_slopes(lats: np.ndarray, lngs: np.ndarray, elevations: Optional[np.ndarray] = None) -> np.ndarray:
+    """Slope in degrees over a regular lat/lng grid from local DEM tiles, NaN without coverage"""
+    if elevations is None:
+        elevations = get_tile_store().sample(lats.ravel(), lngs.ravel()).reshape(lats.shape)
+    if np.isnan(elevations).all() or min(lats.shape) < 2:
+        return np.full(lats.shape, np.nan)
+
+    meters_per_degree = 111320.0
+    row_spacing = np.abs(np.gradient(lats, axis=0)) * meters_per_degree
+    col_spacing = np.abs(np.gradient(lngs, axis=1)) * meters_per_degree * np.cos(np.radians(lats))
+    dz_row = np.gradient(elevations, axis=0) / np.maximum(row_spacing, 1e-6)
+    dz_col = np.gradient(elevations, axis=1) / np.maximum(col_spacing, 1e-6)
+    return np.degrees(np.arctan(np.hypot(dz_row, dz_col)))
+
+def score_grid(lats: np.ndarray, lngs: np.ndarray) -> Dict[str, np.ndarray]:
+    """Score a regular grid of points (rows north first) on every criterion"""
+    scores = criterion_scores(lats, lngs, grid_slopes(lats, lngs))
+    scores['score'] = combine_scores(scores)
+    return scores
@@ -1,33 +1,111 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from scipy import ndimage
 from sklearn.preprocessing import StandardScaler
 import requests
 import json
 from typing import Dict, List, Tuple, Optional
+from database.elevation_provider import get_elevation, get_elevations
+
+# Seconds each sub-analysis may take before it is reported as failed
+STAGE_TIMEOUT = float(os.environ.get('TERRAIN_STAGE_TIMEOUT', 15))
+
+# Locations analyzed at the same time, across every request in the process
+MAX_CONCURRENT_LOCATIONS = int(os.environ.get('TERRAIN_MAX_CONCURRENT_LOCATIONS', 8))
+
+# Elevation used when no source covers a point
+DEFAULT_ELEVATION = 357.0
+
+# Blocking stage lookups of all requests share these threads, one per stage of every concurrent location
+_stage_executor = ThreadPoolExecutor(max_workers=3 * MAX_CONCURRENT_LOCATIONS, thread_name_prefix='terrain-stage')
 
 class TerrainAnalyzer:
-    def __init__(self):
+    def __init__(self, stage_timeout: float = STAGE_TIMEOUT):
         self.elevation_data = None
         self.soil_data = None
         self.drainage_data = None
-
-    async def analyze_terrain(self, lat: float, lon: float) -> Dict:
-        """Perform comprehensive terrain analysis for a given location"""
-        elevation_data = await self.get_elevation_data(lat, lon)
-        soil_data = await self.analyze_soil_stability(lat, lon)
-        drainage_data = await self.analyze_drainage(lat, lon)
-
-        return {
-            'elevation_analysis': elevation_data,
-            'soil_stability': soil_data,
-            'drainage_analysis': drainage_data,
-            'recommendations': self.generate_recommendations(elevation_data, soil_data, drainage_data)
+        self.stage_timeout = stage_timeout
+
+    async def analyze_terrain(self, lat: float, lon: float, elevation: Optional[float] = None,
+                              elevation_error: Optional[str] = None) -> Dict:
+        """Perform comprehensive terrain analysis for a given location
+
+        The three sub-analyses run concurrently, each under its own timeout.
+        A stage that fails or times out is reported in ``errors`` and the
+        remaining results are still returned. An ``elevation`` fetched up
+        front is used instead of a lookup, and ``elevation_error`` reports a
+        failed up-front fetch as the elevation stage's error.
+        """
+        if elevation_error is not None:
+            elevation_stage = self._failed_stage(elevation_error)
+        else:
+            elevation_stage = self.get_elevation_data(lat, lon, elevation)
+        stages = {
+            'elevation_analysis': elevation_stage,
+            'soil_stability': self.analyze_soil_stability(lat, lon),
+            'drainage_analysis': self.analyze_drainage(lat, lon)
         }
-
-    async def get_elevation_data(self, lat: float, lon: float) -> Dict:
+        outcomes = await asyncio.gather(
+            *(self._run_stage(stage) for stage in stages.values()),
+            return_exceptions=True
+        )
+
+        results = {}
+        errors = {}
+        for name, outcome in zip(stages, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results[name] = None
+                errors[name] = f'Timed out after {self.stage_timeout}s'
+            elif isinstance(outcome, Exception):
+                results[name] = None
+                errors[name] = str(outcome)
+            else:
+                results[name] = outcome
+
+        results['recommendations'] = self.generate_recommendations(
+            results['elevation_analysis'], results['soil_stability'], results['drainage_analysis']
+        )
+        if errors:
+            results['errors'] = errors
+        results['partial'] = bool(errors)
+        return results
+
+    async def analyze_locations(self, locations: List[Tuple[float, float]]) -> List[Dict]:
+        """Analyze many locations, with all their elevations fetched in one batched lookup
+
+        Blocking stages run on the shared stage executor, which bounds how
+        many run at once across the process.
+        """
+        lats = [lat for lat, _ in locations]
+        lons = [lon for _, lon in locations]
+        try:
+            elevations = await self._run_blocking(self._fetch_elevations, lats, lons)
+        except Exception as e:
+            return await asyncio.gather(*(
+                self.analyze_terrain(lat, lon, elevation_error=str(e)) for lat, lon in locations
+            ))
+
+        return await asyncio.gather(*(
+            self.analyze_terrain(lat, lon, elevation) for (lat, lon), elevation in zip(locations, elevations)
+        ))
+
+    async def _run_stage(self, stage) -> Dict:
+        return await asyncio.wait_for(stage, timeout=self.stage_timeout)
+
+    async def _failed_stage(self, error: str) -> Dict:
+        raise RuntimeError(error)
+
+    async def _run_blocking(self, func, *args):
+        """Run a blocking lookup on the stage executor so stages overlap"""
+        return await asyncio.get_running_loop().run_in_executor(_stage_executor, func, *args)
+
+    async def get_elevation_data(self, lat: float, lon: float, elevation: Optional[float] = None) -> Dict:
         """Fetch and analyze elevation data for the location"""
-        # In real implementation, this would call a DEM (Digital Elevation Model) API
-        elevation = self._fetch_elevation_data(lat, lon)
+        if elevation is None:
+            # The lookup may block on the network, so keep it off the event loop
+            elevation = await self._run_blocking(self._fetch_elevation_data, lat, lon)
         slope = self._calculate_slope(elevation)
         roughness = self._calculate_surface_roughness(elevation)
 
@@ -40,7 +118,7 @@ class TerrainAnalyzer:
     async def analyze_soil_stability(self, lat: float, lon: float) -> Dict:
         """Analyze soil stability characteristics"""
         # In real implementation, this would integrate with soil databases
-        soil_data = self._fetch_soil_data(lat, lon)
+        soil_data = await self._run_blocking(self._fetch_soil_data, lat, lon)
         return {
             'soil_type': soil_data['type'],
             'foundation_strength': round(soil_data['strength'], 1),
@@ -49,7 +127,7 @@ class TerrainAnalyzer:
 
     async def analyze_drainage(self, lat: float, lon: float) -> Dict:
         """Analyze drainage patterns and water-related characteristics"""
-        drainage_data = self._fetch_drainage_data(lat, lon)
+        drainage_data = await self._run_blocking(self._fetch_drainage_data, lat, lon)
         return {
             'flow_direction': self._calculate_flow_direction(drainage_data),
             'flood_risk': self._assess_flood_risk(drainage_data),
@@ -57,9 +135,16 @@ class TerrainAnalyzer:
         }
 
     def _fetch_elevation_data(self, lat: float, lon: float) -> float:
-        """Simulate fetching elevation data from DEM service"""
-        # This would be replaced with actual API calls in production
-        return 357.0  # Example elevation in meters
+        """Fetch elevation from local DEM tiles or the remote elevation API"""
+        elevation = get_elevation(lat, lon)
+        if elevation is None:
+            return DEFAULT_ELEVATION
+        return elevation
+
+    def _fetch_elevations(self, lats: List[float], lons: List[float]) -> List[float]:
+        """Elevations of many points in one lookup, batching any remote calls"""
+        elevations = get_elevations(lats, lons)
+        return np.where(np.isnan(elevations), DEFAULT_ELEVATION, elevations).tolist()
 
     def _calculate_slope(self, elevation_data: float) -> float:
         """Calculate terrain slope"""
@@ -114,12 +199,19 @@ class TerrainAnalyzer:
         # This would use more complex flood modeling in production
         return 'Low'
 
-    def generate_recommendations(self, elevation_data: Dict, soil_data: Dict, drainage_data: Dict) -> List[str]:
-        """Generate site-specific recommendations based on analysis results"""
+    def generate_recommendations(self, elevation_data: Optional[Dict], soil_data: Optional[Dict],
+                                 drainage_data: Optional[Dict]) -> List[str]:
+        """Generate site-specific recommendations based on analysis results
+
+        Stages that failed are passed as None and their rules are skipped.
+        """
         recommendations = []
+        if soil_data is None:
+            return recommendations
 
         # Analyze site potential
-        if soil_data['foundation_strength'] > 30 and elevation_data['surface_roughness'] == 'Low':
+        if elevation_data is not None and soil_data['foundation_strength'] > 30 \
+                and elevation_data['surface_roughness'] == 'Low':
             recommendations.append('Site shows excellent potential for development')
 
         # Erosion control recommendations
@@ -0,0 +1,226 @@
+import numpy as np
+from scipy.special import gamma
+from typing import Dict, List, Optional
+from database.spatial_index import get_spatial_index
+from models.site_suitability import MAX_RESOURCE_DISTANCE_KM
+
+HOURS_PER_YEAR = 8760
+
+# Height (m) of the wind speeds in datasets/wind-speed.json
+REFERENCE_HEIGHT = 10.0
+
+# Shape factor used when no speed samples are available (Rayleigh distribution)
+DEFAULT_WEIBULL_K = 2.0
+
+# Availability, wake and electrical losses, in percent
+DEFAULT_LOSSES = 10.0
+
+# Surface roughness length (m) for each terrain roughness class of the terrain route
+ROUGHNESS_LENGTHS = {'Low': 0.03, 'Medium': 0.1, 'High': 0.4}
+
+# Wind speed bins (m/s) the Weibull distribution is integrated over
+SPEED_BINS = np.arange(0.0, 30.25, 0.25)
+
+# Generic turbines described by their power curve parameters
+TURBINES = {
+    'generic-10kw': {'rated_kw': 10, 'hub_height': 24, 'cut_in': 3.0, 'rated_speed': 11.0, 'cut_out': 25.0},
+    'generic-100kw': {'rated_kw': 100, 'hub_height': 37, 'cut_in': 3.0, 'rated_speed': 12.0, 'cut_out': 25.0},
+    'generic-2mw': {'rated_kw': 2000, 'hub_height': 80, 'cut_in': 3.5, 'rated_speed': 12.5, 'cut_out': 25.0},
+    'generic-3.6mw': {'rated_kw': 3600, 'hub_height': 100, 'cut_in': 3.0, 'rated_speed': 12.0, 'cut_out': 25.0}
+}
+DEFAULT_TURBINE = 'generic-2mw'
+
+def power_curve(turbine: Dict, speeds: np.ndarray = SPEED_BINS) -> np.ndarray:
+    """Power output (kW) at each speed: cubic between cut-in and rated, flat to cut-out"""
+    if 'curve' in turbine:
+        curve_speeds, curve_power = np.asarray(turbine['curve'], dtype=float).T
+        return np.interp(speeds, curve_speeds, curve_power, left=0.0, right=0.0)
+
+    cut_in, rated_speed, cut_out = turbine['cut_in'], turbine['rated_speed'], turbine['cut_out']
+    fraction = (speeds ** 3 - cut_in ** 3) / (rated_speed ** 3 - cut_in ** 3)
+    power = turbine['rated_kw'] * np.clip(fraction, 0, 1)
+    power[(speeds < cut_in) | (speeds > cut_out)] = 0.0
+    return power
+
+def fit_weibull(samples: np.ndarray):
+    """Method-of-moments Weibull ``(k, c)`` from observed wind speeds"""
+    samples = np.asarray(samples, dtype=float)
+    mean = samples.mean()
+    std = samples.std()
+    k = (std / mean) ** -1.086 if std > 0 else 10.0
+    return k, mean / gamma(1 + 1 / k)
+
+def weibull_scale(mean_speed, k) -> np.ndarray:
+    """Scale parameter c that gives the mean speed for shape k"""
+    return np.asarray(mean_speed, dtype=float) / gamma(1 + 1 / np.asarray(k, dtype=float))
+
+def shear_to_height(speed, height, roughness_length, reference_height=REFERENCE_HEIGHT) -> np.ndarray:
+    """Log-law extrapolation of wind speed from the reference height to ``height``"""
+    z0 = np.asarray(roughness_length, dtype=float)
+    return np.asarray(speed, dtype=float) * np.log(height / z0) / np.log(reference_height / z0)
+
+def weibull_pdf(speeds: np.ndarray, k: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Weibull probability density, broadcasting speeds against k and c"""
+    ratio = np.maximum(speeds, 1e-9) / c
+    return (k / c) * ratio ** (k - 1) * np.exp(-ratio ** k)
+
+def annual_energy(mean_speeds, k, roughness_lengths, turbine_ids: List[str],
+                  losses: float = DEFAULT_LOSSES, reference_height: float = REFERENCE_HEIGHT) -> Dict[str, np.ndarray]:
+    """Annual energy production for every site x turbine combination
+
+    ``mean_speeds``, ``k`` and ``roughness_lengths`` are per-site arrays of
+    the mean speed at ``reference_height``, Weibull shape and roughness length.
+    Returns (sites, turbines) arrays.
+    """
+    turbines = [TURBINES[turbine_id] for turbine_id in turbine_ids]
+    hub_heights = np.array([t['hub_height'] for t in turbines], dtype=float)
+    rated_kw = np.array([t['rated_kw'] for t in turbines], dtype=float)
+    curves = np.stack([power_curve(t) for t in turbines])  # (turbines, bins)
+
+    mean_speeds = np.asarray(mean_speeds, dtype=float)[:, None]
+    k = np.asarray(k, dtype=float)[:, None]
+    z0 = np.asarray(roughness_lengths, dtype=float)[:, None]
+
+    hub_speed = shear_to_height(mean_speeds, hub_heights[None, :], z0, reference_height)  # (sites, turbines)
+    c = weibull_scale(hub_speed, k)
+
+    bin_width = SPEED_BINS[1] - SPEED_BINS[0]
+    pdf = weibull_pdf(SPEED_BINS[None, None, :], k[..., None], c[..., None])  # (sites, turbines, bins)
+    mean_power = np.einsum('stb,tb->st', pdf, curves) * bin_width
+
+    aep = mean_power * HOURS_PER_YEAR * (1 - losses / 100)
+    return {
+        'aep_kwh': aep,
+        'capacity_factor': aep / (rated_kw[None, :] * HOURS_PER_YEAR),
+        'hub_mean_speed': hub_speed,
+        'weibull_k': np.broadcast_to(k, hub_speed.shape),
+        'weibull_c': c
+    }
+
+def parse_turbines(turbine_ids) -> List[str]:
+    """Turbine model names from a request; raises ValueError for anything else"""
+    if not isinstance(turbine_ids, list) or not all(isinstance(turbine_id, str) for turbine_id in turbine_ids):
+        raise ValueError('turbines must be a list of turbine model names')
+    unknown = [turbine_id for turbine_id in turbine_ids if turbine_id not in TURBINES]
+    if unknown:
+        raise ValueError(f'Unknown turbine models: {", ".join(unknown)}')
+    return turbine_ids
+
+def positive_value(site: Dict, name: str, upper: float = np.inf) -> Optional[float]:
+    """A site's optional numeric field, which must lie in (0, upper)"""
+    if site.get(name) is None:
+        return None
+    try:
+        value = float(site[name])
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a number')
+    if not 0 < value < upper:
+        raise ValueError(f'{name} must be positive' if upper == np.inf else f'{name} must be between 0 and {upper:g}')
+    return value
+
+def check_wind_sites(sites: List[Dict]):
+    """Raise ValueError for wind inputs that would give no meaningful Weibull fit
+
+    Samples may contain calm hours but must have a positive mean; a roughness
+    length must stay below the height the speeds are given at.
+    """
+    for site in sites:
+        samples = site.get('wind_speeds')
+        if samples:
+            try:
+                samples = np.asarray(samples, dtype=float)
+            except (TypeError, ValueError):
+                raise ValueError('wind_speeds must be a list of numbers')
+            if samples.ndim != 1 or not np.all(np.isfinite(samples)) or (samples < 0).any():
+                raise ValueError('wind_speeds must be a list of non-negative numbers')
+            if samples.mean() <= 0:
+                raise ValueError('wind_speeds must not all be zero')
+        positive_value(site, 'wind_speed')
+        positive_value(site, 'weibull_k')
+        positive_value(site, 'roughness_length', REFERENCE_HEIGHT)
+
+def site_wind_resource(sites: List[Dict]):
+    """Mean speed at the reference height, Weibull shape and data source per site
+
+    Uses ``wind_speeds`` samples or ``wind_speed`` from the request, otherwise
+    interpolates the wind dataset. Sites without data get NaN.
+    """
+    lats = np.array([site['latitude'] for site in sites], dtype=float)
+    lngs = np.array([site['longitude'] for site in sites], dtype=float)
+    mean_speeds = np.full(len(sites), np.nan)
+    k = np.full(len(sites), DEFAULT_WEIBULL_K)
+    sources = [None] * len(sites)
+
+    needs_dataset = []
+    for i, site in enumerate(sites):
+        if site.get('wind_speeds'):
+            k[i], c = fit_weibull(site['wind_speeds'])
+            mean_speeds[i] = c * gamma(1 + 1 / k[i])
+            sources[i] = 'request'
+        elif site.get('wind_speed') is not None:
+            mean_speeds[i] = float(site['wind_speed'])
+            sources[i] = 'request'
+        else:
+            needs_dataset.append(i)
+        if site.get('weibull_k') is not None:
+            k[i] = float(site['weibull_k'])
+
+    index = get_spatial_index('wind-speed')
+    if needs_dataset and index is not None:
+        rows = np.array(needs_dataset)
+        values = index.interpolate_values(lats[rows], lngs[rows], 'wind_speed',
+                                          max_distance_km=MAX_RESOURCE_DISTANCE_KM)
+        for i, value in zip(rows, values):
+            if not np.isnan(value):
+                mean_speeds[i] = value
+                sources[i] = 'dataset'
+
+    return mean_speeds, k, sources
+
+def predict_wind_yield(sites: List[Dict], turbine_ids: List[str],
+                       roughness_classes: Optional[List[str]] = None) -> List[Dict]:
+    """Per site x turbine AEP summaries, site-major order
+
+    Raises ValueError for unknown turbines or invalid wind inputs.
+    ``roughness_classes`` gives each site's terrain roughness class; a site's
+    own ``roughness_length`` takes precedence.
+    """
+    parse_turbines(turbine_ids)
+    check_wind_sites(sites)
+
+    mean_speeds, k, sources = site_wind_resource(sites)
+    classes = roughness_classes or ['Medium'] * len(sites)
+    z0 = np.array([
+        float(site['roughness_length']) if site.get('roughness_length') is not None
+        else ROUGHNESS_LENGTHS.get(roughness_class, ROUGHNESS_LENGTHS['Medium'])
+        for site, roughness_class in zip(sites, classes)
+    ])
+
+    usable = ~np.isnan(mean_speeds)
+    results = [None] * (len(sites) * len(turbine_ids))
+    if usable.any():
+        energy = annual_energy(mean_speeds[usable], k[usable], z0[usable], turbine_ids)
+        for row, site_number in enumerate(np.flatnonzero(usable)):
+            for t, turbine_id in enumerate(turbine_ids):
+                results[site_number * len(turbine_ids) + t] = {
+                    'site': int(site_number),
+                    'turbine': turbine_id,
+                    'wind_source': sources[site_number],
+                    'roughness_length': float(z0[site_number]),
+                    'hub_height': TURBINES[turbine_id]['hub_height'],
+                    'hub_mean_speed': round(float(energy['hub_mean_speed'][row, t]), 3),
+                    'weibull_k': round(float(energy['weibull_k'][row, t]), 3),
+                    'weibull_c': round(float(energy['weibull_c'][row, t]), 3),
+                    'aep_kwh': round(float(energy['aep_kwh'][row, t]), 1),
+                    'capacity_factor': round(float(energy['capacity_factor'][row, t]), 4)
+                }
+
+    for site_number in np.flatnonzero(~usable):
+        for t, turbine_id in enumerate(turbine_ids):
+            results[site_number * len(turbine_ids) + t] = {
+                'site': int(site_number),
+                'turbine': turbine_id,
+                'error': 'No wind data near this site; pass wind_speed'
+            }
+
+    return results
@@ -5,6 +5,9 @@ cost_estimation_bp = Blueprint('cost_estimation', __name__)
 
 @cost_estimation_bp.route('/', methods=['POST'])
 def estimate():
-    data = request.json
-    savings = estimate_savings(data)
-    return jsonify({'estimated_savings': savings})
\ No newline at end of file
+    data = request.get_json(silent=True) or {}
+    try:
+        savings = estimate_savings(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'estimated_savings': savings})
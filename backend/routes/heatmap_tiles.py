@@ -0,0 +1,118 @@
+from flask import Blueprint, Response, jsonify, request
+import click
+import hashlib
+import json
+import os
+import numpy as np
+from database.columnar_store import get_columnar_registry
+from database.dataset_registry import get_dataset_registry
+from models.site_suitability import SUITABILITY_WEIGHTS, score_grid
+from utils.tiles import TileCache, is_valid_tile, tile_bounds, tile_pixel_centers, colorize, encode_png, tiles_in_bbox
+
+heatmap_tiles_bp = Blueprint('heatmap_tiles', __name__, cli_group='heatmap')
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+TILE_CACHE_DIR = os.environ.get('TILE_CACHE_DIR', os.path.join(PROJECT_ROOT, 'cache', 'tiles'))
+
+PNG_TILE_SIZE = 256
+DEFAULT_JSON_TILE_SIZE = 64
+MAX_TILE_ZOOM = int(os.environ.get('HEATMAP_MAX_ZOOM', 14))
+
+# Datasets the suitability score is computed from
+SCORED_DATASETS = ['solar-irradiance', 'wind-speed', 'land-suitability']
+
+tile_cache = TileCache(TILE_CACHE_DIR)
+
+def data_version():
+    """Short hash of everything a tile depends on, used as the cache namespace"""
+    registry = get_dataset_registry()
+    columnar = get_columnar_registry()
+    parts = []
+    for name in SCORED_DATASETS:
+        # Scores come from the columnar copy when one has been ingested
+        dataset = columnar.get(name) or registry.get(name)
+        parts.append(dataset.etag if dataset is not None and dataset.etag else '-')
+    parts.append(json.dumps(SUITABILITY_WEIGHTS, sort_keys=True))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+def render_png_tile(z, x, y):
+    lats, lngs = tile_pixel_centers(z, x, y, PNG_TILE_SIZE)
+    return encode_png(colorize(score_grid(lats, lngs)['score']))
+
+def render_json_tile(z, x, y, size):
+    """Scores as integers 0-100 on a size x size grid, null where there is no data"""
+    lats, lngs = tile_pixel_centers(z, x, y, size)
+    scores = score_grid(lats, lngs)['score']
+    values = np.where(np.isnan(scores), -1, np.rint(scores * 100)).astype(int)
+
+    south, west, north, east = tile_bounds(z, x, y)
+    return json.dumps({
+        'z': z,
+        'x': x,
+        'y': y,
+        'size': size,
+        'bounds': [south, west, north, east],
+        'values': [[v if v >= 0 else None for v in row] for row in values.tolist()]
+    }, separators=(',', ':')).encode('utf-8')
+
+def get_tile(z, x, y, fmt, size=DEFAULT_JSON_TILE_SIZE, version=None):
+    """Return the tile bytes, rendering and caching them on first use"""
+    version = version or data_version()
+    if fmt == 'png':
+        return tile_cache.get_or_render(version, z, x, y, 'png', lambda: render_png_tile(z, x, y))
+    return tile_cache.get_or_render(
+        version, z, x, y, f'{size}.json', lambda: render_json_tile(z, x, y, size)
+    )
+
+def tile_response(z, x, y, fmt):
+    if not is_valid_tile(z, x, y, MAX_TILE_ZOOM):
+        return jsonify({'error': 'Tile out of range'}), 404
+
+    size = request.args.get('size', DEFAULT_JSON_TILE_SIZE, type=int)
+    if fmt == 'json' and not 8 <= size <= PNG_TILE_SIZE:
+        return jsonify({'error': f'size must be between 8 and {PNG_TILE_SIZE}'}), 400
+
+    version = data_version()
+    etag = f'{version}-{z}-{x}-{y}-{fmt}' + (f'-{size}' if fmt == 'json' else '')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        try:
+            data = get_tile(z, x, y, fmt, size, version)
+        except Exception as e:
+            return jsonify({'error': f'Could not render tile: {str(e)}'}), 500
+        response = Response(data, mimetype='image/png' if fmt == 'png' else 'application/json')
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+@heatmap_tiles_bp.route('/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def png_tile(z, x, y):
+    return tile_response(z, x, y, 'png')
+
+@heatmap_tiles_bp.route('/<int:z>/<int:x>/<int:y>.json', methods=['GET'])
+def json_tile(z, x, y):
+    return tile_response(z, x, y, 'json')
+
+@heatmap_tiles_bp.route('/stats', methods=['GET'])
+def tile_stats():
+    return jsonify(dict(tile_cache.counters, version=data_version()))
+
+@heatmap_tiles_bp.cli.command('prewarm')
+@click.option('--bbox', required=True, help='min_lat,min_lng,max_lat,max_lng')
+@click.option('--zooms', default='3-8', show_default=True, help='Zoom level or range, e.g. 6 or 3-8')
+@click.option('--format', 'fmt', type=click.Choice(['png', 'json']), default='png', show_default=True)
+@click.option('--size', default=DEFAULT_JSON_TILE_SIZE, show_default=True, help='Grid size of JSON tiles')
+def prewarm_tiles(bbox, zooms, fmt, size):
+    """Render every heatmap tile covering a bounding box into the tile cache"""
+    min_lat, min_lng, max_lat, max_lng = (float(v) for v in bbox.split(','))
+    first, _, last = zooms.partition('-')
+    zoom_levels = range(int(first), int(last or first) + 1)
+
+    version = data_version()
+    for z in zoom_levels:
+        tiles = list(tiles_in_bbox(min_lat, min_lng, max_lat, max_lng, z))
+        with click.progressbar(tiles, label=f'zoom {z}: {len(tiles)} tiles') as bar:
+            for x, y in bar:
+                get_tile(z, x, y, fmt, size, version)
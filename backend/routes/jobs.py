@@ -0,0 +1,94 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+import json
+from database.elevation_client import ElevationUnavailable
+from models.job_types import JOB_TYPES
+from routes.site_selection import wants_ndjson
+from utils.jobs import JobManager
+
+jobs_bp = Blueprint('jobs', __name__)
+
+job_manager = JobManager(JOB_TYPES)
+
+def job_url(job):
+    return f'{request.script_root}/api/jobs/{job.id}'
+
+@jobs_bp.route('/', methods=['POST'])
+def submit_job():
+    """Start a job from ``{"type": ..., "params": {...}}``
+
+    ``params`` take the same body as the matching synchronous endpoint. An
+    identical submission returns the existing job instead of starting a new one.
+    """
+    data = request.get_json(silent=True) or {}
+    params = data.get('params')
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    try:
+        job, created = job_manager.submit(data.get('type'), params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ElevationUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+
+    response = jsonify(dict(job.snapshot(), created=created))
+    response.status_code = 200 if job.status == 'done' else 202
+    response.headers['Location'] = job_url(job)
+    return response
+
+@jobs_bp.route('/', methods=['GET'])
+def list_jobs():
+    return jsonify(job_manager.list())
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot())
+
+@jobs_bp.route('/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    """The merged result, or one NDJSON line per result item with ``?format=ndjson``"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status in ('failed', 'cancelled'):
+        return jsonify(job.snapshot()), 409
+    if job.status != 'done':
+        return jsonify(job.snapshot()), 202
+
+    result = job_manager.result(job_id)
+    if result is None:
+        return jsonify({'error': 'Job result expired'}), 404
+    if not wants_ndjson():
+        return jsonify(result)
+
+    fields = JOB_TYPES[job.kind].stream_fields
+
+    def generate():
+        # Summary fields first, then every item tagged with the list it belongs to
+        yield json.dumps({key: value for key, value in result.items() if key not in fields}) + '\n'
+        for field in fields:
+            for item in result.get(field, []):
+                yield json.dumps(dict(item, field=field)) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@jobs_bp.route('/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """NDJSON status lines whenever progress changes, until the job finishes"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        for snapshot in job_manager.watch(job):
+            yield json.dumps(snapshot) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@jobs_bp.route('/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    if not job_manager.cancel(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    return '', 204
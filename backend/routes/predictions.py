@@ -1,10 +1,15 @@
 from flask import Blueprint, request, jsonify
 from models.energy_prediction import predict_energy
+from utils.encoding import numeric_response, response_format
 
 predictions_bp = Blueprint('predictions', __name__)
 
 @predictions_bp.route('/', methods=['POST'])
 def predict():
-    data = request.json
-    prediction = predict_energy(data)
-    return jsonify({'predicted_output': prediction})
\ No newline at end of file
+    data = request.get_json(silent=True) or {}
+    try:
+        fmt = response_format()
+        prediction = predict_energy(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return numeric_response({'predicted_output': prediction}, fmt)
@@ -1,9 +1,170 @@
-from flask import Blueprint, jsonify
-from database.locations_data import get_locations
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
+import json
+import os
+import time
+from database.locations_data import find_locations, serialize_document
+from models.site_clusters import get_dataset_clusters, get_location_clusters
+from models.site_ranking import parse_ranking_options, parse_ranking_source, rank_sites
 
 site_selection_bp = Blueprint('site_selection', __name__)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Upper bound on the clusters and points a single clusters request may return
+MAX_CLUSTERS = int(os.environ.get('CLUSTER_MAX_RESULTS', 5000))
+
+def parse_float_list(value, count, name):
+    try:
+        numbers = [float(v) for v in value.split(',')]
+    except ValueError:
+        numbers = []
+    if len(numbers) != count:
+        raise ValueError(f'{name} must be {count} comma-separated numbers')
+    return numbers
+
+def check_coordinates(lats, lngs, name):
+    if not all(-90 <= lat <= 90 for lat in lats) or not all(-180 <= lng <= 180 for lng in lngs):
+        raise ValueError(f'{name} latitudes must be within ±90 and longitudes within ±180')
+
+def parse_site_filters(args):
+    """Read the pagination, projection and geospatial query parameters"""
+    filters = {}
+
+    if 'bbox' in args:
+        bbox = parse_float_list(args['bbox'], 4, 'bbox')
+        if not (bbox[0] < bbox[2] and bbox[1] < bbox[3]):
+            raise ValueError('bbox must be min_lat,min_lng,max_lat,max_lng')
+        check_coordinates(bbox[0::2], bbox[1::2], 'bbox')
+        filters['bbox'] = bbox
+
+    if 'near' in args:
+        filters['near'] = parse_float_list(args['near'], 2, 'near')
+        check_coordinates(filters['near'][:1], filters['near'][1:], 'near')
+        filters['radius_km'] = args.get('radius_km', 10, type=float)
+        if filters['radius_km'] <= 0:
+            raise ValueError('radius_km must be positive')
+
+    if 'fields' in args:
+        filters['fields'] = [field.strip() for field in args['fields'].split(',') if field.strip()]
+
+    filters['after'] = args.get('cursor') or None
+    return filters
+
+def encode_line(document) -> str:
+    return json.dumps(serialize_document(document), separators=(',', ':')) + '\n'
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
 @site_selection_bp.route('/', methods=['GET'])
 def fetch_sites():
-    locations = list(get_locations())
-    return jsonify(locations)
\ No newline at end of file
+    """List sites a page at a time, or stream every match as NDJSON
+
+    The next page is requested with ``?cursor=<X-Next-Cursor>``.
+    """
+    try:
+        filters = parse_site_filters(request.args)
+        stream = wants_ndjson()
+        limit = request.args.get('limit', None if stream else DEFAULT_PAGE_SIZE, type=int)
+        if limit is not None and (limit < 1 or (not stream and limit > MAX_PAGE_SIZE)):
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+        cursor = find_locations(limit=limit, **filters)
+        if stream:
+            # Run the query before any headers go out, so its failures still get a status code
+            first = next(cursor, None)
+
+    except (ValueError, InvalidId) as e:
+        return jsonify({'error': str(e)}), 400
+    except PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 503
+
+    if stream:
+        def generate():
+            # Send each document as soon as the cursor yields it
+            try:
+                if first is not None:
+                    yield encode_line(first)
+                for document in cursor:
+                    yield encode_line(document)
+            except PyMongoError as e:
+                # The status is already sent; end the stream with an error line instead of cutting it off
+                yield json.dumps({'error': f'Database error: {str(e)}'}) + '\n'
+            finally:
+                cursor.close()
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    try:
+        locations = [serialize_document(document) for document in cursor]
+    except PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 503
+
+    response = jsonify(locations)
+    if len(locations) == limit:
+        response.headers['X-Next-Cursor'] = locations[-1]['_id']
+    return response
+
+@site_selection_bp.route('/clusters', methods=['GET'])
+def fetch_clusters():
+    """Sites inside ``bbox`` aggregated into clusters for map ``zoom``
+
+    Clusters carry their centroid, count and mean ranking score; lone sites
+    are returned as points with their id. ``dataset`` clusters the records of
+    a resource dataset instead, scored by its numeric ``field``.
+    """
+    started = time.perf_counter()
+    try:
+        bbox = parse_site_filters({'bbox': request.args.get('bbox', '')})['bbox']
+        zoom = request.args.get('zoom', type=int)
+        if zoom is None or not 0 <= zoom <= 30:
+            raise ValueError('zoom must be an integer between 0 and 30')
+
+        dataset = request.args.get('dataset')
+        if dataset:
+            index = get_dataset_clusters(dataset, request.args.get('field'))
+            if index is None:
+                return jsonify({'error': f'Dataset {dataset} not found'}), 404
+        else:
+            index = get_location_clusters()
+        clusters = index.clusters(*bbox, zoom, limit=MAX_CLUSTERS)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 503
+
+    return jsonify({
+        'zoom': zoom,
+        'bbox': bbox,
+        'total': sum(cluster['count'] for cluster in clusters),
+        'clusters': clusters,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
+
+@site_selection_bp.route('/rank', methods=['POST'])
+def rank():
+    """Top-k sites of a bbox grid or the locations collection by weighted criteria"""
+    data = request.get_json(silent=True) or {}
+    started = time.perf_counter()
+    try:
+        k, weights, constraints = parse_ranking_options(data)
+        ranking = rank_sites(parse_ranking_source(data), k, weights, constraints)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except PyMongoError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 503
+
+    return jsonify(dict(
+        ranking,
+        k=k,
+        weights=weights,
+        constraints=constraints,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1)
+    ))
@@ -1,40 +1,371 @@
-from flask import Blueprint, jsonify
-import json
+from flask import Blueprint, Response, jsonify, request
+import click
 import os
-from pathlib import Path
+import requests
+from database.columnar_store import get_columnar_registry, ingest, iter_source_rows
+from database.dataset_registry import DATASETS_DIR, get_dataset_registry
+from database.spatial_index import get_spatial_index
+from models.irradiance_stats import (
+    STATS, aggregate_unit, daily_aggregates, default_stat, monthly_aggregates,
+    series_percentiles, typical_day_profiles
+)
+from routes.solar_routes import fetch_monthly_irradiance, hourly_series, pvgis_cache, series_cache
+from utils.encoding import numeric_response, response_format
+from utils.metrics import span
 
-solar_data_bp = Blueprint('solar_data', __name__)
+solar_data_bp = Blueprint('solar_data', __name__, cli_group='datasets')
+
+# Upper bound on records returned by a single spatial query
+MAX_QUERY_RESULTS = 10000
+
+# Load every dataset once at startup; later requests only copy the encoded bytes
+dataset_registry = get_dataset_registry()
+
+def serve_dataset(name):
+    """Return a dataset's pre-encoded response, honouring ETags and gzip"""
+    dataset = dataset_registry.get(name)
+
+    # Check if file exists
+    if dataset is None:
+        return None
+
+    if dataset.error is not None:
+        return jsonify({
+            'error': 'Invalid data format',
+            'message': f'The {name} data file is corrupted or malformed'
+        }), 500
+
+    use_gzip = dataset.gzip_body is not None and 'gzip' in request.accept_encodings
+    etag = dataset.etag + '-gz' if use_gzip else dataset.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(
+            dataset.gzip_body if use_gzip else dataset.body,
+            mimetype='application/json'
+        )
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @solar_data_bp.route('/solar-data', methods=['GET'])
 def get_solar_data():
     try:
-        # Get the project root directory
-        project_root = Path(__file__).parent.parent.parent
-        data_file = project_root / 'datasets' / 'solar-irradiance.json'
-
-        # Check if file exists
-        if not data_file.exists():
+        response = serve_dataset('solar-irradiance')
+        if response is None:
             return jsonify({
                 'error': 'Solar data file not found',
                 'message': 'The solar irradiance data is currently unavailable'
             }), 404
 
-        # Read and parse the JSON file
-        with open(data_file, 'r') as f:
-            solar_data = json.load(f)
-
-        return jsonify({
-            'success': True,
-            'data': solar_data
-        }), 200
+        return response
 
-    except json.JSONDecodeError:
+    except Exception as e:
         return jsonify({
-            'error': 'Invalid data format',
-            'message': 'The solar data file is corrupted or malformed'
+            'error': 'Server error',
+            'message': f'An unexpected error occurred: {str(e)}'
         }), 500
+
+@solar_data_bp.route('/datasets', methods=['GET'])
+def list_datasets():
+    columnar = get_columnar_registry().names()
+    return jsonify({
+        'datasets': sorted(set(dataset_registry.names()) | set(columnar)),
+        'columnar': columnar
+    })
+
+@solar_data_bp.route('/datasets/<name>', methods=['GET'])
+def get_dataset(name):
+    try:
+        response = serve_dataset(name)
+        if response is None:
+            # Columnar datasets are too large to send whole; describe them instead
+            columnar = get_columnar_registry().get(name)
+            if columnar is not None and columnar.error is None:
+                return jsonify({'success': True, 'columnar': True, 'manifest': columnar.manifest})
+            return jsonify({
+                'error': 'Dataset not found',
+                'message': f'No dataset named {name}'
+            }), 404
+
+        return response
+
     except Exception as e:
         return jsonify({
             'error': 'Server error',
             'message': f'An unexpected error occurred: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+def parse_spatial_query():
+    """Read the dataset, lat and lon query parameters shared by the spatial endpoints"""
+    name = request.args.get('dataset', 'solar-irradiance')
+    index = get_spatial_index(name)
+    if index is None:
+        raise LookupError(f'No spatial dataset named {name}')
+
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    return index, lat, lon
+
+def require_point(lat, lon):
+    if lat is None or lon is None:
+        raise ValueError('Latitude and longitude are required')
+    if abs(lat) > 90 or abs(lon) > 180:
+        raise ValueError('Coordinates out of range')
+
+def located_records(index, indices, distances=None):
+    records = []
+    for position, i in enumerate(indices[:MAX_QUERY_RESULTS]):
+        record = dict(index.records[i])
+        if distances is not None:
+            record['distance_km'] = round(float(distances[position]), 3)
+        records.append(record)
+    return records
+
+@solar_data_bp.route('/nearest', methods=['GET'])
+def nearest_records():
+    try:
+        index, lat, lon = parse_spatial_query()
+        require_point(lat, lon)
+        k = request.args.get('k', 1, type=int)
+        if k < 1:
+            raise ValueError('k must be at least 1')
+
+        indices, distances = index.nearest(lat, lon, min(k, MAX_QUERY_RESULTS))
+        return jsonify({'success': True, 'data': located_records(index, indices, distances)})
+
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@solar_data_bp.route('/radius', methods=['GET'])
+def records_within_radius():
+    try:
+        index, lat, lon = parse_spatial_query()
+        require_point(lat, lon)
+        radius_km = request.args.get('radius_km', type=float)
+        if radius_km is None or radius_km <= 0:
+            raise ValueError('A positive radius_km is required')
+
+        indices, distances = index.within_radius(lat, lon, radius_km)
+        return jsonify({
+            'success': True,
+            'count': len(indices),
+            'data': located_records(index, indices, distances)
+        })
+
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@solar_data_bp.route('/bbox', methods=['GET'])
+def records_within_bbox():
+    try:
+        index, _, _ = parse_spatial_query()
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in request.args.get('bbox', '').split(','))
+        except ValueError:
+            raise ValueError('bbox must be min_lat,min_lon,max_lat,max_lon')
+        if min_lat > max_lat:
+            raise ValueError('min_lat must not exceed max_lat')
+
+        indices = index.within_bbox(min_lat, min_lon, max_lat, max_lon)
+        return jsonify({
+            'success': True,
+            'count': len(indices),
+            'data': located_records(index, indices)
+        })
+
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@solar_data_bp.route('/interpolate', methods=['GET'])
+def interpolate_records():
+    try:
+        index, lat, lon = parse_spatial_query()
+        require_point(lat, lon)
+        k = request.args.get('k', 4, type=int)
+        if k < 1:
+            raise ValueError('k must be at least 1')
+
+        result = index.interpolate(lat, lon, k=min(k, 64))
+        if result is None:
+            raise LookupError('Dataset has no located records')
+
+        return jsonify(dict(result, success=True, latitude=lat, longitude=lon))
+
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+def parse_series_query():
+    """``(series, lat, lon, field, stat)`` from the query string of the irradiance endpoints"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+    except (KeyError, ValueError):
+        raise ValueError('Numeric lat and lon are required')
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise ValueError('lat or lon out of range')
+
+    field = request.args.get('field', 'G(i)')
+    stat = request.args.get('stat') or default_stat(field)
+    if stat not in STATS:
+        raise ValueError(f'stat must be one of {", ".join(STATS)}')
+
+    series = hourly_series(lat, lon)
+    if field not in series.fields:
+        raise ValueError(f'field must be one of {", ".join(series.fields)}')
+    return series, lat, lon, field, stat
+
+def series_response(series, lat, lon, field, **payload):
+    fmt = response_format()
+    q_lat, q_lon = series_cache.quantize(lat, lon)
+    return numeric_response(dict(
+        latitude=q_lat,
+        longitude=q_lon,
+        field=field,
+        start=str(series.start),
+        hours=len(series),
+        **payload
+    ), fmt)
+
+def series_error(e):
+    """Bad input is a 400, a missing field a 404 and upstream failures a 502"""
+    if isinstance(e, requests.exceptions.RequestException):
+        return jsonify({'error': f'Error fetching solar data: {str(e)}'}), 502
+    if isinstance(e, LookupError):
+        return jsonify({'error': str(e)}), 404
+    return jsonify({'error': str(e)}), 400
+
+@solar_data_bp.route('/irradiance/daily', methods=['GET'])
+def daily_irradiance():
+    """Daily totals (energy fields) or means of one hourly field"""
+    try:
+        series, lat, lon, field, stat = parse_series_query()
+        with span('irradiance.aggregate'):
+            result = daily_aggregates(series, field, stat)
+        return series_response(series, lat, lon, field, stat=stat, unit=aggregate_unit(field, stat), **result)
+    except (LookupError, ValueError, requests.exceptions.RequestException) as e:
+        return series_error(e)
+
+@solar_data_bp.route('/irradiance/monthly', methods=['GET'])
+def monthly_irradiance():
+    try:
+        series, lat, lon, field, stat = parse_series_query()
+        with span('irradiance.aggregate'):
+            result = monthly_aggregates(series, field, stat)
+        return series_response(series, lat, lon, field, stat=stat, unit=aggregate_unit(field, stat), **result)
+    except (LookupError, ValueError, requests.exceptions.RequestException) as e:
+        return series_error(e)
+
+@solar_data_bp.route('/irradiance/percentiles', methods=['GET'])
+def irradiance_percentiles():
+    """Percentiles of hourly, daylight-hour or daily values, ``q`` as a comma separated list"""
+    try:
+        try:
+            percentiles = [float(q) for q in request.args.get('q', '10,50,90').split(',')]
+        except ValueError:
+            raise ValueError('q must be a comma separated list of numbers')
+        if not percentiles or not all(0 <= q <= 100 for q in percentiles):
+            raise ValueError('Percentiles must be between 0 and 100')
+
+        period = request.args.get('period', 'daily')
+        series, lat, lon, field, stat = parse_series_query()
+        with span('irradiance.aggregate'):
+            result = series_percentiles(series, field, percentiles, period, stat)
+        if period == 'daily':
+            return series_response(series, lat, lon, field, stat=stat, unit=aggregate_unit(field, stat), **result)
+        return series_response(series, lat, lon, field, unit=aggregate_unit(field, 'mean'), **result)
+    except (LookupError, ValueError, requests.exceptions.RequestException) as e:
+        return series_error(e)
+
+@solar_data_bp.route('/irradiance/typical-day', methods=['GET'])
+def typical_day():
+    """Mean hourly profile (UTC) of each month, or of one ``month``"""
+    try:
+        month = request.args.get('month', type=int)
+        if month is not None and not 1 <= month <= 12:
+            raise ValueError('month must be between 1 and 12')
+        series, lat, lon, field, _ = parse_series_query()
+
+        with span('irradiance.aggregate'):
+            result = typical_day_profiles(series, field)
+        if month is not None:
+            result = {'hour_of_day': result['hour_of_day'], 'month': month, 'values': result['profiles'][month - 1]}
+        else:
+            result['months'] = list(range(1, 13))
+        return series_response(series, lat, lon, field, unit=aggregate_unit(field, 'mean'), **result)
+    except (LookupError, ValueError, requests.exceptions.RequestException) as e:
+        return series_error(e)
+
+@solar_data_bp.route('/pvgis', methods=['GET'])
+def pvgis_monthly():
+    """Monthly irradiation (PVGIS ``H(i)_m``, on a horizontal plane) of a location
+
+    Answered from the PVGIS cache, where nearby requests share one entry and
+    concurrent misses one upstream lookup.
+    """
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        require_point(lat, lon)
+        with span('pvgis.lookup'):
+            monthly = pvgis_cache.get_or_fetch(lat, lon, fetch_monthly_irradiance)
+        if not monthly:
+            raise LookupError('No solar data available for this location')
+    except (LookupError, ValueError, requests.exceptions.RequestException) as e:
+        return series_error(e)
+
+    q_lat, q_lon = pvgis_cache.quantize(lat, lon)
+    return jsonify({
+        'latitude': q_lat,
+        'longitude': q_lon,
+        'monthly': monthly,
+        'mean_monthly_irradiation': round(sum(month['H(i)_m'] for month in monthly) / len(monthly), 2),
+        'unit': 'kWh/m2'
+    })
+
+@solar_data_bp.cli.command('ingest')
+@click.argument('source', type=click.Path(exists=True, dir_okay=False))
+@click.option('--name', help='Dataset name; defaults to the source file name')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json', 'ndjson']), help='Defaults to the file extension')
+@click.option('--directory', default=DATASETS_DIR, show_default=True, type=click.Path(file_okay=False))
+def ingest_dataset(source, name, fmt, directory):
+    """Convert a CSV, JSON or NDJSON file into a memory-mapped columnar dataset"""
+    name = name or os.path.splitext(os.path.basename(source))[0]
+    try:
+        manifest = ingest(
+            iter_source_rows(source, fmt), name, directory, source=os.path.basename(source),
+            progress=lambda rows: click.echo(f'{rows} rows', err=True)
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f'{name}: {manifest["rows"]} rows')
+    for field, column in manifest['columns'].items():
+        detail = f'{len(column["categories"])} categories' if column['kind'] == 'category' else column['dtype']
+        click.echo(f'  {field}: {column["kind"]} ({detail})')
+
+@solar_data_bp.cli.command('info')
+@click.argument('name')
+def dataset_info(name):
+    """Show the manifest of a columnar dataset"""
+    dataset = get_columnar_registry().get(name)
+    if dataset is None:
+        raise click.ClickException(f'No columnar dataset named {name}')
+    if dataset.error is not None:
+        raise click.ClickException(f'Unreadable manifest: {dataset.error}')
+    click.echo(f'{name}: {len(dataset)} rows')
+    for field in dataset.fields:
+        click.echo(f'  {field}: {dataset.kind(field)}')
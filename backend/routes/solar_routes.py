@@ -1,10 +1,50 @@
 from flask import Blueprint, jsonify, request
+import os
 import requests
+from database.irradiance_store import get_irradiance_store, parse_hourly_series, series_cache
+from models.irradiance_stats import monthly_irradiation_records
+from utils.cache import get_cache
+from utils.metrics import span
 
 solar_bp = Blueprint('solar', __name__)
 
 # PVGIS API configuration
-PVGIS_API_BASE = 'https://re.jrc.ec.europa.eu/api/v5/'
+PVGIS_API_BASE = os.environ.get('PVGIS_API_BASE', 'https://re.jrc.ec.europa.eu/api/v5/')
+PVGIS_TIMEOUT = 30
+PVGIS_STREAM_CHUNK_BYTES = 64 * 1024
+
+# A year of PVGIS data barely changes within ~1 km, so cache per quantized location
+pvgis_cache = get_cache('pvgis', ttl=7 * 24 * 3600, max_entries=4096, precision=2)
+
+def download_hourly_series(lat, lon):
+    """Stream a year of hourly PVGIS values for a location into the irradiance store"""
+    # angle=0 (the PVGIS default, stated for clarity) puts the plane flat, so G(i) is global horizontal irradiance
+    url = f"{PVGIS_API_BASE}seriescalc?lat={lat}&lon={lon}&raddatabase=PVGIS-SARAH2&outputformat=json&pvcalculation=1&pvtechchoice=crystSi&mountingplace=free&loss=14&angle=0&trackingtype=0&startyear=2020&endyear=2020"
+
+    with span('pvgis.request'):
+        response = requests.get(url, timeout=PVGIS_TIMEOUT, stream=True)
+        response.raise_for_status()
+
+    with response, span('pvgis.parse'):
+        try:
+            series = parse_hourly_series(response.iter_content(chunk_size=PVGIS_STREAM_CHUNK_BYTES))
+        except ValueError as e:
+            # A bad upstream body is not the caller's fault, unlike other ValueErrors
+            raise requests.exceptions.InvalidJSONError(str(e), response=response)
+    return get_irradiance_store().save(lat, lon, series, source='PVGIS-SARAH2')
+
+def load_hourly_series(lat, lon):
+    """The stored series for a quantized location, downloading it only the first time"""
+    series = get_irradiance_store().load(lat, lon)
+    return series if series is not None else download_hourly_series(lat, lon)
+
+def hourly_series(lat, lon):
+    with span('irradiance.series'):
+        return series_cache.get_or_fetch(lat, lon, load_hourly_series)
+
+def fetch_monthly_irradiance(lat, lon):
+    """Monthly PVGIS irradiance records for a location, derived from its hourly series"""
+    return monthly_irradiation_records(hourly_series(lat, lon))
 
 @solar_bp.route('/api/solar/solar-data', methods=['GET'])
 def get_solar_data():
@@ -18,17 +58,16 @@ def get_solar_data():
                 'error': 'Latitude and longitude are required'
             }), 400
 
-        # Construct PVGIS API URL
-        url = f"{PVGIS_API_BASE}seriescalc?lat={lat}&lon={lon}&raddatabase=PVGIS-SARAH2&outputformat=json&pvcalculation=1&pvtechchoice=crystSi&mountingplace=free&loss=14&trackingtype=0&startyear=2020&endyear=2020"
-
-        # Make request to PVGIS API
-        response = requests.get(url)
-        response.raise_for_status()
-
-        data = response.json()
+        try:
+            lat_value, lon_value = float(lat), float(lon)
+        except ValueError:
+            return jsonify({
+                'error': 'Latitude and longitude must be numbers'
+            }), 400
 
-        # Transform data for frontend
-        monthly_data = data.get('outputs', {}).get('monthly', {}).get('fixed', [])
+        # Fetch from PVGIS unless a nearby location is already cached
+        with span('pvgis.lookup'):
+            monthly_data = pvgis_cache.get_or_fetch(lat_value, lon_value, fetch_monthly_irradiance)
         
         if not monthly_data:
             return jsonify({
@@ -52,4 +91,4 @@ def get_solar_data():
     except Exception as e:
         return jsonify({
             'error': f'Unexpected error: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
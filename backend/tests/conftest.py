@@ -0,0 +1,80 @@
+"""Shared fixtures for the backend tests
+
+The app reads its configuration from the environment at import time, so the
+environment is pointed at scratch directories and in-process stand-ins here,
+before any test module imports it: a copy of the bundled datasets, one
+synthetic DEM tile, mongomock and no remote elevation calls.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix='backend-tests-')
+DATASETS_DIR = os.path.join(SCRATCH_DIR, 'datasets')
+DEM_TILE_DIR = os.path.join(SCRATCH_DIR, 'dem')
+
+# South-west corner of the synthetic DEM tile; sites inside it get DEM-based metrics
+DEM_TILE = (35, -111)
+DEM_SITE = (35.5, -110.5)
+
+shutil.copytree(os.path.join(BACKEND_DIR, '..', 'datasets'), DATASETS_DIR)
+os.environ.update({
+    'DATASETS_DIR': DATASETS_DIR,
+    'DEM_TILE_DIR': DEM_TILE_DIR,
+    'MONGO_URI': 'mongomock://localhost',
+    'ELEVATION_REMOTE_FALLBACK': 'false',
+    'CACHE_DIR': os.path.join(SCRATCH_DIR, 'cache'),
+    'IRRADIANCE_STORE_DIR': os.path.join(SCRATCH_DIR, 'irradiance'),
+    'TILE_CACHE_DIR': os.path.join(SCRATCH_DIR, 'tiles'),
+    'JOB_RESULT_DIR': os.path.join(SCRATCH_DIR, 'jobs'),
+    'JOB_WORKERS': '2'
+})
+
+def synthetic_dem(side=1201):
+    """A ridge running north-south with a valley on each side, in meters"""
+    rows, cols = np.mgrid[0:side, 0:side] / (side - 1)
+    dem = 1200 + 400 * np.cos(3 * np.pi * cols) * np.exp(-((rows - 0.5) ** 2)) + 150 * rows
+    return dem.astype(np.int16)
+
+os.makedirs(DEM_TILE_DIR)
+np.save(os.path.join(DEM_TILE_DIR, 'N35W111.npy'), synthetic_dem())
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def locations():
+    """The ``locations`` collection on a fresh mongomock database with 400 seeded sites"""
+    from benchmarks.stubs import mongomock_client, seed_locations
+    from database.db_connection import get_db, set_client
+    set_client(mongomock_client())
+    collection = get_db().locations
+    seed_locations(collection, 400)
+    yield collection
+    set_client(None)
+
+@pytest.fixture
+def upstream():
+    """A local OpenTopoData/PVGIS stand-in that counts the calls it answers"""
+    from benchmarks.stubs import UpstreamServer
+    server = UpstreamServer().start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,104 @@
+import json
+import random
+import time
+
+import pytest
+import requests
+
+import routes.solar_routes
+from benchmarks.run import compare, percentile, summarize
+from benchmarks.scenarios import SCENARIOS, select_scenarios
+from benchmarks.stubs import LatencyProxy, UpstreamServer, geo_within, synthetic_elevation
+
+def point(lat, lng):
+    return {'type': 'Point', 'coordinates': [lng, lat]}
+
+def test_percentiles_interpolate():
+    values = [1.0, 2.0, 3.0, 4.0]
+    assert percentile(values, 0) == 1.0
+    assert percentile(values, 50) == 2.5
+    assert percentile(values, 100) == 4.0
+    assert percentile([], 50) is None
+
+    stats = summarize([0.002, 0.001, 0.003], wall_seconds=0.5, errors=1)
+    assert stats['p50_ms'] == 2.0 and stats['rps'] == 6.0 and stats['errors'] == 1
+
+def test_compare_flags_p95_regressions(tmp_path, capsys):
+    stats = {'p50_ms': 10.0, 'p95_ms': 20.0, 'rps': 100.0}
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'meta': {'commit': 'abc'}, 'results': {'client': {'a': stats, 'b': stats}}}))
+
+    report = {'results': {'client': {
+        'a': dict(stats, p95_ms=23.0),
+        'b': dict(stats, p95_ms=30.0),
+        'new': stats
+    }}}
+    assert compare(report, str(baseline), 0.2) == ['client/b']
+    assert 'REGRESSION' in capsys.readouterr().out
+
+def test_scenarios_are_selected_by_prefix():
+    names = [scenario.name for scenario in select_scenarios(['terrain', 'solar.nearest'])]
+    assert names[0] == 'solar.nearest'
+    assert all(name == 'solar.nearest' or name.startswith('terrain.') for name in names)
+    assert select_scenarios(None) == SCENARIOS
+    assert len({scenario.name for scenario in SCENARIOS}) == len(SCENARIOS)
+
+def test_every_scenario_succeeds(client, locations, upstream, monkeypatch):
+    monkeypatch.setattr(routes.solar_routes, 'PVGIS_API_BASE', f'{upstream.base_url}/pvgis/')
+    rng = random.Random(0)
+    for scenario in SCENARIOS:
+        path, body = scenario.build(rng)
+        response = client.open(path, method=scenario.method, json=body)
+        assert response.status_code == 200, scenario.name
+    assert upstream.calls == {'pvgis': 1}
+
+def test_upstream_answers_and_counts_calls(upstream):
+    response = requests.get(f'{upstream.base_url}/opentopodata?locations=35,-110|36,-111')
+    results = response.json()['results']
+    assert [result['elevation'] for result in results] == [synthetic_elevation(35, -110), synthetic_elevation(36, -111)]
+    assert requests.get(f'{upstream.base_url}/unknown').status_code == 404
+    assert upstream.calls == {'opentopodata': 1, 'unknown': 1}
+    assert upstream.locations == 2
+    assert '2 elevation locations' in upstream.summary()
+
+def test_upstream_rate_limits_each_service():
+    server = UpstreamServer(rate_limit=2).start()
+    try:
+        statuses = [requests.get(f'{server.base_url}/opentopodata?locations=1,1').status_code for _ in range(3)]
+        assert statuses == [200, 429, 429]
+        assert requests.get(f'{server.base_url}/pvgis/seriescalc?lat=1&lon=1').status_code == 200
+        time.sleep(0.55)
+        assert requests.get(f'{server.base_url}/opentopodata?locations=1,1').status_code == 200
+        assert server.requests == 5 and server.rejected == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_latency_proxy_delays_calls():
+    class Collection:
+        def count(self):
+            return 3
+    proxied = LatencyProxy({'sites': Collection()}, latency_ms=50)
+    started = time.perf_counter()
+    assert proxied['sites'].count() == 3
+    assert time.perf_counter() - started >= 0.05
+
+def test_geo_within_shapes():
+    circle = {'$centerSphere': [[-110.0, 35.0], 100 / 6371.0]}
+    assert geo_within(point(35.5, -110.0), circle)
+    assert not geo_within(point(36.0, -110.0), circle)
+
+    ring = [[-111, 34], [-109, 34], [-109, 36], [-111, 36], [-111, 34]]
+    box = {'$geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+    assert geo_within(point(35, -110), box)
+    assert not geo_within(point(37, -110), box)
+    assert not geo_within({'type': 'LineString'}, box)
+
+    with pytest.raises(NotImplementedError):
+        geo_within(point(35, -110), {'$box': [[0, 0], [1, 1]]})
+
+def test_seeded_locations_answer_geo_queries(locations):
+    circle = {'$centerSphere': [[-110.0, 34.0], 200 / 6371.0]}
+    found = list(locations.find({'geometry': {'$geoWithin': circle}}))
+    assert 0 < len(found) < 400
+    assert all(geo_within(site['geometry'], circle) for site in found)
@@ -0,0 +1,125 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import DATASETS_DIR
+from database.columnar_store import ColumnarRegistry, ingest, iter_source_rows
+from database.spatial_index import SpatialIndex
+
+ROWS = [
+    {'latitude': '33.5', 'longitude': '-112.1', 'ghi': '6.1', 'zone': 'desert'},
+    {'latitude': '36.2', 'longitude': '-115.2', 'ghi': '', 'zone': 'basin'},
+    {'latitude': '', 'longitude': '-100.0', 'ghi': '4.2', 'zone': ''},
+    {'latitude': '29.8', 'longitude': '-95.4', 'ghi': '4.7', 'zone': 'desert'},
+    {'latitude': '40.0', 'longitude': '-105.0', 'ghi': '5.3', 'zone': 'mountain'}
+]
+
+@pytest.fixture
+def registry(tmp_path):
+    return ColumnarRegistry(str(tmp_path), reload_interval=0)
+
+def test_columns_round_trip(tmp_path, registry):
+    manifest = ingest(ROWS, 'sites', str(tmp_path), chunk_rows=2)
+    assert manifest['rows'] == 5
+    assert {field: column['kind'] for field, column in manifest['columns'].items()} == {
+        'latitude': 'numeric', 'longitude': 'numeric', 'ghi': 'numeric', 'zone': 'category'
+    }
+    assert manifest['columns']['zone']['categories'] == ['desert', 'basin', 'mountain']
+    assert manifest['bounds']['latitude'] == pytest.approx([29.8, 40.0])
+
+    dataset = registry.get('sites')
+    assert dataset.column('ghi').dtype == np.float32
+    np.testing.assert_array_equal(dataset.codes('zone'), [0, 1, -1, 0, 2])
+    assert dataset.record(0) == {'latitude': 33.5, 'longitude': -112.1, 'ghi': 6.1, 'zone': 'desert'}
+    assert dataset.record(2) == {'longitude': -100.0, 'ghi': 4.2}
+    with pytest.raises(KeyError):
+        dataset.column('zone')
+
+def test_columnar_index_matches_the_json_index(tmp_path, registry):
+    records = [
+        {'latitude': float(lat), 'longitude': float(lng), 'ghi': float(ghi), 'zone': f'z{i % 4}'}
+        for i, (lat, lng, ghi) in enumerate(zip(np.linspace(25, 45, 300), np.linspace(-120, -70, 300)[::-1],
+                                                np.linspace(3, 7, 300)))
+    ]
+    ingest(iter(records), 'grid', str(tmp_path), chunk_rows=64)
+    columnar = SpatialIndex.from_columnar(registry.get('grid'))
+    plain = SpatialIndex(records)
+
+    indices, km = columnar.nearest(35.0, -95.0, k=5)
+    expected_indices, expected_km = plain.nearest(35.0, -95.0, k=5)
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(km, expected_km, rtol=1e-4)
+    assert columnar.numeric_fields == ['ghi'] and columnar.categorical_fields == ['zone']
+    assert list(columnar.values_at('zone', indices)) == [records[i]['zone'] for i in indices]
+    assert columnar.interpolate(35.0, -95.0)['values']['ghi'] == pytest.approx(
+        plain.interpolate(35.0, -95.0)['values']['ghi'], rel=1e-4
+    )
+
+def test_rows_without_coordinates_are_left_out_of_the_index(tmp_path, registry):
+    ingest(ROWS, 'sites', str(tmp_path))
+    index = SpatialIndex.from_columnar(registry.get('sites'))
+    assert len(index) == 4
+    assert [index.records[i]['zone'] for i in range(4)] == ['desert', 'basin', 'desert', 'mountain']
+
+    ingest([{'name': 'a', 'ghi': 1}], 'unlocated', str(tmp_path))
+    with pytest.raises(ValueError):
+        SpatialIndex.from_columnar(registry.get('unlocated'))
+
+@pytest.mark.parametrize('rows, message', [
+    (ROWS[:2] + [dict(ROWS[0], extra='1')], 'not in the first chunk'),
+    (ROWS[:2] + [dict(ROWS[0], ghi='bright')], 'Row 3: ghi must be numeric'),
+    (ROWS[:2] + [['33.5', '-112.1']], 'Row 3 is not an object')
+])
+def test_bad_rows_are_rejected(tmp_path, rows, message):
+    with pytest.raises(ValueError, match=message):
+        ingest(rows, 'bad', str(tmp_path), chunk_rows=2)
+
+def test_reingesting_replaces_the_previous_generation(tmp_path, registry):
+    ingest(ROWS, 'sites', str(tmp_path))
+    first = registry.get('sites')
+    ingest(ROWS[:2], 'sites', str(tmp_path))
+    second = registry.get('sites')
+    assert second is not first and len(second) == 2
+    files = set(os.listdir(tmp_path / 'sites.columns'))
+    assert files == {'manifest.json'} | {column['file'] for column in second.manifest['columns'].values()}
+
+def test_unreadable_manifests_are_reported(tmp_path, registry):
+    os.makedirs(tmp_path / 'broken.columns')
+    (tmp_path / 'broken.columns' / 'manifest.json').write_text('{"rows": ')
+    dataset = registry.get('broken')
+    assert isinstance(dataset.error, ValueError) and dataset.manifest is None
+    assert registry.names() == ['broken']
+    assert registry.get('missing') is None and registry.get('../broken') is None
+
+def test_source_formats(tmp_path):
+    (tmp_path / 'a.csv').write_text('latitude,longitude\n1,2\n3,4\n')
+    (tmp_path / 'a.ndjson').write_text('{"latitude": 1}\n\n{"latitude": 3}\n')
+    (tmp_path / 'a.json').write_text('{"latitude": 1}')
+    assert list(iter_source_rows(str(tmp_path / 'a.csv'))) == [
+        {'latitude': '1', 'longitude': '2'}, {'latitude': '3', 'longitude': '4'}
+    ]
+    assert len(list(iter_source_rows(str(tmp_path / 'a.ndjson')))) == 2
+    with pytest.raises(ValueError):
+        list(iter_source_rows(str(tmp_path / 'a.json')))
+
+def test_ingest_command_and_dataset_routes(app, client, tmp_path):
+    source = tmp_path / 'ingested-sites.ndjson'
+    source.write_text('\n'.join(json.dumps(row) for row in ROWS))
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['datasets', 'ingest', str(source), '--directory', DATASETS_DIR])
+    assert result.exit_code == 0, result.output
+    assert 'ingested-sites: 5 rows' in result.output
+    assert 'zone: category (3 categories)' in result.output
+    assert 'ghi: numeric' in runner.invoke(args=['datasets', 'info', 'ingested-sites']).output
+
+    assert 'ingested-sites' in client.get('/api/solar/datasets').get_json()['columnar']
+    described = client.get('/api/solar/datasets/ingested-sites').get_json()
+    assert described['columnar'] is True and described['manifest']['rows'] == 5
+
+    source.write_text(json.dumps(ROWS[0]) + '\n[33.5, -112.1]')
+    rejected = runner.invoke(args=['datasets', 'ingest', str(source), '--directory', str(tmp_path)])
+    assert rejected.exit_code != 0 and 'not an object' in rejected.output
+    assert runner.invoke(args=['datasets', 'info', 'no-such-dataset']).exit_code != 0
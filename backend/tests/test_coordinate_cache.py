@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from utils.cache import CoordinateCache, get_cache
+
+def test_keys_are_quantized():
+    cache = CoordinateCache('test', precision=2)
+    assert cache.make_key(35.123, -110.987) == '35.12,-110.99'
+    assert cache.make_key(35.123, -110.987, 'monthly', 30) == '35.12,-110.99|monthly|30'
+
+def test_nearby_points_share_one_fetch_with_quantized_coordinates():
+    cache = CoordinateCache('test', precision=2)
+    calls = []
+
+    def fetch(lat, lng):
+        calls.append((lat, lng))
+        return lat + lng
+
+    assert cache.get_or_fetch(10.001, 20.002, fetch) == pytest.approx(30.0)
+    assert cache.get_or_fetch(10.004, 19.998, fetch) == pytest.approx(30.0)
+    assert calls == [(10.0, 20.0)]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_none_is_not_cached():
+    cache = CoordinateCache('test')
+    calls = []
+    for _ in range(2):
+        cache.get_or_fetch(1, 2, lambda lat, lng: calls.append(1))
+    assert len(calls) == 2
+
+def test_concurrent_misses_are_coalesced():
+    cache = CoordinateCache('test')
+    calls = []
+    started = threading.Event()
+
+    def fetch(lat, lng):
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_fetch(1, 2, fetch))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [42] * 8
+    assert cache.stats()['coalesced'] + cache.stats()['hits'] == 7
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = CoordinateCache('test')
+    release = threading.Event()
+
+    def failing(lat, lng):
+        release.wait(1)
+        raise RuntimeError('upstream down')
+
+    errors = []
+
+    def lookup():
+        try:
+            cache.get_or_fetch(1, 2, failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == ['upstream down'] * 3
+    assert cache.get_or_fetch(1, 2, lambda lat, lng: 'ok') == 'ok'
+
+def test_least_recently_used_entries_are_evicted():
+    cache = CoordinateCache('test', max_entries=2)
+    for lat in (1, 2):
+        cache.set(cache.make_key(lat, 0), lat)
+    cache.get(cache.make_key(1, 0))
+    cache.set(cache.make_key(3, 0), 3)
+
+    assert cache.get(cache.make_key(2, 0)) == (False, None)
+    assert cache.get(cache.make_key(1, 0)) == (True, 1)
+    assert cache.stats()['evictions'] == 1
+
+def test_entries_expire(monkeypatch):
+    cache = CoordinateCache('test', ttl=10)
+    cache.set('key', 'value')
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 11)
+    assert cache.get('key') == (False, None)
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    CoordinateCache('test', disk_dir=str(tmp_path)).get_or_fetch(1, 2, lambda lat, lng: {'value': [1, 2]})
+    restarted = CoordinateCache('test', disk_dir=str(tmp_path))
+    assert restarted.get(restarted.make_key(1, 2)) == (True, {'value': [1, 2]})
+    assert restarted.stats()['disk_hits'] == 1
+
+def test_named_caches_are_shared_and_reported(client):
+    assert get_cache('test-shared') is get_cache('test-shared')
+    stats = client.get('/api/cache-stats').get_json()
+    assert 'test-shared' in stats
+    assert set(stats['test-shared']) >= {'hits', 'misses', 'coalesced', 'hit_ratio'}
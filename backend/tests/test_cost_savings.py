@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from models.cost_savings import estimate_savings, parse_assumptions, parse_cost_sites
+from models.financial_model import DEFAULT_ASSUMPTIONS, irr, payback_years, simulate_project
+
+# No uncertainty, so every scenario has the same cash flows
+CERTAIN = dict(
+    parse_assumptions({}), tariff_escalation_std=0.0, degradation_std=0.0,
+    capex_uncertainty=0.0, om_uncertainty=0.0, yield_uncertainty=0.0
+)
+
+def reference_cash(annual_kwh, capacity_kw, tariff, assumptions):
+    years = np.arange(assumptions['lifetime_years'])
+    energy = annual_kwh * (1 - assumptions['degradation']) ** years
+    om = capacity_kw * assumptions['opex_per_kw_year'] * (1 + assumptions['om_escalation']) ** years
+    return energy, om, energy * tariff * (1 + assumptions['tariff_escalation']) ** years - om
+
+def test_certain_project_matches_closed_form():
+    result = simulate_project(15000.0, 10.0, 0.15, CERTAIN, 100, np.random.default_rng(0))
+    energy, om, cash = reference_cash(15000.0, 10.0, 0.15, CERTAIN)
+    capex = 10.0 * CERTAIN['capex_per_kw']
+    discount = 1.07 ** -np.arange(1, 26)
+
+    assert result['npv']['p5'] == result['npv']['p95'] == pytest.approx(cash @ discount - capex, abs=0.01)
+    assert result['lcoe']['mean'] == pytest.approx((capex + om @ discount) / (energy @ discount), abs=1e-4)
+    assert result['first_year_savings']['mean'] == pytest.approx(cash[0], abs=0.01)
+    assert result['probability_npv_positive'] == 1.0
+
+    rate = result['irr']['mean']
+    assert cash @ (1 + rate) ** -np.arange(1, 26) == pytest.approx(capex, rel=1e-3)
+
+def test_irr_and_payback_edge_cases():
+    capex = np.array([100.0, 100.0, 100.0])
+    cash = np.array([[50.0] * 3, [10.0] * 3, [-5.0] * 3])
+    rates = irr(capex, cash)
+    # Both roots discount the flows back to the capex, including a negative one
+    for rate, flows in zip(rates[:2], cash[:2]):
+        assert flows @ (1 + rate) ** -np.arange(1, 4) == pytest.approx(100.0, rel=1e-9)
+    assert rates[0] > 0 > rates[1]
+    assert np.isnan(rates[2])
+    np.testing.assert_allclose(payback_years(capex, cash), [2.0, np.inf, np.inf])
+
+def test_seed_makes_results_reproducible():
+    body = {'cost_per_kwh': 0.15, 'annual_kwh': 15000, 'scenarios': 500, 'seed': 7}
+    assert estimate_savings(body) == estimate_savings(body)
+    assert estimate_savings(body)['npv'] != estimate_savings(dict(body, seed=8))['npv']
+
+def test_tariffs_and_energy_are_looked_up():
+    results = estimate_savings({'scenarios': 100, 'seed': 1, 'sites': [
+        {'latitude': 34.0489, 'longitude': -111.0937},
+        {'location': 'Texas', 'annual_kwh': 12000},
+        {'location': 'Atlantis', 'annual_kwh': 12000}
+    ]})
+    assert results[0]['tariff_source'] == 'dataset' and results[0]['cost_per_kwh'] == 0.15
+    assert results[0]['annual_kwh'] > 0
+    assert results[1]['cost_per_kwh'] == 0.12
+    assert 'error' in results[2]
+
+def test_site_assumptions_refine_shared_ones():
+    results = estimate_savings({
+        'scenarios': 100, 'seed': 1, 'assumptions': {'capex_per_kw': 500},
+        'sites': [{'cost_per_kwh': 0.15, 'annual_kwh': 15000}] * 2
+        + [{'cost_per_kwh': 0.15, 'annual_kwh': 15000, 'assumptions': {'capex_per_kw': 5000}}]
+    })
+    assert results[2]['npv']['mean'] < results[0]['npv']['mean']
+
+@pytest.mark.parametrize('overrides', [
+    {'capex_per_kw': 0},
+    {'discount_rate': -1},
+    {'tariff_escalation': -1.5},
+    {'degradation': -0.01},
+    {'yield_uncertainty': -0.1},
+    {'lifetime_years': 0},
+    {'lifetime_years': 60},
+    {'discount_rate': 'high'},
+    {'discount_rate': float('nan')},
+    {'inflation': 0.02}
+])
+def test_invalid_assumptions_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        parse_assumptions(overrides)
+
+def test_defaults_are_valid():
+    assert parse_assumptions({})['lifetime_years'] == DEFAULT_ASSUMPTIONS['lifetime_years']
+
+@pytest.mark.parametrize('body', [
+    {},
+    {'sites': []},
+    {'sites': ['Arizona']},
+    {'cost_per_kwh': 0.1, 'annual_kwh': 1000, 'capacity_kw': 0},
+    {'cost_per_kwh': -0.1, 'annual_kwh': 1000},
+    {'cost_per_kwh': 0.1, 'annual_kwh': -1},
+    {'cost_per_kwh': 0.1, 'annual_kwh': float('inf')},
+    {'cost_per_kwh': 'cheap', 'annual_kwh': 1000},
+    {'latitude': 34.0, 'annual_kwh': 1000, 'cost_per_kwh': 0.1},
+    {'latitude': 95.0, 'longitude': 0.0},
+    {'annual_kwh': 1000},
+    {'cost_per_kwh': 0.1}
+])
+def test_invalid_sites_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse_cost_sites(body)
+
+def test_cost_route(client):
+    response = client.post('/api/cost-estimation/', json={'location': 'Arizona', 'annual_kwh': 15000, 'seed': 3})
+    savings = response.get_json()['estimated_savings']
+    assert savings['scenarios'] == 10000
+    assert savings['npv']['p5'] <= savings['npv']['p50'] <= savings['npv']['p95']
+
+@pytest.mark.parametrize('body', [
+    {'location': 'Arizona', 'annual_kwh': 15000, 'scenarios': 50},
+    {'location': 'Arizona', 'annual_kwh': 15000, 'seed': -1},
+    {'location': 'Arizona', 'annual_kwh': 15000, 'assumptions': {'discount_rate': -2}},
+    {'location': 'Atlantis', 'annual_kwh': 15000}
+])
+def test_cost_route_errors(client, body):
+    assert client.post('/api/cost-estimation/', json=body).status_code == 400
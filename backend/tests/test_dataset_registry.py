@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+
+import pytest
+
+from conftest import DATASETS_DIR
+from database.dataset_registry import GZIP_MIN_SIZE, DatasetRegistry
+
+def write(path, content, mtime_ns=None):
+    path.write_bytes(content if isinstance(content, bytes) else json.dumps(content).encode('utf-8'))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+@pytest.fixture
+def registry(tmp_path):
+    return DatasetRegistry(str(tmp_path), reload_interval=0)
+
+def test_response_is_encoded_once_with_an_etag(tmp_path, registry):
+    write(tmp_path / 'small.json', {'value': 1})
+    dataset = registry.get('small')
+    assert json.loads(dataset.body) == {'success': True, 'data': {'value': 1}}
+    assert dataset.gzip_body is None
+    assert registry.get('small') is dataset
+
+    write(tmp_path / 'large.json', {'values': list(range(GZIP_MIN_SIZE))})
+    large = registry.get('large')
+    assert gzip.decompress(large.gzip_body) == large.body
+    assert large.etag != dataset.etag
+
+def test_changed_file_is_reloaded_and_removed_file_forgotten(tmp_path, registry):
+    path = tmp_path / 'data.json'
+    write(path, {'version': 1}, mtime_ns=1_000_000_000)
+    first = registry.get('data')
+    write(path, {'version': 2}, mtime_ns=2_000_000_000)
+    second = registry.get('data')
+
+    assert second is not first
+    assert second.data == {'version': 2} and second.etag != first.etag
+    path.unlink()
+    assert registry.get('data') is None
+
+def test_unknown_and_path_like_names_are_not_found(tmp_path, registry):
+    write(tmp_path / 'data.json', {})
+    assert registry.get('missing') is None
+    assert registry.get('../data') is None
+
+@pytest.mark.parametrize('content', [b'{"broken": ', b'{"text": "\xff\xfe"}'])
+def test_invalid_files_are_load_errors(tmp_path, registry, content):
+    write(tmp_path / 'bad.json', content)
+    dataset = registry.get('bad')
+    assert isinstance(dataset.error, ValueError)
+    assert dataset.body is None and dataset.etag is None
+
+def test_route_answers_304_for_a_matching_etag(client):
+    response = client.get('/api/solar/solar-data')
+    assert response.status_code == 200
+    assert response.get_json()['success'] is True
+    assert response.headers['Cache-Control'] == 'no-cache'
+
+    cached = client.get('/api/solar/solar-data', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+@pytest.fixture
+def broken_dataset():
+    path = os.path.join(DATASETS_DIR, 'broken.json')
+    with open(path, 'wb') as f:
+        f.write(b'\xff{')
+    yield 'broken'
+    os.remove(path)
+
+def test_route_reports_missing_and_corrupt_datasets(client, broken_dataset):
+    assert client.get('/api/solar/datasets/no-such-dataset').status_code == 404
+    response = client.get(f'/api/solar/datasets/{broken_dataset}')
+    assert response.status_code == 500
+    assert response.get_json()['error'] == 'Invalid data format'
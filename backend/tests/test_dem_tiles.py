@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from conftest import DEM_SITE
+from database.elevation_provider import HGT_VOID, DemTileStore, get_elevation, get_elevations
+
+SIDE = 121
+
+def plane(lat_floor, lng_floor, side=SIDE):
+    """Elevation rising 1 m per cell northwards and 2 m per cell eastwards, continuous across tiles"""
+    cells = side - 1
+    rows = (89 - lat_floor) * cells + np.arange(side)[:, None]
+    cols = (lng_floor + 180) * cells + np.arange(side)[None, :]
+    return (40000 - rows + 2 * cols - 2 * 360 * cells).astype(np.int16)
+
+@pytest.fixture
+def store(tmp_path):
+    plane(10, 20).astype('>i2').tofile(tmp_path / 'N10E020.hgt')
+    np.save(tmp_path / 'N10E021.npy', plane(10, 21))
+    return DemTileStore(str(tmp_path))
+
+def test_tile_names():
+    assert DemTileStore.tile_name(12, 77) == 'N12E077'
+    assert DemTileStore.tile_name(-1, -78) == 'S01W078'
+
+def test_sample_interpolates_bilinearly(store):
+    tile = plane(10, 20).astype(float)
+    # A point a quarter of the way between cells (row 30.25, column 60.5)
+    lat, lng = 11 - 30.25 / (SIDE - 1), 20 + 60.5 / (SIDE - 1)
+    expected = tile[30, 60] - 0.25 + 2 * 0.5
+    np.testing.assert_allclose(store.sample([lat], [lng]), [expected])
+    # .hgt and .npy tiles line up on their shared edge
+    np.testing.assert_allclose(store.sample([10.5, 10.5], [20.999999, 21.000001]), [tile[60, -1]] * 2, atol=0.01)
+
+def test_sample_is_nan_without_tile_or_on_voids(tmp_path):
+    tile = plane(10, 20)
+    tile[:2, :2] = HGT_VOID
+    np.save(tmp_path / 'N10E020.npy', tile)
+    store = DemTileStore(str(tmp_path))
+    values = store.sample([10.9999, 10.5, 50.0], [20.0001, 20.5, 20.5])
+    assert np.isnan(values[0]) and np.isnan(values[2])
+    assert not np.isnan(values[1])
+
+def test_window_is_centred_and_crosses_tile_edges(store):
+    tile = plane(10, 20)
+    grid, cell = store.window(10.5, 20.5, 3)
+    assert cell == pytest.approx(1 / (SIDE - 1))
+    np.testing.assert_array_equal(grid, tile[57:64, 57:64])
+
+    # On the eastern edge the window continues into the neighbouring tile
+    grid, _ = store.window(10.5, 21.0, 3)
+    np.testing.assert_array_equal(grid[:, :4], tile[57:64, -4:])
+    np.testing.assert_array_equal(grid[:, 4:], plane(10, 21)[57:64, 1:4])
+
+    # Rows north of the available tiles are NaN
+    grid, _ = store.window(10.9999, 20.5, 3)
+    assert np.isnan(grid[:3]).all() and not np.isnan(grid[3:]).any()
+    assert store.window(50.0, 20.5, 3) is None
+
+def test_windows_match_window(store):
+    lats = np.array([10.5, 10.5, 10.01, 50.0])
+    lngs = np.array([20.5, 21.0, 21.5, 20.5])
+    grids, cells = store.windows(lats, lngs, 4)
+    for i in range(3):
+        np.testing.assert_array_equal(grids[i], store.window(lats[i], lngs[i], 4)[0])
+    assert np.isnan(grids[3]).all() and np.isnan(cells[3])
+
+def test_get_elevation_uses_local_tiles_only():
+    lat, lng = DEM_SITE
+    assert isinstance(get_elevation(lat, lng), float)
+    # Remote lookups are disabled in the test environment
+    assert get_elevation(0.5, 0.5) is None
+    assert np.isnan(get_elevations([0.5], [0.5])[0])
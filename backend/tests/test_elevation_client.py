@@ -0,0 +1,156 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import database.elevation_provider
+from benchmarks.stubs import UpstreamServer, synthetic_elevation
+from database.elevation_client import ElevationClient, ElevationUnavailable, TokenBucket
+
+@pytest.fixture
+def make_client(upstream):
+    """Build clients against the local OpenTopoData stand-in, shutting their senders down afterwards"""
+    clients = []
+    def make(url=None, **options):
+        options = {'rate': 0, 'max_retries': 0, 'timeout': 5, **options}
+        client = ElevationClient(url or f'{upstream.base_url}/opentopodata', **options)
+        clients.append(client)
+        return client
+    yield make
+    for client in clients:
+        client._senders.shutdown(wait=False, cancel_futures=True)
+
+@pytest.fixture
+def slow_upstream():
+    server = UpstreamServer(latency_ms=1000).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def expected(lats, lngs):
+    return [synthetic_elevation(lat, lng) for lat, lng in zip(lats, lngs)]
+
+def test_concurrent_lookups_share_one_call(make_client, upstream):
+    client = make_client(window=0.2)
+    points = [(30 + i / 10, -100 - i / 10) for i in range(8)] + [(30.0, -100.0)]
+    results = {}
+    start = threading.Barrier(len(points))
+
+    def lookup(i, lat, lng):
+        start.wait()
+        results[i] = client.elevations([lat], [lng])[0]
+
+    threads = [threading.Thread(target=lookup, args=(i, *point)) for i, point in enumerate(points)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [results[i] for i in range(len(points))] == expected(*zip(*points))
+    assert upstream.calls == {'opentopodata': 1}
+    assert upstream.locations == 8  # the repeated point is asked for once
+
+def test_large_lookups_are_split_into_calls(make_client, upstream):
+    client = make_client(max_locations=100)
+    lats, lngs = np.linspace(20, 21, 250), np.linspace(-90, -91, 250)
+    np.testing.assert_allclose(client.elevations(lats, lngs), expected(lats, lngs))
+    assert upstream.calls == {'opentopodata': 3}
+
+def test_token_bucket_spaces_calls():
+    bucket = TokenBucket(rate=10, capacity=2)
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - started >= 0.15
+    assert bucket.delay(3) == pytest.approx(0.3, abs=0.05)
+
+    bucket.pause(0.5)
+    assert bucket.delay(0) == pytest.approx(0.5, abs=0.05)
+    assert TokenBucket(rate=0).delay(100) == 0
+
+def test_rate_limited_calls_are_retried():
+    server = UpstreamServer(rate_limit=2).start()
+    client = ElevationClient(f'{server.base_url}/opentopodata', rate=0, max_retries=10, window=0)
+    try:
+        for lat in (10.0, 11.0, 12.0):
+            assert client.elevations([lat], [5.0])[0] == synthetic_elevation(lat, 5.0)
+        assert server.rejected > 0 and server.calls == {'opentopodata': 3}
+    finally:
+        client._senders.shutdown(wait=False)
+        server.shutdown()
+        server.server_close()
+
+def test_client_rate_limit_avoids_rejections(make_client, upstream):
+    upstream.rate_limit = 4
+    client = make_client(rate=3, window=0)
+    started = time.monotonic()
+    for lat in (10.0, 11.0, 12.0):
+        client.elevations([lat], [6.0])
+    assert time.monotonic() - started >= 0.6
+    assert upstream.rejected == 0
+
+def test_lookups_beyond_the_budget_are_refused_up_front(make_client, slow_upstream):
+    client = make_client(f'{slow_upstream.base_url}/opentopodata', rate=1, deadline=1.5, window=0)
+    lats, lngs = np.linspace(40, 41, 100), np.linspace(-80, -81, 100)
+    first = threading.Thread(target=client.elevations, args=(lats, lngs))
+    first.start()
+    for _ in range(200):
+        if client._outstanding:
+            break
+        time.sleep(0.01)
+
+    # The call under way has taken the only token, so two more would wait 2 s
+    started = time.monotonic()
+    with pytest.raises(ElevationUnavailable, match='rate limit budget'):
+        client.elevations(lats + 1, lngs)
+    assert time.monotonic() - started < 0.5
+    first.join()
+    assert slow_upstream.calls == {'opentopodata': 1}
+
+def test_slow_answers_exceed_the_deadline(make_client, slow_upstream):
+    client = make_client(f'{slow_upstream.base_url}/opentopodata', deadline=0.3)
+    started = time.monotonic()
+    with pytest.raises(ElevationUnavailable, match='exceeded 0.3 s'):
+        client.elevations([1.0], [2.0])
+    assert time.monotonic() - started < 0.9
+
+def test_failed_calls_answer_nan(make_client, upstream):
+    assert np.isnan(make_client(f'{upstream.base_url}/missing').elevations([1.0], [2.0])).all()
+    # Nothing listens on the port of a closed server
+    closed = UpstreamServer()
+    url = f'{closed.base_url}/opentopodata'
+    closed.server_close()
+    assert np.isnan(make_client(url, timeout=1).elevations([1.0, 3.0], [2.0, 4.0])).all()
+    assert make_client().elevations([], []).size == 0
+
+@pytest.fixture
+def remote(monkeypatch, make_client):
+    """Enable the remote fallback with a client from ``make_client``"""
+    def use(client):
+        monkeypatch.setattr(database.elevation_provider, 'ELEVATION_REMOTE_FALLBACK', True)
+        monkeypatch.setattr(database.elevation_provider, '_elevation_client', client)
+    return use
+
+def test_elevations_route_uses_the_remote_api_and_cache(client, remote, make_client, upstream):
+    remote(make_client())
+    query = '/api/terrain-analysis/elevations?locations=12.3456,45.6789|35.5,-110.5'
+    results = client.get(query).get_json()['results']
+    assert results[0]['elevation'] == synthetic_elevation(12.3456, 45.6789)
+    assert results[1]['elevation'] is not None  # from the local DEM
+    assert client.get(query).get_json()['results'] == results
+    assert upstream.calls == {'opentopodata': 1} and upstream.locations == 1
+
+def test_unavailable_elevations(client, remote, make_client, slow_upstream):
+    remote(make_client(f'{slow_upstream.base_url}/opentopodata', deadline=0.2))
+    assert client.get('/api/terrain-analysis/elevations?locations=-12.3456,-45.6789').status_code == 503
+    batch = client.post('/api/terrain-analysis/batch', json={'locations': [{'latitude': -13.5, 'longitude': -46.5}]})
+    assert batch.status_code == 503
+
+    # The single-site route estimates the elevation instead
+    single = client.get('/api/terrain-analysis/?lat=-14.5&lng=-47.5')
+    assert single.status_code == 200 and single.get_json()['elevation'] is not None
+
+@pytest.mark.parametrize('locations', ['', '12.3,abc', '95,10'])
+def test_elevations_route_errors(client, locations):
+    assert client.get(f'/api/terrain-analysis/elevations?locations={locations}').status_code == 400
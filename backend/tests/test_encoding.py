@@ -0,0 +1,125 @@
+import json
+import struct
+
+import numpy as np
+import pytest
+
+import utils.encoding
+from conftest import DEM_SITE
+from utils.encoding import FRAME_ALIGNMENT, msgpack, numeric_response, response_format
+
+needs_msgpack = pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+
+PAYLOAD = {
+    'name': 'site',
+    'values': np.array([1.5, np.nan, 3.25]),
+    'grid': np.arange(6, dtype=np.float64).reshape(2, 3),
+    'counts': np.array([1, 2, 3], dtype=np.int64),
+    'nested': [{'inner': np.array([0.1], dtype=np.float32)}],
+    'labels': np.array(['a', 'b'], dtype=object)
+}
+
+def read_frame(body):
+    """Header data with every ``{"$array": i}`` replaced by its float32 buffer"""
+    (length,) = struct.unpack('<I', body[:4])
+    header = json.loads(body[4:4 + length])
+    buffers = body[4 + length:]
+    assert (4 + length) % FRAME_ALIGNMENT == 0
+
+    def resolve(value):
+        if isinstance(value, dict) and set(value) == {'$array'}:
+            array = header['arrays'][value['$array']]
+            data = np.frombuffer(buffers, dtype='<f4', count=array['length'], offset=array['offset'])
+            return data.reshape(array['shape'])
+        if isinstance(value, dict):
+            return {key: resolve(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [resolve(item) for item in value]
+        return value
+    return resolve(header['data'])
+
+def unpack_arrays(value):
+    """Decode the ``{"dtype", "shape", "data"}`` maps of a MessagePack payload"""
+    if isinstance(value, dict) and set(value) == {'dtype', 'shape', 'data'}:
+        return np.frombuffer(value['data'], dtype=value['dtype']).reshape(value['shape'])
+    if isinstance(value, dict):
+        return {key: unpack_arrays(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unpack_arrays(item) for item in value]
+    return value
+
+@pytest.mark.parametrize('query, headers, expected', [
+    ('', {}, 'json'),
+    ('', {'Accept': '*/*'}, 'json'),
+    pytest.param('', {'Accept': 'application/msgpack'}, 'msgpack', marks=needs_msgpack),
+    pytest.param('', {'Accept': 'application/x-msgpack, application/json;q=0.5'}, 'msgpack', marks=needs_msgpack),
+    ('', {'Accept': 'application/x-float32-frame'}, 'f32'),
+    ('format=f32', {'Accept': 'application/msgpack'}, 'f32'),
+    ('format=json', {}, 'json')
+])
+def test_format_negotiation(app, query, headers, expected):
+    with app.test_request_context(f'/?{query}', headers=headers):
+        assert response_format() == expected
+
+def test_msgpack_is_only_offered_when_installed(app, monkeypatch):
+    monkeypatch.setattr(utils.encoding, 'msgpack', None)
+    with app.test_request_context('/', headers={'Accept': 'application/msgpack'}):
+        assert response_format() == 'json'
+    with app.test_request_context('/?format=msgpack'):
+        with pytest.raises(ValueError):
+            response_format()
+
+def test_unknown_formats_are_rejected(app):
+    with app.test_request_context('/?format=xml'):
+        with pytest.raises(ValueError, match='format must be one of'):
+            response_format()
+
+def test_json_has_lists_and_null(app):
+    with app.test_request_context('/'):
+        response = numeric_response(PAYLOAD, status=201)
+    data = response.get_json()
+    assert response.status_code == 201 and 'Accept' in response.vary
+    assert data['values'] == [1.5, None, 3.25]
+    assert data['grid'] == [[0, 1, 2], [3, 4, 5]] and data['labels'] == ['a', 'b']
+
+def test_float32_frames_carry_buffers(app):
+    with app.test_request_context('/'):
+        response = numeric_response(PAYLOAD, 'f32')
+    assert response.mimetype == 'application/x-float32-frame'
+    data = read_frame(response.get_data())
+    np.testing.assert_array_equal(data['values'], np.array([1.5, np.nan, 3.25], dtype=np.float32))
+    assert data['grid'].shape == (2, 3) and data['grid'][1, 2] == 5
+    assert data['nested'][0]['inner'][0] == np.float32(0.1)
+    assert data['counts'] == [1, 2, 3] and data['labels'] == ['a', 'b'] and data['name'] == 'site'
+
+@needs_msgpack
+def test_msgpack_keeps_integer_dtypes(app):
+    with app.test_request_context('/'):
+        response = numeric_response(PAYLOAD, 'msgpack')
+    data = unpack_arrays(msgpack.unpackb(response.get_data()))
+    assert data['values'].dtype == np.dtype('<f4') and np.isnan(data['values'][1])
+    assert data['counts'].dtype == np.dtype('<i8') and data['counts'].tolist() == [1, 2, 3]
+    assert data['grid'].shape == (2, 3) and data['labels'] == ['a', 'b']
+
+    with pytest.raises(TypeError):
+        with app.test_request_context('/'):
+            numeric_response({'value': object()}, 'msgpack')
+
+@needs_msgpack
+def test_routes_agree_across_formats(client):
+    lat, lng = DEM_SITE
+    url = f'/api/terrain-analysis/horizon?lat={lat}&lng={lng}'
+    plain = client.get(url).get_json()
+    framed = read_frame(client.get(f'{url}&format=f32').get_data())
+    packed = client.get(url, headers={'Accept': 'application/msgpack'})
+    assert packed.mimetype == 'application/msgpack'
+    packed = unpack_arrays(msgpack.unpackb(packed.get_data()))
+
+    for data in (framed, packed):
+        np.testing.assert_allclose(data['hourly_loss'], plain['hourly_loss'], atol=1e-6)
+        np.testing.assert_allclose(data['elevations'], plain['elevations'], rtol=1e-6)
+
+def test_batch_route_keeps_coordinates_exact(client):
+    body = {'locations': [{'latitude': 35.123456789, 'longitude': -110.987654321}]}
+    framed = read_frame(client.post('/api/terrain-analysis/batch?format=f32', json=body).get_data())
+    assert framed['locations'] == [[35.123456789, -110.987654321]] and framed['count'] == 1
@@ -0,0 +1,108 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+import pytest
+
+from utils.tiles import TileCache, colorize, encode_png, lat_lng_to_tile, tile_bounds, tiles_in_bbox
+
+def decode_png(data):
+    """Pixels of an unfiltered RGBA PNG as written by encode_png"""
+    assert data[:8] == b'\x89PNG\r\n\x1a\n'
+    width, height = struct.unpack('>II', data[16:24])
+    idat_length = struct.unpack('>I', data[33:37])[0]
+    assert data[37:41] == b'IDAT'
+    scanlines = np.frombuffer(zlib.decompress(data[41:41 + idat_length]), dtype=np.uint8)
+    return scanlines.reshape(height, width * 4 + 1)[:, 1:].reshape(height, width, 4)
+
+def test_tile_geometry():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-85.0511288, -180, 85.0511288, 180))
+    assert lat_lng_to_tile(0.1, 0.1, 1) == (1, 0)
+    assert lat_lng_to_tile(89.9, -180, 3) == (0, 0)
+    south, west, north, east = tile_bounds(6, 11, 25)
+    assert lat_lng_to_tile((south + north) / 2, (west + east) / 2, 6) == (11, 25)
+    assert sorted(tiles_in_bbox(-1, -1, 1, 1, 1)) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+def test_png_round_trip():
+    values = np.array([[0.0, 0.5], [1.0, np.nan]])
+    rgba = colorize(values)
+    np.testing.assert_array_equal(decode_png(encode_png(rgba)), rgba)
+    assert rgba[1, 1, 3] == 0 and rgba[0, 0, 3] == 170
+    assert tuple(rgba[1, 0, :3]) == (26, 152, 80)
+
+def test_concurrent_misses_render_once(tmp_path):
+    cache = TileCache(str(tmp_path))
+    renders = []
+
+    def render():
+        renders.append(1)
+        time.sleep(0.2)
+        return b'tile'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_render('v1', 3, 1, 2, 'png', render)))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert renders == [1]
+    assert results == [b'tile'] * 6
+    assert cache.counters['coalesced'] == 5 and cache.counters['writes'] == 1
+    assert cache.get('v1', 3, 1, 2, 'png') == b'tile'
+
+def test_render_errors_reach_waiters_and_are_not_cached(tmp_path):
+    cache = TileCache(str(tmp_path))
+
+    def fail():
+        raise RuntimeError('no data')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_render('v1', 0, 0, 0, 'png', fail)
+    assert cache.get_or_render('v1', 0, 0, 0, 'png', lambda: b'ok') == b'ok'
+
+def test_new_version_prunes_older_tiles(tmp_path):
+    cache = TileCache(str(tmp_path))
+    cache.get_or_render('v1', 0, 0, 0, 'png', lambda: b'old')
+    cache.get_or_render('v2', 0, 0, 0, 'png', lambda: b'new')
+    for _ in range(50):
+        if os.listdir(tmp_path) == ['v2']:
+            break
+        time.sleep(0.02)
+    assert os.listdir(tmp_path) == ['v2']
+    assert cache.counters['pruned'] == 1
+
+def test_png_tile_route_with_etag(client):
+    response = client.get('/api/heatmap/6/11/25.png')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert decode_png(response.data).shape == (256, 256, 4)
+
+    cached = client.get('/api/heatmap/6/11/25.png', headers={'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+
+def test_json_tile_route(client):
+    tile = client.get('/api/heatmap/6/11/25.json?size=16').get_json()
+    assert tile['size'] == 16 and len(tile['values']) == 16
+    assert all(value is None or 0 <= value <= 100 for row in tile['values'] for value in row)
+    assert tile['bounds'] == pytest.approx(list(tile_bounds(6, 11, 25)))
+
+@pytest.mark.parametrize('url, status', [
+    ('/api/heatmap/3/8/0.png', 404),
+    ('/api/heatmap/15/0/0.png', 404),
+    ('/api/heatmap/3/1/1.json?size=4', 400),
+    ('/api/heatmap/3/1/1.json?size=512', 400)
+])
+def test_tile_route_errors(client, url, status):
+    assert client.get(url).status_code == status
+
+def test_stats_report_the_data_version(client):
+    stats = client.get('/api/heatmap/stats').get_json()
+    assert len(stats['version']) == 12
+    assert {'hits', 'misses', 'coalesced', 'pruned'} <= set(stats)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import models.horizon
+from conftest import DEM_SITE
+from models.horizon import (
+    NEAR_STEPS, OBSERVER_HEIGHT_M, horizon_at, horizon_azimuths, hourly_shading_loss, march_steps, site_horizons,
+    sky_view_factors, summarize_shading, trace_horizons
+)
+
+SIZE = 101
+CELL = 30.0
+
+def trace(dem):
+    dems = np.asarray(dem, dtype=float)[None]
+    return trace_horizons(dems, np.array([CELL]), np.array([CELL]), horizon_azimuths(8))[0]
+
+def test_march_steps_are_dense_near_the_site():
+    steps = march_steps(200)
+    np.testing.assert_array_equal(steps[:NEAR_STEPS], np.arange(1, NEAR_STEPS + 1))
+    assert steps[-1] == 200 and (np.diff(steps) > 0).all()
+    np.testing.assert_array_equal(march_steps(10), np.arange(1, 11))
+
+def test_flat_ground_has_a_horizon_just_below_level():
+    horizons = trace(np.full((SIZE, SIZE), 500.0))
+    expected = np.degrees(np.arctan2(-OBSERVER_HEIGHT_M, CELL * march_steps(SIZE // 2)[-1]))
+    np.testing.assert_allclose(horizons, expected, atol=0.05)
+    assert sky_view_factors(horizons[None])[0] == 1.0
+
+def test_a_wall_raises_the_horizon_in_its_direction_only():
+    dem = np.full((SIZE, SIZE), 500.0)
+    dem[30, :] = 600.0  # a ridge 20 cells north of the site
+    horizons = trace(dem)
+    expected = np.degrees(np.arctan2(100 - OBSERVER_HEIGHT_M, 20 * CELL))
+    assert horizons[0] == pytest.approx(expected, abs=0.5)
+    assert horizons[4] < 0  # south
+    assert 0 < horizons[1] < horizons[0]  # north-east sees the ridge further away
+
+def test_a_bowl_looks_the_same_every_way():
+    rows, cols = np.mgrid[0:SIZE, 0:SIZE] - SIZE // 2
+    horizons = trace(500 + 0.02 * (rows ** 2 + cols ** 2))
+    # The rim of the window is the steepest view, 50 cells out
+    rim = np.degrees(np.arctan2(0.02 * 50 ** 2 - OBSERVER_HEIGHT_M, 50 * CELL))
+    np.testing.assert_allclose(horizons, rim, atol=0.01)
+
+def test_horizon_is_interpolated_across_north():
+    horizons = np.array([[10.0, 0.0, 0.0, 20.0]])
+    np.testing.assert_allclose(horizon_at(horizons, np.array([[0.0, 45.0, 315.0, 337.5]])), [[10, 5, 15, 12.5]])
+
+def test_shading_losses_follow_the_horizon():
+    lats = np.array([35.0, 35.0])
+    horizons = np.array([np.zeros(72), np.full(72, 89.0)])
+    loss, ghi = hourly_shading_loss(lats, horizons)
+    assert loss.shape == ghi.shape == (2, 8760)
+    assert loss[0].max() == pytest.approx(0.0, abs=1e-12)
+    assert np.allclose(loss[1][ghi[1] > 0], 1.0, atol=1e-3)
+
+    summary = summarize_shading(loss, ghi)
+    assert summary['annual'] == pytest.approx([0.0, 1.0], abs=1e-3)
+    assert summary['monthly'].shape == (2, 12) and summary['profile'].shape == (2, 12, 24)
+    assert summary['profile'][1, :, 0].max() == 0  # no sun at midnight
+
+def test_site_horizons_are_cached(monkeypatch):
+    lat, lng = DEM_SITE
+    first = site_horizons([lat + 0.0123], [lng])[0]
+    assert len(first['azimuths']) == len(first['elevations']) == 72
+    assert 0 < first['sky_view_factor'] <= 1 and 0 <= first['annual_loss'] <= 1
+
+    def compute(lats, lngs):
+        raise AssertionError('not served from the cache')
+    monkeypatch.setattr(models.horizon, 'compute_horizons', compute)
+    assert site_horizons([lat + 0.0123], [lng])[0] == first
+
+def test_sites_without_a_dem_have_no_horizon():
+    assert site_horizons([0.5, DEM_SITE[0]], [0.5, DEM_SITE[1]])[0] is None
+
+def test_horizon_route(client):
+    lat, lng = DEM_SITE
+    data = client.get(f'/api/terrain-analysis/horizon?lat={lat}&lng={lng}').get_json()
+    assert len(data['hourly_loss']) == 8760 and len(data['monthly_loss']) == 12
+    assert all(0 <= value <= 1 for value in data['hourly_loss'])
+
+@pytest.mark.parametrize('query, status', [
+    ('lat=35.5', 400),
+    ('lat=95&lng=0', 400),
+    ('lat=35.5&lng=-110.5&format=xml', 400),
+    ('lat=0.5&lng=0.5', 404)
+])
+def test_horizon_route_errors(client, query, status):
+    assert client.get(f'/api/terrain-analysis/horizon?{query}').status_code == status
@@ -0,0 +1,129 @@
+import json
+
+import numpy as np
+import pytest
+
+import routes.solar_routes
+from benchmarks.stubs import synthetic_hourly_series, synthetic_monthly_irradiance
+from database.irradiance_store import IrradianceStore, parse_hourly_series, stored_series
+from models.irradiance_stats import group_reduce, series_percentiles, typical_day_profiles
+
+def pvgis_body(records):
+    return json.dumps({
+        'inputs': {'location': {'latitude': 35.0}},
+        'outputs': {'hourly': records},
+        'meta': {'outputs': {'hourly': {'type': 'time series'}}}
+    }).encode('utf-8')
+
+def chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+@pytest.fixture
+def pvgis(upstream, monkeypatch):
+    """Point PVGIS requests at the local stand-in"""
+    monkeypatch.setattr(routes.solar_routes, 'PVGIS_API_BASE', f'{upstream.base_url}/pvgis/')
+    return upstream
+
+@pytest.mark.parametrize('size', [7, 64, 1 << 20])
+def test_streamed_series_parse_the_same_in_any_chunking(size):
+    records = synthetic_hourly_series(35.0)[:72]
+    series = parse_hourly_series(chunked(pvgis_body(records), size))
+    assert series.fields == ['P', 'G(i)', 'H_sun', 'T2m', 'WS10m', 'Int']
+    assert len(series) == 72 and series.values.dtype == np.float32
+    assert str(series.start) == '2020-01-01T00:10'
+    np.testing.assert_allclose(series.field('G(i)'), [record['G(i)'] for record in records], rtol=1e-6)
+    assert series.calendar()['hour'][:3].tolist() == [0, 1, 2]
+    with pytest.raises(LookupError):
+        series.field('Gb(i)')
+
+def test_missing_values_become_nan():
+    records = synthetic_hourly_series(35.0)[:3]
+    records[1]['G(i)'] = None
+    del records[2]['T2m']
+    series = parse_hourly_series([pvgis_body(records)])
+    assert np.isnan(series.field('G(i)')[1]) and np.isnan(series.field('T2m')[2])
+
+@pytest.mark.parametrize('body, message', [
+    (b'{"outputs": {}}', 'no hourly series'),
+    (pvgis_body([]), 'empty'),
+    (pvgis_body(synthetic_hourly_series(35.0)[:5]).split(b']')[0][:-20], 'truncated'),
+    (pvgis_body([1, 2]), 'must be objects'),
+    (pvgis_body(synthetic_hourly_series(35.0)[:2] + synthetic_hourly_series(35.0)[5:6]), 'one hour apart')
+])
+def test_malformed_series_are_rejected(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_hourly_series(chunked(body, 50))
+
+def test_store_round_trips_as_a_memory_map(tmp_path):
+    store = IrradianceStore(str(tmp_path))
+    series = parse_hourly_series([pvgis_body(synthetic_hourly_series(20.0)[:48])])
+    stored = store.save(20.0, 30.0, series, source='test')
+    assert isinstance(stored.values, np.memmap)
+    np.testing.assert_array_equal(stored.values, series.values)
+    assert stored.meta['source'] == 'test' and stored.start == series.start
+
+    # A sidecar that does not describe the array is as good as missing
+    meta = json.loads((tmp_path / '20.0_30.0.json').read_text())
+    (tmp_path / '20.0_30.0.json').write_text(json.dumps(dict(meta, hours=47)))
+    assert store.load(20.0, 30.0) is None
+    assert store.load(21.0, 30.0) is None
+
+def test_group_reduce_skips_missing_values():
+    values = np.array([1.0, np.nan, 3.0, np.nan, np.nan, 4.0])
+    groups = np.array([0, 0, 0, 1, 1, 2])
+    labels, sums = group_reduce(values, groups, 'sum')
+    assert labels.tolist() == [0, 1, 2]
+    np.testing.assert_array_equal(sums, [4.0, np.nan, 4.0])
+    np.testing.assert_array_equal(group_reduce(values, groups, 'mean')[1], [2.0, np.nan, 4.0])
+    np.testing.assert_array_equal(group_reduce(values, groups, 'max')[1], [3.0, np.nan, 4.0])
+    with pytest.raises(ValueError):
+        group_reduce(values, groups, 'median')
+
+def test_profiles_and_percentiles():
+    series = parse_hourly_series([pvgis_body(synthetic_hourly_series(35.0))])
+    profiles = typical_day_profiles(series, 'G(i)')['profiles']
+    assert profiles.shape == (12, 24)
+    assert profiles[:, 0].max() == 0 and profiles[6, 12] > profiles[0, 12]
+
+    daylight = series_percentiles(series, 'G(i)', [0, 100], period='daylight')
+    assert daylight['count'] == 366 * 13 and daylight['percentiles']['p0'] > 0
+    with pytest.raises(ValueError):
+        series_percentiles(series, 'G(i)', [50], period='weekly')
+
+def test_monthly_totals_match_the_upstream(client, pvgis):
+    data = client.get('/api/solar/irradiance/monthly?lat=31.07&lon=-111.07').get_json()
+    assert data['unit'] == 'kWh/m2' and data['hours'] == 366 * 24
+    expected = [record['H(i)_m'] for record in synthetic_monthly_irradiance(31.07)]
+    assert data['values'] == pytest.approx(expected, abs=0.05)
+    assert stored_series(31.07, -111.07) is not None
+
+    # Later aggregates of the location reuse the stored series
+    daily = client.get('/api/solar/irradiance/daily?lat=31.07&lon=-111.07&field=T2m').get_json()
+    assert daily['stat'] == 'mean' and len(daily['dates']) == 366
+    typical = client.get('/api/solar/irradiance/typical-day?lat=31.07&lon=-111.07&month=6').get_json()
+    assert len(typical['values']) == 24
+    monthly = client.get('/api/solar/pvgis?lat=31.07&lon=-111.07').get_json()
+    assert [month['H(i)_m'] for month in monthly['monthly']] == pytest.approx(expected, abs=0.05)
+    assert pvgis.calls == {'pvgis': 1}
+
+@pytest.mark.parametrize('query', [
+    'lon=-111.07',
+    'lat=95&lon=-111.07',
+    'lat=31.07&lon=-111.07&stat=median',
+    'lat=31.07&lon=-111.07&field=wind',
+])
+def test_irradiance_route_errors(client, pvgis, query):
+    assert client.get(f'/api/solar/irradiance/daily?{query}').status_code == 400
+
+@pytest.mark.parametrize('path', [
+    'percentiles?lat=31.07&lon=-111.07&q=50,150',
+    'percentiles?lat=31.07&lon=-111.07&period=weekly',
+    'typical-day?lat=31.07&lon=-111.07&month=13'
+])
+def test_aggregate_parameter_errors(client, pvgis, path):
+    assert client.get(f'/api/solar/irradiance/{path}').status_code == 400
+
+def test_upstream_failures_are_502(client, upstream, monkeypatch):
+    monkeypatch.setattr(routes.solar_routes, 'PVGIS_API_BASE', f'{upstream.base_url}/missing/')
+    assert client.get('/api/solar/irradiance/monthly?lat=12.34&lon=56.78').status_code == 502
+    assert stored_series(12.34, 56.78) is None
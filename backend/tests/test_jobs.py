@@ -0,0 +1,164 @@
+import json
+import time
+
+import pytest
+
+import models.job_types
+from database.elevation_client import ElevationUnavailable
+from utils.jobs import JobManager, JobType, ResultStore, job_id_for
+
+# Chunk functions live at module level so spawned workers can import them
+def square(chunk):
+    return [value * value for value in chunk]
+
+def explode(chunk):
+    raise ValueError(f'bad chunk {chunk}')
+
+def nap(seconds):
+    time.sleep(seconds)
+    return seconds
+
+def plan_numbers(params):
+    numbers = params.get('numbers')
+    if not isinstance(numbers, list):
+        raise ValueError('numbers must be a list')
+    return [numbers[i:i + 2] for i in range(0, len(numbers), 2)], {'count': len(numbers)}
+
+def merge_numbers(partials, context):
+    return {'count': context['count'], 'results': [value for partial in partials for value in partial]}
+
+JOB_TYPES = {
+    'squares': JobType(plan_numbers, square, merge_numbers),
+    'broken': JobType(plan_numbers, explode, merge_numbers),
+    'slow': JobType(lambda params: ([params['seconds']], {}), nap, lambda partials, context: {'results': partials})
+}
+
+def wait(manager, job):
+    for _ in manager.watch(job, timeout=30):
+        pass
+    return job
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(JOB_TYPES, ResultStore(str(tmp_path)), workers=2)
+    yield manager
+    if manager._pool is not None:
+        manager._pool.shutdown(cancel_futures=True)
+
+def test_ids_ignore_key_order():
+    assert job_id_for('squares', {'a': 1, 'b': [1, 2]}) == job_id_for('squares', {'b': [1, 2], 'a': 1})
+    assert job_id_for('squares', {'a': 1}) != job_id_for('broken', {'a': 1})
+
+def test_result_store_expires_entries(tmp_path):
+    store = ResultStore(str(tmp_path), ttl=0.2)
+    store.put('a', {'status': 'done'}, {'results': [1]})
+    assert store.get('a')['result'] == {'results': [1]}
+    time.sleep(0.3)
+    assert store.get('a') is None
+    assert not (tmp_path / 'a.json').exists()
+
+    store.put('b', {}, {})
+    time.sleep(0.3)
+    store.purge_expired()
+    assert list(tmp_path.iterdir()) == []
+
+def test_chunks_merge_in_order(manager):
+    job, created = manager.submit('squares', {'numbers': [1, 2, 3, 4, 5]})
+    assert created and job.chunks_total == 3
+    snapshots = list(manager.watch(job, timeout=30))
+    assert snapshots[-1]['status'] == 'done' and snapshots[-1]['progress'] == 1.0
+    assert manager.result(job.id) == {'count': 5, 'results': [1, 4, 9, 16, 25]}
+
+    again, created = manager.submit('squares', {'numbers': [1, 2, 3, 4, 5]})
+    assert again is job and not created
+
+def test_stored_results_survive_a_restart(manager):
+    job = wait(manager, manager.submit('squares', {'numbers': [3]})[0])
+    restarted = JobManager(JOB_TYPES, manager.store)
+    rebuilt = restarted.get(job.id)
+    assert rebuilt.status == 'done' and rebuilt.kind == 'squares'
+    assert restarted.submit('squares', {'numbers': [3]}) == (rebuilt, False)
+    assert restarted.result(job.id) == {'count': 1, 'results': [9]}
+
+def test_failed_jobs_report_and_can_be_resubmitted(manager):
+    job = wait(manager, manager.submit('broken', {'numbers': [1, 2, 3]})[0])
+    assert job.status == 'failed'
+    assert job.error.startswith('ValueError: bad chunk')
+    assert manager.result(job.id) is None
+
+    retried, created = manager.submit('broken', {'numbers': [1, 2, 3]})
+    assert created and retried is not job
+    wait(manager, retried)
+
+def test_invalid_submissions_raise(manager):
+    with pytest.raises(ValueError, match='Unknown job type'):
+        manager.submit('cubes', {})
+    with pytest.raises(ValueError):
+        manager.submit('squares', {'numbers': 'many'})
+    assert manager.list() == []
+
+def test_cancelled_jobs_are_forgotten(manager):
+    job, _ = manager.submit('slow', {'seconds': 1})
+    assert manager.cancel(job.id)
+    assert job.status == 'cancelled'
+    assert manager.get(job.id) is None
+    assert not manager.cancel(job.id)
+
+def test_finished_jobs_are_evicted_after_the_ttl(tmp_path):
+    manager = JobManager(JOB_TYPES, ResultStore(str(tmp_path), ttl=0.5), workers=1)
+    try:
+        failed = wait(manager, manager.submit('broken', {'numbers': [1]})[0])
+        done = wait(manager, manager.submit('squares', {'numbers': [2]})[0])
+        assert {job['id'] for job in manager.list()} == {failed.id, done.id}
+        time.sleep(0.6)
+        assert manager.list() == []
+        assert manager.get(failed.id) is None and manager.get(done.id) is None
+    finally:
+        manager._pool.shutdown()
+
+def test_ranking_job_route(client):
+    body = {'type': 'ranking', 'params': {'bbox': [34.8, -110.3, 35.1, -110.0], 'spacing': 0.01, 'k': 5}}
+    submitted = client.post('/api/jobs/', json=body)
+    assert submitted.status_code in (200, 202)
+    location = submitted.headers['Location']
+
+    events = [json.loads(line) for line in client.get(f'{location}/events').get_data(as_text=True).splitlines()]
+    assert events[-1]['status'] == 'done'
+
+    result = client.get(f'{location}/result').get_json()
+    assert result['scanned'] == 31 * 31 and [entry['rank'] for entry in result['results']] == [1, 2, 3, 4, 5]
+    lines = client.get(f'{location}/result?format=ndjson').get_data(as_text=True).splitlines()
+    assert json.loads(lines[0])['k'] == 5
+    assert [json.loads(line)['field'] for line in lines[1:]] == ['results'] * 5
+
+    resubmitted = client.post('/api/jobs/', json=body)
+    assert resubmitted.status_code == 200 and resubmitted.get_json()['created'] is False
+    assert any(job['id'] == submitted.get_json()['id'] for job in client.get('/api/jobs/').get_json())
+
+    assert client.delete(location).status_code == 204
+    assert client.get(location).status_code == 404
+
+@pytest.mark.parametrize('body', [
+    {'type': 'ranking'},
+    {'type': 'ranking', 'params': []},
+    {'type': 'unknown', 'params': {}},
+    {'type': 'ranking', 'params': {'source': 'locations'}},
+    {'type': 'terrain', 'params': {'locations': 'everywhere'}}
+])
+def test_job_route_rejects_invalid_submissions(client, body):
+    assert client.post('/api/jobs/', json=body).status_code == 400
+
+def test_unavailable_elevations_answer_503(client, monkeypatch):
+    def unavailable(lats, lngs):
+        raise ElevationUnavailable('Elevation lookup exceeded 30 s')
+    monkeypatch.setattr(models.job_types, 'fetch_elevation_batch', unavailable)
+    params = {'locations': [{'latitude': 35.5, 'longitude': -110.5}]}
+    response = client.post('/api/jobs/', json={'type': 'terrain', 'params': params})
+    assert response.status_code == 503
+
+@pytest.mark.parametrize('suffix', ['', '/result', '/events'])
+def test_unknown_jobs_are_404(client, suffix):
+    assert client.get(f'/api/jobs/0123456789abcdef{suffix}').status_code == 404
+
+def test_cancelling_an_unknown_job_is_404(client):
+    assert client.delete('/api/jobs/0123456789abcdef').status_code == 404
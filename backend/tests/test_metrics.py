@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+from utils.metrics import Registry, SampledProfiler, profiler, server_timing_header, span, span_duration
+
+def sample(text, line_start):
+    """Value of the exposition line starting with ``line_start``"""
+    for line in text.splitlines():
+        if line.startswith(line_start + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+def sample_count(name, outcome):
+    return sample('\n'.join(span_duration.render()),
+                  f'span_duration_seconds_count{{span="{name}",outcome="{outcome}"}}')
+
+def test_registry_renders_prometheus_text():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests', ('route',))
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    requests.inc(route='/a')
+    requests.inc(2, route='/a')
+    requests.inc(route='say "hi"\n')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    registry.add_collector(lambda: ['extra_metric 1'])
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/a"} 3' in lines
+    assert 'requests_total{route="say \\"hi\\"\\n"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines and 'latency_seconds_sum 5.55' in lines
+    assert lines[-1] == 'extra_metric 1'
+
+    # Registering a name again returns the existing metric
+    assert registry.counter('requests_total', 'Requests', ('route',)) is requests
+    with pytest.raises(ValueError):
+        requests.inc(method='GET')
+
+def test_spans_record_outcomes():
+    before = sample_count('test.stage', 'error')
+    with pytest.raises(RuntimeError):
+        with span('test.stage'):
+            raise RuntimeError('boom')
+    with span('test.stage') as current:
+        current.fail()
+    assert sample_count('test.stage', 'error') == before + 2
+
+def test_server_timing_sums_repeated_spans():
+    header = server_timing_header([('db.find', 0.001), ('json.encode', 0.002), ('db.find', 0.003)], 0.01)
+    assert header == 'db-find;dur=4.00, json-encode;dur=2.00, total;dur=10.00'
+
+def test_responses_carry_server_timing(client):
+    response = client.get('/api/solar/nearest?lat=36&lon=-119')
+    timing = response.headers['Server-Timing']
+    assert 'json-encode;dur=' in timing
+    assert re.search(r'total;dur=\d+\.\d\d$', timing)
+
+def test_requests_are_counted_by_route(client):
+    route = 'http_requests_total{method="GET",route="/api/heatmap/stats",status="200"}'
+    before = sample(client.get('/metrics').get_data(as_text=True), route)
+    client.get('/api/heatmap/stats')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert sample(text, route) == before + 1
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/heatmap/stats",le="0.001"}' in text
+    assert '# TYPE cache_events_total counter' in text
+    assert sample(text, 'http_requests_in_flight') == 1
+
+def test_streamed_responses_leave_in_flight_once(client, locations):
+    response = client.get('/api/site-selection/?format=ndjson&limit=5')
+    assert len(response.get_data(as_text=True).splitlines()) == 5
+    response.close()
+    assert sample(client.get('/metrics').get_data(as_text=True), 'http_requests_in_flight') == 1
+
+def test_failing_views_count_as_500(app, client, monkeypatch):
+    def broken():
+        raise RuntimeError('broken view')
+    monkeypatch.setitem(app.view_functions, 'get_cache_stats', broken)
+    route = 'http_requests_total{method="GET",route="/api/cache-stats",status="500"}'
+    before = sample(client.get('/metrics').get_data(as_text=True), route)
+    with pytest.raises(RuntimeError):
+        client.get('/api/cache-stats')
+    assert sample(client.get('/metrics').get_data(as_text=True), route) == before + 1
+
+def test_profiler_keeps_slow_samples_only():
+    sampler = SampledProfiler(sample_rate=1.0, slow_ms=10, keep=2)
+    for label, seconds in (('fast', 0.001), ('slow-1', 0.5), ('slow-2', 0.5), ('slow-3', 0.5)):
+        sampler.finish(sampler.start(), label, seconds)
+    assert [entry['request'] for entry in sampler.list()] == ['slow-2', 'slow-3']
+    assert 'function calls' in sampler.get(sampler.list()[0]['id'])['stats']
+    assert SampledProfiler(sample_rate=0).start() is None
+
+def test_profile_routes(client, monkeypatch):
+    monkeypatch.setattr(profiler, 'sample_rate', 1.0)
+    monkeypatch.setattr(profiler, 'slow_ms', 0)
+    client.get('/api/heatmap/stats')
+    captured = client.get('/metrics/profiles').get_json()
+    assert captured[-1]['request'].startswith('GET /api/heatmap/stats')
+    assert client.get(f'/metrics/profiles/{captured[-1]["id"]}').mimetype == 'text/plain'
+    assert client.get('/metrics/profiles/999999').status_code == 404
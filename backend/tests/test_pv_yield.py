@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from models.pv_yield import check_configs, check_irradiance_inputs, predict_solar_yield, simulate
+
+ARIZONA = {'latitude': 34.0489, 'longitude': -111.0937}
+
+def test_batches_match_single_simulations(monkeypatch):
+    lats = np.array([35.0, -20.0, 50.0])
+    ghi = np.array([np.full(12, 5.0), np.linspace(3, 7, 12), np.full(12, 2.5)])
+    configs = [{}, {'capacity_kw': 2, 'tilt': 0}, {'azimuth': 90, 'losses': 20}]
+    # Chunks smaller than the batch, so combinations split across them
+    monkeypatch.setattr('models.pv_yield.CHUNK_SIZE', 2)
+    batch = simulate(lats, ghi, configs)
+    for s in range(3):
+        for c in range(3):
+            single = simulate(lats[s:s + 1], ghi[s:s + 1], configs[c:c + 1])
+            assert batch['annual_kwh'][s, c] == pytest.approx(single['annual_kwh'][0, 0])
+            np.testing.assert_allclose(batch['monthly_kwh'][s, c], single['monthly_kwh'][0, 0])
+    np.testing.assert_allclose(batch['monthly_kwh'].sum(axis=2), batch['annual_kwh'])
+
+def test_defaults_face_the_equator():
+    result = simulate([35.0, -20.0, 75.0], np.full((3, 12), 5.0), [{}])
+    np.testing.assert_array_equal(result['tilt'][:, 0], [35.0, 20.0, 60.0])
+    np.testing.assert_array_equal(result['azimuth'][:, 0], [180.0, 0.0, 180.0])
+
+def test_output_scales_with_capacity_and_losses():
+    ghi = np.full((1, 12), 5.0)
+    base, doubled, lossless = simulate([35.0], ghi, [{}, {'capacity_kw': 2}, {'losses': 0}])['annual_kwh'][0]
+    assert doubled == pytest.approx(2 * base)
+    assert base == pytest.approx(lossless * 0.86)
+    assert 0 < simulate([35.0], ghi, [{}])['capacity_factor'][0, 0] < 0.3
+    assert simulate([35.0], np.zeros((1, 12)), [{}])['annual_kwh'][0, 0] == 0
+
+def test_hourly_output_adds_up_to_the_annual_energy():
+    result = simulate([35.0], np.full((1, 12), 5.0), [{}], include_hourly=True)
+    assert result['hourly_kw'].shape == (1, 1, 8760)
+    assert result['hourly_kw'].sum() == pytest.approx(result['annual_kwh'][0, 0], rel=1e-4)
+
+def test_irradiance_sources():
+    results = predict_solar_yield([ARIZONA, dict(ARIZONA, solar_irradiance=5.0), {'latitude': 0, 'longitude': 0}], [{}])
+    assert [result.get('irradiance_source') for result in results] == ['dataset', 'request', None]
+    assert 'error' in results[2]
+
+@pytest.mark.parametrize('config', [
+    {'capacity_kw': 0},
+    {'capacity_kw': -1},
+    {'capacity_kw': 'large'},
+    {'losses': 100},
+    {'losses': -5},
+    {'tilt': float('nan')},
+    {'albedo': float('inf')}
+])
+def test_invalid_configs_are_rejected(config):
+    with pytest.raises(ValueError):
+        check_configs([config])
+
+def test_null_tilt_and_azimuth_take_defaults():
+    check_configs([{'tilt': None, 'azimuth': None}])
+
+@pytest.mark.parametrize('site', [
+    {'monthly_irradiance': [5.0] * 11},
+    {'monthly_irradiance': [5.0] * 11 + [-1.0]},
+    {'monthly_irradiance': [5.0] * 11 + [float('nan')]},
+    {'monthly_irradiance': [5.0] * 11 + ['x']},
+    {'monthly_irradiance': 5.0},
+    {'solar_irradiance': -1},
+    {'solar_irradiance': 'sunny'}
+])
+def test_invalid_irradiance_is_rejected(site):
+    with pytest.raises(ValueError):
+        check_irradiance_inputs([dict(ARIZONA, **site)])
+
+def test_prediction_route(client):
+    single = client.post('/api/predictions/', json=ARIZONA).get_json()['predicted_output']
+    assert single['solar_output'] > 0
+
+    batch = client.post('/api/predictions/', json={
+        'sites': [ARIZONA, {'latitude': 35.0, 'longitude': -111.0, 'monthly_irradiance': [5.0] * 12}],
+        'configs': [{}, {'capacity_kw': 3}]
+    }).get_json()['predicted_output']
+    assert len(batch['solar_output']) == 4
+    assert batch['solar_output'][3] == pytest.approx(3 * batch['solar_output'][2], rel=1e-3)
+
+@pytest.mark.parametrize('body', [
+    {'sites': []},
+    {'latitude': 95, 'longitude': 0},
+    dict(ARIZONA, config={'losses': 100}),
+    dict(ARIZONA, monthly_irradiance=[1, 2, 3]),
+    dict(ARIZONA, configs=[{}] * 11, include_hourly=True)
+])
+def test_prediction_route_errors(client, body):
+    assert client.post('/api/predictions/', json=body).status_code == 400
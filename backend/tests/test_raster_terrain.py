@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from conftest import DEM_SITE
+from models.raster_terrain import (
+    D8_OFFSETS, analyze_dem, analyze_site, analyze_sites, d8_flow_direction, fill_voids, flow_accumulation,
+    roughness_index, slope_aspect
+)
+
+def rough_dem(shape, seed=0, base=2500.0):
+    """Smoothed noise, so flow paths run for many cells, well above sea level"""
+    rng = np.random.default_rng(seed)
+    return (base + 40 * ndimage.gaussian_filter(rng.standard_normal(shape), 4, axes=(-2, -1))
+            + rng.standard_normal(shape)).astype(np.float32)
+
+def reference_slope_aspect(dem, cell_x, cell_y):
+    padded = np.pad(dem.astype(float), 1, mode='edge')
+    z = {(dr, dc): padded[1 + dr:padded.shape[0] - 1 + dr, 1 + dc:padded.shape[1] - 1 + dc]
+         for dr in (-1, 0, 1) for dc in (-1, 0, 1)}
+    dz_dx = ((z[-1, 1] + 2 * z[0, 1] + z[1, 1]) - (z[-1, -1] + 2 * z[0, -1] + z[1, -1])) / (8 * cell_x)
+    dz_dy = ((z[-1, -1] + 2 * z[-1, 0] + z[-1, 1]) - (z[1, -1] + 2 * z[1, 0] + z[1, 1])) / (8 * cell_y)
+    slope = np.degrees(np.arctan(np.hypot(dz_dx, dz_dy)))
+    aspect = np.degrees(np.arctan2(-dz_dx, -dz_dy)) % 360
+    return slope, aspect
+
+def reference_directions(dem, cell_x, cell_y):
+    padded = np.pad(dem.astype(float), 1, mode='constant', constant_values=np.inf)
+    rows, cols = dem.shape
+    best = np.zeros(dem.shape)
+    direction = np.full(dem.shape, -1)
+    for index, (dr, dc) in enumerate(D8_OFFSETS):
+        drop = (dem - padded[1 + dr:1 + dr + rows, 1 + dc:1 + dc + cols]) / np.hypot(dr * cell_y, dc * cell_x)
+        steeper = drop > best
+        best[steeper] = drop[steeper]
+        direction[steeper] = index
+    return direction
+
+def reference_accumulation(dem, direction):
+    """Pass counts downstream in order of falling elevation; every receiver is lower than its donor"""
+    rows, cols = dem.shape
+    accumulation = np.ones(dem.size)
+    for cell in np.argsort(-dem, axis=None, kind='stable'):
+        d = direction.flat[cell]
+        if d >= 0:
+            dr, dc = D8_OFFSETS[d]
+            accumulation[cell + dr * cols + dc] += accumulation[cell]
+    return accumulation.reshape(dem.shape)
+
+@pytest.mark.parametrize('gradient, aspect', [((0.1, 0.0), 270.0), ((0.0, 0.1), 180.0), ((-0.1, 0.1), 135.0)])
+def test_planes_have_uniform_slope_and_aspect(gradient, aspect):
+    east, north = gradient
+    rows, cols = np.mgrid[0:20, 0:20]
+    dem = 1000 + east * 30 * cols - north * 30 * rows
+    slope, aspects = slope_aspect(dem, 30.0, 30.0)
+    np.testing.assert_allclose(slope[1:-1, 1:-1], np.degrees(np.arctan(np.hypot(east, north))), rtol=1e-5)
+    np.testing.assert_allclose(aspects[1:-1, 1:-1], aspect, atol=1e-3)
+
+def test_flat_cells_have_no_aspect():
+    slope, aspect = slope_aspect(np.full((5, 5), 300.0), 30.0, 30.0)
+    assert (slope == 0).all() and (aspect == -1).all()
+
+def test_kernels_match_references_across_blocks():
+    # Larger than one block of BLOCK_CELLS, with unequal cell sizes
+    dem = rough_dem((300, 300))
+    slope, aspect = slope_aspect(dem, 25.0, 30.0)
+    expected_slope, expected_aspect = reference_slope_aspect(dem, 25.0, 30.0)
+    np.testing.assert_allclose(slope, expected_slope, atol=1e-3)
+    sloped = expected_slope > 0.5
+    np.testing.assert_allclose(
+        (aspect[sloped] - expected_aspect[sloped] + 180) % 360 - 180, 0, atol=1e-2
+    )
+
+    expected_roughness = ndimage.generic_filter(dem.astype(float), np.std, size=3, mode='nearest')
+    np.testing.assert_allclose(roughness_index(dem), expected_roughness, atol=1e-3)
+
+    direction = d8_flow_direction(dem, 25.0, 30.0)
+    np.testing.assert_array_equal(direction, reference_directions(dem, 25.0, 30.0))
+    np.testing.assert_array_equal(flow_accumulation(direction), reference_accumulation(dem, direction))
+
+def test_flow_converges_into_a_pit():
+    rows, cols = np.mgrid[0:9, 0:9]
+    bowl = np.hypot(rows - 4, cols - 4)
+    direction = d8_flow_direction(bowl, 1.0, 1.0)
+    accumulation = flow_accumulation(direction)
+    assert direction[4, 4] == -1
+    assert accumulation[4, 4] == bowl.size
+    assert accumulation[0, 0] == 1
+
+def test_stacks_match_single_windows():
+    # Enough windows to span several blocks, each with its own cell size
+    dems = rough_dem((70, 33, 33), seed=1)
+    cell_x = np.linspace(20, 30, 70)[:, None, None]
+    cell_y = np.full((70, 1, 1), 30.0)
+    stacked = analyze_dem(dems, cell_x, cell_y)
+    for i in (0, 35, 69):
+        single = analyze_dem(dems[i], float(cell_x[i, 0, 0]), 30.0)
+        for name, grid in single.items():
+            np.testing.assert_allclose(stacked[name][i], grid, atol=1e-4, err_msg=name)
+
+def test_voids_take_the_nearest_value():
+    dem = np.arange(16, dtype=np.float32).reshape(4, 4)
+    dem[0, 0] = dem[2, 3] = np.nan
+    filled = fill_voids(dem)
+    assert filled[0, 0] in (1, 4) and filled[2, 3] in (7, 10, 11, 15)
+    with pytest.raises(ValueError):
+        fill_voids(np.full((3, 3), np.nan))
+
+def test_sites_summarize_their_dem_window():
+    lat, lng = DEM_SITE
+    site, outside = analyze_sites(np.array([lat, 0.5]), np.array([lng, 0.5]))
+    assert outside is None
+    assert site == analyze_site(lat, lng)
+    assert 0 <= site['avg_slope'] <= site['max_slope']
+    assert site['flow_accumulation_cells'] >= 1
+    assert site['upstream_area_m2'] > 0
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+import models.site_clusters
+import routes.site_selection
+from database.cluster_index import ClusterIndex, project, unproject
+from models.site_clusters import LocationClusters, get_dataset_clusters
+
+WORLD = (-85, -180, 85, 180)
+
+def random_points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(30, 40, count)
+    lngs = rng.uniform(-120, -100, count)
+    scores = np.where(rng.random(count) < 0.1, np.nan, rng.uniform(0, 100, count))
+    return lats, lngs, scores
+
+def test_projection_round_trips():
+    lats, lngs = np.array([-60.0, 0.0, 35.5]), np.array([-170.0, 0.0, 120.25])
+    back_lats, back_lngs = unproject(*project(lats, lngs))
+    np.testing.assert_allclose(back_lats, lats, atol=1e-9)
+    np.testing.assert_allclose(back_lngs, lngs, atol=1e-9)
+
+def test_every_zoom_accounts_for_every_point():
+    lats, lngs, scores = random_points(2000)
+    index = ClusterIndex(max_zoom=10)
+    index.add(lats, lngs, scores)
+    for zoom in range(11):
+        clusters = index.clusters(*WORLD, zoom)
+        assert sum(cluster['count'] for cluster in clusters) == 2000
+    assert len(index.clusters(*WORLD, 11)) == 2000
+
+    # One cell at zoom 0 holds them all, with the mean of the known scores
+    (world,) = index.clusters(*WORLD, 0)
+    assert world['latitude'] == pytest.approx(unproject(*np.mean(project(lats, lngs), axis=1))[0], abs=1e-5)
+    assert world['mean_score'] == pytest.approx(np.nanmean(scores), abs=1e-4)
+
+def test_incremental_adds_match_a_single_build():
+    lats, lngs, scores = random_points(3000, seed=1)
+    whole = ClusterIndex(max_zoom=12)
+    whole.add(lats, lngs, scores)
+    parts = ClusterIndex(max_zoom=12)
+    for chunk in np.array_split(np.arange(3000), 7):
+        parts.add(lats[chunk], lngs[chunk], scores[chunk])
+
+    for merged, built in zip(parts.levels, whole.levels):
+        for merged_values, built_values in zip(merged, built):
+            np.testing.assert_allclose(merged_values, built_values)
+
+def test_lone_points_keep_their_identity():
+    index = ClusterIndex(max_zoom=4)
+    index.add([35.0, 35.001, 10.0], [-110.0, -110.001, 10.0], [1.0, 3.0, np.nan],
+              ids=['a', 'b', 'c'], names=['A', 'B', 'C'])
+    clusters = sorted(index.clusters(*WORLD, 4), key=lambda cluster: cluster['count'])
+    assert clusters[0] == {'latitude': 10.0, 'longitude': 10.0, 'count': 1, 'mean_score': None, 'id': 'c', 'name': 'C'}
+    assert clusters[1]['cluster'] and clusters[1]['count'] == 2 and clusters[1]['mean_score'] == 2.0
+    assert [point['id'] for point in index.clusters(34, -111, 36, -109, 5)] == ['a', 'b']
+
+def test_bbox_and_limit():
+    lats, lngs, scores = random_points(500, seed=2)
+    index = ClusterIndex(max_zoom=8)
+    index.add(lats, lngs, scores)
+    inside = (lats >= 32) & (lats <= 34) & (lngs >= -115) & (lngs <= -110)
+    assert sum(point['count'] for point in index.clusters(32, -115, 34, -110, 9)) == inside.sum()
+    with pytest.raises(ValueError, match='the limit is 10'):
+        index.clusters(*WORLD, 9, limit=10)
+    with pytest.raises(ValueError, match='the limit is 1'):
+        index.clusters(*WORLD, 8, limit=1)
+
+def test_invalid_cell_sizes_and_empty_indexes():
+    with pytest.raises(ValueError):
+        ClusterIndex(cell_px=100)
+    index = ClusterIndex()
+    index.add([], [])
+    assert index.clusters(*WORLD, 3) == []
+
+def test_location_clusters_follow_the_collection(locations):
+    clusters = LocationClusters()
+    index = clusters.get()
+    assert len(index) == 400 and clusters.get() is index
+
+    locations.insert_one({'name': 'New site', 'geometry': {'type': 'Point', 'coordinates': [-105.0, 35.0]}})
+    clusters.refresh()
+    assert clusters.index is index and len(index) == 401
+    assert 'New site' in [point.get('name') for point in index.clusters(34.99, -105.01, 35.01, -104.99, 20)]
+
+    # Removals cannot be merged, so the index is rebuilt
+    locations.delete_many({'name': {'$in': ['Site 0', 'Site 1']}})
+    clusters.refresh()
+    assert clusters.index is not index and len(clusters.index) == 399
+
+def test_dataset_clusters_are_cached_per_field():
+    index = get_dataset_clusters('solar-irradiance', 'solar_irradiance')
+    assert len(index) == 3 and get_dataset_clusters('solar-irradiance', 'solar_irradiance') is index
+    assert get_dataset_clusters('no-such-dataset') is None
+    with pytest.raises(ValueError):
+        get_dataset_clusters('solar-irradiance', 'wind_speed')
+
+def test_clusters_route(client, locations, monkeypatch):
+    monkeypatch.setattr(models.site_clusters, '_location_clusters', LocationClusters())
+    data = client.get('/api/site-selection/clusters?bbox=30,-121,38,-99&zoom=3').get_json()
+    assert data['total'] == 400 and data['zoom'] == 3
+    assert all(cluster['count'] > 1 for cluster in data['clusters'])
+
+    points = client.get('/api/site-selection/clusters?bbox=30,-121,38,-99&zoom=25').get_json()['clusters']
+    assert len(points) == 400 and all('id' in point for point in points)
+
+    dataset = client.get('/api/site-selection/clusters?bbox=30,-121,38,-99&zoom=4'
+                         '&dataset=solar-irradiance&field=solar_irradiance').get_json()
+    assert dataset['total'] == 3
+
+    monkeypatch.setattr(routes.site_selection, 'MAX_CLUSTERS', 10)
+    assert client.get('/api/site-selection/clusters?bbox=30,-121,38,-99&zoom=25').status_code == 400
+
+@pytest.mark.parametrize('query, status', [
+    ('zoom=3', 400),
+    ('bbox=38,-121,30,-99&zoom=3', 400),
+    ('bbox=30,-121,38,-99', 400),
+    ('bbox=30,-121,38,-99&zoom=31', 400),
+    ('bbox=30,-121,38,-99&zoom=3&dataset=solar-irradiance&field=wind', 400),
+    ('bbox=30,-121,38,-99&zoom=3&dataset=no-such-dataset', 404)
+])
+def test_clusters_route_errors(client, query, status):
+    assert client.get(f'/api/site-selection/clusters?{query}').status_code == status
+
+def test_database_errors_answer_503(client, monkeypatch):
+    def unavailable():
+        raise ServerSelectionTimeoutError('no servers')
+    monkeypatch.setattr(routes.site_selection, 'get_location_clusters', unavailable)
+    assert client.get('/api/site-selection/clusters?bbox=30,-121,38,-99&zoom=3').status_code == 503
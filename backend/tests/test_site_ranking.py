@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import models.job_types
+import models.site_ranking
+from models.job_types import merge_ranking, plan_ranking, run_ranking
+from models.site_ranking import (
+    RANKING_WEIGHTS, constraint_mask, evaluate_chunk, grid_chunks, parse_constraints, parse_ranking_spacing,
+    parse_weights, rank_sites
+)
+
+# Partly on the synthetic DEM tile, so slope and flood risk are known for some candidates
+BBOX = [34.8, -110.3, 35.1, -110.0]
+SPACING = 0.01
+
+def brute_force(k, weights, constraints):
+    """Every candidate scored at once, best first with earlier candidates winning ties"""
+    chunk = next(grid_chunks(*BBOX, SPACING))
+    combined, _, values = evaluate_chunk(chunk, weights)
+    feasible = np.flatnonzero(constraint_mask(values, constraints))
+    order = feasible[np.argsort(-combined[feasible], kind='stable')][:k]
+    return [(round(float(chunk['latitude'][i]), 6), round(float(chunk['longitude'][i]), 6)) for i in order]
+
+def positions(ranking):
+    return [(entry['latitude'], entry['longitude']) for entry in ranking['results']]
+
+@pytest.mark.parametrize('constraints', [{}, {'max_slope': 5, 'flood_risk': ['Low', 'Medium']}])
+def test_streamed_top_k_matches_brute_force(monkeypatch, constraints):
+    expected = brute_force(25, RANKING_WEIGHTS, constraints)
+    # Blocks of a few rows, so the heap carries candidates across many chunks
+    monkeypatch.setattr(models.site_ranking, 'CHUNK_SIZE', 100)
+    ranking = rank_sites(grid_chunks(*BBOX, SPACING), 25, RANKING_WEIGHTS, constraints)
+
+    assert ranking['scanned'] == 31 * 31
+    assert positions(ranking) == expected
+    assert [entry['rank'] for entry in ranking['results']] == list(range(1, 26))
+    scores = [entry['score'] for entry in ranking['results']]
+    assert scores == sorted(scores, reverse=True)
+
+def test_constraints_filter_candidates():
+    ranking = rank_sites(grid_chunks(*BBOX, SPACING), 1000, RANKING_WEIGHTS, {'max_slope': 2, 'min_elevation': 1})
+    assert 0 < ranking['feasible'] < ranking['scanned']
+    assert len(ranking['results']) == ranking['feasible']
+    assert all(entry['values']['slope'] <= 2 for entry in ranking['results'])
+
+def test_weights_are_reflected_in_the_breakdown():
+    weights = parse_weights({'slope': 1})
+    entry = rank_sites(grid_chunks(*BBOX, SPACING), 1, weights, {})['results'][0]
+    assert entry['criteria']['slope']['weight'] == 1.0
+    assert entry['criteria']['irradiance']['contribution'] == 0
+    assert entry['values']['slope'] == pytest.approx(min(
+        value for value in next(grid_chunks(*BBOX, SPACING))['slope'] if not np.isnan(value)
+    ), abs=0.01)
+
+def test_scans_stop_at_the_candidate_limit(monkeypatch):
+    monkeypatch.setattr(models.site_ranking, 'CHUNK_SIZE', 100)
+    with pytest.raises(ValueError, match='ranking job'):
+        rank_sites(grid_chunks(*BBOX, SPACING), 10, RANKING_WEIGHTS, {}, max_candidates=500)
+    with pytest.raises(ValueError):
+        parse_ranking_spacing({'spacing': 0.001}, BBOX, max_candidates=10_000)
+
+def test_job_bands_merge_to_the_same_ranking(monkeypatch):
+    monkeypatch.setattr(models.job_types, 'RANKING_CHUNK_CANDIDATES', 200)
+    chunks, context = plan_ranking({'bbox': BBOX, 'spacing': SPACING, 'k': 20})
+    assert len(chunks) == 6
+    merged = merge_ranking([run_ranking(chunk) for chunk in chunks], context)
+    single = rank_sites(grid_chunks(*BBOX, SPACING), 20, RANKING_WEIGHTS, {})
+    assert positions(merged) == positions(single)
+    assert merged['scanned'] == single['scanned'] and merged['feasible'] == single['feasible']
+
+def test_ranking_jobs_only_scan_grids_within_their_limit(monkeypatch):
+    with pytest.raises(ValueError):
+        plan_ranking({'source': 'locations', 'bbox': BBOX})
+    monkeypatch.setattr(models.job_types, 'JOB_MAX_CANDIDATES', 100)
+    with pytest.raises(ValueError):
+        plan_ranking({'bbox': BBOX, 'spacing': SPACING})
+
+@pytest.mark.parametrize('weights', ['irradiance', {'sunshine': 1}, {'wind': 'high'}, {'wind': -1}, {'wind': 0}])
+def test_invalid_weights_are_rejected(weights):
+    with pytest.raises(ValueError):
+        parse_weights(weights)
+
+@pytest.mark.parametrize('constraints', [[], {'max_slope': 'flat'}, {'flood_risk': 'Low'}, {'max_price': 1}])
+def test_invalid_constraints_are_rejected(constraints):
+    with pytest.raises(ValueError):
+        parse_constraints(constraints)
+
+def test_rank_route(client, locations):
+    grid = client.post('/api/site-selection/rank', json={'bbox': BBOX, 'spacing': SPACING, 'k': 5}).get_json()
+    assert grid['scanned'] == 31 * 31 and len(grid['results']) == 5
+
+    sites = client.post('/api/site-selection/rank', json={'source': 'locations', 'k': 3}).get_json()
+    assert sites['scanned'] == 400
+    assert all('id' in entry for entry in sites['results'])
+
+@pytest.mark.parametrize('body', [
+    {'bbox': BBOX, 'spacing': 0.0001},
+    {'bbox': BBOX, 'k': 0},
+    {'bbox': BBOX, 'k': 1001},
+    {'bbox': BBOX, 'spacing': -1},
+    {'bbox': [35, -110, 34, -111]},
+    {'source': 'satellite'},
+    {'spacing': 0.1}
+])
+def test_rank_route_errors(client, body):
+    assert client.post('/api/site-selection/rank', json=body).status_code == 400
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from pymongo.errors import ServerSelectionTimeoutError
+
+import routes.site_selection
+
+def coordinates(collection, query=None):
+    return [tuple(doc['geometry']['coordinates']) for doc in collection.find(query or {})]
+
+def test_pages_follow_the_next_cursor(client, locations):
+    seen = []
+    url = '/api/site-selection/?limit=150'
+    pages = 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        seen.extend(site['_id'] for site in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        url = f'/api/site-selection/?limit=150&cursor={cursor}' if cursor else None
+        pages += 1
+
+    assert pages == 3
+    assert len(seen) == len(set(seen)) == 400
+    assert seen == sorted(seen)
+
+def test_fields_are_projected(client, locations):
+    sites = client.get('/api/site-selection/?limit=5&fields=name').get_json()
+    assert len(sites) == 5
+    assert all(set(site) == {'_id', 'name'} for site in sites)
+
+def test_bbox_and_near_filters(client, locations):
+    inside = [(lng, lat) for lng, lat in coordinates(locations) if 32 <= lat <= 34 and -115 <= lng <= -110]
+    sites = client.get('/api/site-selection/?bbox=32,-115,34,-110&limit=1000').get_json()
+    assert sorted(tuple(site['geometry']['coordinates']) for site in sites) == sorted(inside)
+
+    near = client.get('/api/site-selection/?near=34,-110&radius_km=60&limit=1000').get_json()
+    assert 0 < len(near) < len(inside)
+
+def test_ndjson_streams_every_match(client, locations):
+    response = client.get('/api/site-selection/?format=ndjson&fields=name')
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(lines) == 400
+
+    negotiated = client.get('/api/site-selection/?limit=3', headers={'Accept': 'application/x-ndjson'})
+    assert len(negotiated.get_data(as_text=True).splitlines()) == 3
+
+@pytest.mark.parametrize('query', [
+    'bbox=34,-110,32,-115',
+    'bbox=-95,0,10,10',
+    'bbox=1,2,3',
+    'near=34,200',
+    'near=34,-110&radius_km=0',
+    'limit=0',
+    'limit=1001',
+    'cursor=not-an-id'
+])
+def test_invalid_filters_are_rejected(client, locations, query):
+    assert client.get(f'/api/site-selection/?{query}').status_code == 400
+
+def test_database_errors_answer_503(client, monkeypatch):
+    def unavailable(**filters):
+        raise ServerSelectionTimeoutError('no servers')
+    monkeypatch.setattr(routes.site_selection, 'find_locations', unavailable)
+
+    response = client.get('/api/site-selection/')
+    assert response.status_code == 503
+    assert client.get('/api/site-selection/?format=ndjson').status_code == 503
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from database.spatial_index import EARTH_RADIUS_KM, SpatialIndex
+
+def haversine_km(lat, lng, lats, lngs):
+    lat, lng, lats, lngs = (np.radians(v) for v in (lat, lng, lats, lngs))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+@pytest.fixture(scope='module')
+def records():
+    rng = np.random.default_rng(5)
+    return [
+        {'latitude': float(lat), 'longitude': float(lng), 'ghi': float(ghi), 'zone': f'z{i % 3}'}
+        for i, (lat, lng, ghi) in enumerate(zip(
+            rng.uniform(-60, 60, 500), rng.uniform(-180, 180, 500), rng.uniform(2, 7, 500)
+        ))
+    ]
+
+@pytest.fixture(scope='module')
+def index(records):
+    # Records without coordinates are left out
+    return SpatialIndex(records + [{'latitude': None, 'longitude': 3.0, 'ghi': 1.0}])
+
+def brute_force(records, lat, lng):
+    lats = np.array([r['latitude'] for r in records])
+    lngs = np.array([r['longitude'] for r in records])
+    return haversine_km(lat, lng, lats, lngs)
+
+def test_fields_and_size(index):
+    assert len(index) == 500
+    assert index.numeric_fields == ['ghi']
+    assert index.categorical_fields == ['zone']
+
+def test_nearest_matches_brute_force(index, records):
+    distances = brute_force(records, 12.3, 45.6)
+    indices, km = index.nearest(12.3, 45.6, k=5)
+    np.testing.assert_array_equal(indices, np.argsort(distances)[:5])
+    np.testing.assert_allclose(km, np.sort(distances)[:5], rtol=1e-9)
+
+def test_radius_matches_brute_force(index, records):
+    distances = brute_force(records, -20.0, 170.0)
+    indices, km = index.within_radius(-20.0, 170.0, 1500)
+    assert set(indices) == set(np.flatnonzero(distances <= 1500))
+    assert list(km) == sorted(km)
+
+def test_bbox_including_antimeridian(index, records):
+    lats = np.array([r['latitude'] for r in records])
+    lngs = np.array([r['longitude'] for r in records])
+    inside = np.flatnonzero((lats >= -10) & (lats <= 30) & (lngs >= 20) & (lngs <= 60))
+    np.testing.assert_array_equal(index.within_bbox(-10, 20, 30, 60), inside)
+
+    crossing = np.flatnonzero((lats >= -10) & (lats <= 30) & ((lngs >= 170) | (lngs <= -170)))
+    np.testing.assert_array_equal(index.within_bbox(-10, 170, 30, -170), crossing)
+
+def test_interpolation_weights_by_inverse_distance():
+    index = SpatialIndex([
+        {'latitude': 0.0, 'longitude': 0.0, 'ghi': 4.0, 'zone': 'a'},
+        {'latitude': 0.0, 'longitude': 3.0, 'ghi': 7.0, 'zone': 'b'}
+    ])
+    # One third of the way, so the nearer record weighs four times as much
+    result = index.interpolate(0.0, 1.0, k=2)
+    assert result['values']['ghi'] == pytest.approx((4 * 4 + 7) / 5, rel=1e-4)
+    assert result['values']['zone'] == 'a'
+    assert index.interpolate(0.0, 3.0, k=2)['values']['ghi'] == 7.0
+
+def test_vectorized_interpolation_matches_single_points(index):
+    lats = np.array([1.0, -30.0, 50.0])
+    lngs = np.array([2.0, 100.0, -120.0])
+    estimates = index.interpolate_values(lats, lngs, 'ghi', k=4)
+    for lat, lng, estimate in zip(lats, lngs, estimates):
+        assert estimate == pytest.approx(index.interpolate(lat, lng, k=4)['values']['ghi'])
+
+    nearest_km = index.nearest(1.0, 2.0)[1][0]
+    cut = index.interpolate_values(lats[:1], lngs[:1], 'ghi', max_distance_km=nearest_km / 2)
+    assert np.isnan(cut[0])
+    assert index.nearest_values(lats[:1], lngs[:1], 'zone', max_distance_km=nearest_km / 2)[0] is None
+
+def test_nearest_route(client):
+    response = client.get('/api/solar/nearest?lat=36&lon=-119&k=2')
+    data = response.get_json()['data']
+    assert [record['location'] for record in data] == ['California', 'Arizona']
+    assert data[0]['distance_km'] < data[1]['distance_km']
+
+@pytest.mark.parametrize('url, status', [
+    ('/api/solar/nearest?lat=36', 400),
+    ('/api/solar/nearest?lat=95&lon=0', 400),
+    ('/api/solar/nearest?lat=36&lon=-119&dataset=missing', 404),
+    ('/api/solar/radius?lat=36&lon=-119&radius_km=-1', 400),
+    ('/api/solar/bbox?bbox=1,2,3', 400),
+    ('/api/solar/bbox?bbox=40,-125,30,-100', 400)
+])
+def test_spatial_route_errors(client, url, status):
+    assert client.get(url).status_code == status
+
+def test_radius_bbox_and_interpolate_routes(client):
+    radius = client.get('/api/solar/radius?lat=34&lon=-111&radius_km=1000').get_json()
+    assert [record['location'] for record in radius['data']] == ['Arizona', 'California']
+    bbox = client.get('/api/solar/bbox?bbox=30,-112,35,-99').get_json()
+    assert {record['location'] for record in bbox['data']} == {'Arizona', 'Texas'}
+    estimate = client.get('/api/solar/interpolate?lat=34.0489&lon=-111.0937').get_json()
+    assert estimate['values']['solar_irradiance'] == 6.2
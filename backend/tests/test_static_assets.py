@@ -0,0 +1,98 @@
+import gzip
+import os
+
+import pytest
+
+import utils.static_assets
+from utils.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, AssetDirectory, asset_response
+
+SCRIPT = ('function render() { return "solar"; }\n' * 200).encode('utf-8')
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'main.3f2a9c1b.js').write_bytes(SCRIPT)
+    (tmp_path / 'tiny.css').write_bytes(b'body { margin: 0; }')
+    (tmp_path / 'logo.png').write_bytes(os.urandom(4096))
+    directory = AssetDirectory(str(tmp_path), reload_interval=0)
+    directory.load_all()
+    return directory
+
+def serve(app, asset, headers=None, query=''):
+    with app.test_request_context(f'/static?{query}', headers=headers or {}):
+        return asset_response(asset)
+
+def test_text_is_precompressed_and_negotiated(app, assets):
+    asset = assets.get('app.js')
+    plain = serve(app, asset)
+    assert plain.get_data() == SCRIPT
+    assert 'Content-Encoding' not in plain.headers
+
+    compressed = serve(app, asset, {'Accept-Encoding': 'gzip, deflate'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.get_data()) == SCRIPT
+    assert compressed.headers['ETag'] == f'"{asset.etag}-gzip"'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+
+def test_small_and_binary_files_are_not_compressed(app, assets):
+    for name in ('tiny.css', 'logo.png'):
+        asset = assets.get(name)
+        assert asset.variants == {}
+        assert 'Content-Encoding' not in serve(app, asset, {'Accept-Encoding': 'gzip'}).headers
+
+def test_build_time_variants_are_used_when_current(tmp_path, app):
+    (tmp_path / 'app.js').write_bytes(SCRIPT)
+    (tmp_path / 'app.js.gz').write_bytes(gzip.compress(SCRIPT, compresslevel=1))
+    asset = AssetDirectory(str(tmp_path)).get('app.js')
+    assert asset.variants['gzip'] == (tmp_path / 'app.js.gz').read_bytes()
+
+    # A stale sibling is ignored in favour of compressing the current file
+    os.utime(tmp_path / 'app.js.gz', ns=(asset.mtime - 10**9, asset.mtime - 10**9))
+    asset.load()
+    assert asset.variants['gzip'] != (tmp_path / 'app.js.gz').read_bytes()
+
+def test_etag_revalidation(app, assets):
+    asset = assets.get('app.js')
+    response = serve(app, asset, {'If-None-Match': f'"{asset.etag}"'})
+    assert response.status_code == 304
+    # The gzip variant has its own ETag
+    assert serve(app, asset, {'If-None-Match': f'"{asset.etag}"', 'Accept-Encoding': 'gzip'}).status_code == 200
+
+def test_cache_control(app, assets):
+    asset = assets.get('app.js')
+    assert serve(app, asset).headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+    assert serve(app, assets.get('main.3f2a9c1b.js')).headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert serve(app, asset, query=f'v={asset.etag[:8]}').headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert serve(app, asset, query='v=00000000').headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+
+def test_changed_and_removed_files_are_noticed(tmp_path, assets):
+    before = assets.get('app.js')
+    (tmp_path / 'app.js').write_bytes(b'changed')
+    os.utime(tmp_path / 'app.js', ns=(before.mtime + 10**9, before.mtime + 10**9))
+    after = assets.get('app.js')
+    assert after is not before and after.body == b'changed'
+
+    os.remove(tmp_path / 'app.js')
+    assert assets.get('app.js') is None
+    assert assets.get('../secret.txt') is None
+
+def test_large_files_stream_from_disk(tmp_path, app, monkeypatch):
+    monkeypatch.setattr(utils.static_assets, 'ASSET_MEMORY_MAX_SIZE', 1000)
+    (tmp_path / 'app.js').write_bytes(SCRIPT)
+    asset = AssetDirectory(str(tmp_path)).get('app.js')
+    assert asset.body is None and asset.variants == {}
+    response = serve(app, asset, {'Accept-Encoding': 'gzip'})
+    response.direct_passthrough = False
+    assert response.get_data() == SCRIPT
+    response.close()
+
+def test_static_routes(client):
+    page = client.get('/site-selection.html', headers={'Accept-Encoding': 'gzip'})
+    assert page.status_code == 200 and page.headers['Content-Encoding'] == 'gzip'
+    assert client.get('/site-selection.html', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': page.headers['ETag']
+    }).status_code == 304
+    assert client.get('/assets/css/site-selection.css').status_code == 200
+    assert client.get('/components/header.html').status_code == 200
+    for missing in ('/missing.html', '/assets/missing.css', '/components/missing.html', '/charts/missing.html'):
+        assert client.get(missing).status_code == 404
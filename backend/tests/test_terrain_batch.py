@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from conftest import DEM_SITE
+from models.terrain_metrics import grid_shape, parse_batch_coordinates, parse_batch_include
+
+def test_grid_shape_keeps_last_row_of_whole_step_spans():
+    # 0.3 / 0.1 is 2.9999... in floating point
+    assert grid_shape(0.0, 0.0, 0.3, 0.3, 0.1) == (4, 4)
+    assert grid_shape(0.0, 0.0, 0.25, 0.05, 0.1) == (3, 1)
+
+def test_bbox_becomes_row_major_grid():
+    lats, lngs = parse_batch_coordinates({'bbox': [10, 20, 10.2, 20.1], 'spacing': 0.1})
+    np.testing.assert_allclose(lats, [10, 10, 10.1, 10.1, 10.2, 10.2])
+    np.testing.assert_allclose(lngs, [20, 20.1, 20, 20.1, 20, 20.1])
+
+@pytest.mark.parametrize('body, message', [
+    ({}, 'Provide either locations or bbox'),
+    ({'locations': []}, 'No locations to analyze'),
+    ({'locations': [{'latitude': 1}]}, 'numeric latitude and longitude'),
+    ({'bbox': [1, 2, 3]}, 'bbox must be'),
+    ({'bbox': [1, 2, 0, 3]}, 'Invalid bbox or spacing'),
+    ({'bbox': [0, 0, 1, 1], 'spacing': 0}, 'Invalid bbox or spacing'),
+    ({'bbox': [0, 0, 1, 1], 'spacing': 0.001}, 'the limit is')
+])
+def test_invalid_batch_coordinates(body, message):
+    with pytest.raises(ValueError, match=message):
+        parse_batch_coordinates(body, max_points=10000)
+
+def test_include_names_and_horizon_limit():
+    assert parse_batch_include({'include': 'horizon'}) == {'horizon'}
+    assert parse_batch_include({}) == set()
+    with pytest.raises(ValueError, match='may only name'):
+        parse_batch_include({'include': ['slope']})
+    with pytest.raises(ValueError, match='limited to 5'):
+        parse_batch_include({'include': ['horizon']}, max_horizon_points=5, point_count=6)
+
+def test_batch_matches_single_site_route(client):
+    lat, lng = DEM_SITE
+    batch = client.post('/api/terrain-analysis/batch', json={
+        'locations': [{'latitude': lat, 'longitude': lng}, {'latitude': 10.0, 'longitude': 10.0}]
+    }).get_json()
+    single = client.get(f'/api/terrain-analysis/?lat={lat}&lng={lng}').get_json()
+
+    assert batch['count'] == 2
+    assert batch['locations'] == [[lat, lng], [10.0, 10.0]]
+    # Profiles carry random noise; everything else is deterministic
+    batch_site, single_site = batch['results'][0], single
+    assert len(batch_site.pop('elevationValues')) == len(single_site.pop('elevationValues'))
+    assert batch_site == single_site
+    # Only the site covered by the DEM tile gets raster metrics
+    assert 'flowAccumulation' in batch['results'][0]
+    assert 'flowAccumulation' not in batch['results'][1]
+
+def test_horizon_fields_are_opt_in_on_both_routes(client):
+    lat, lng = DEM_SITE
+    single = client.get(f'/api/terrain-analysis/?lat={lat}&lng={lng}').get_json()
+    with_horizon = client.get(f'/api/terrain-analysis/?lat={lat}&lng={lng}&include=horizon').get_json()
+    posted = client.post('/api/terrain-analysis/', json={
+        'latitude': lat, 'longitude': lng, 'include': ['horizon']
+    }).get_json()
+    batch = client.post('/api/terrain-analysis/batch', json={
+        'locations': [{'latitude': lat, 'longitude': lng}], 'include': ['horizon']
+    }).get_json()
+
+    assert 'skyViewFactor' not in single
+    assert with_horizon['skyViewFactor'] == posted['skyViewFactor'] == batch['results'][0]['skyViewFactor']
+    assert len(with_horizon['shadingLossProfile']) == 12
+
+def test_batch_rejects_invalid_requests(client):
+    assert client.post('/api/terrain-analysis/batch', json={}).status_code == 400
+    response = client.post('/api/terrain-analysis/batch', json={
+        'bbox': [0, 0, 0.5, 0.5], 'spacing': 0.01, 'include': ['horizon']
+    })
+    assert response.status_code == 400
+    assert 'include=horizon is limited' in response.get_json()['error']
+    assert client.get('/api/terrain-analysis/?lat=1&lng=2&include=bogus').status_code == 400
@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+import models.terrain_analysis
+from database.elevation_client import ElevationUnavailable
+from models.terrain_analysis import DEFAULT_ELEVATION, TerrainAnalyzer
+
+def slow(result, seconds):
+    def stage(*args):
+        time.sleep(seconds)
+        return result
+    return stage
+
+def test_stages_run_concurrently(monkeypatch):
+    analyzer = TerrainAnalyzer()
+    monkeypatch.setattr(analyzer, '_fetch_elevation_data', slow(500.0, 0.2))
+    monkeypatch.setattr(analyzer, '_fetch_soil_data', slow(analyzer._fetch_soil_data(0, 0), 0.2))
+    monkeypatch.setattr(analyzer, '_fetch_drainage_data', slow(analyzer._fetch_drainage_data(0, 0), 0.2))
+
+    started = time.perf_counter()
+    result = asyncio.run(analyzer.analyze_terrain(1.0, 2.0))
+    assert time.perf_counter() - started < 0.5
+    assert result['partial'] is False
+    assert result['elevation_analysis']['elevation'] == 500.0
+
+def test_slow_and_failing_stages_are_reported(monkeypatch):
+    analyzer = TerrainAnalyzer(stage_timeout=0.1)
+    monkeypatch.setattr(analyzer, '_fetch_soil_data', slow({}, 0.5))
+
+    def broken(lat, lon):
+        raise RuntimeError('drainage model unavailable')
+    monkeypatch.setattr(analyzer, '_fetch_drainage_data', broken)
+
+    result = asyncio.run(analyzer.analyze_terrain(1.0, 2.0))
+    assert result['partial'] is True
+    assert result['soil_stability'] is None and result['drainage_analysis'] is None
+    assert result['errors'] == {
+        'soil_stability': 'Timed out after 0.1s',
+        'drainage_analysis': 'drainage model unavailable'
+    }
+    assert result['elevation_analysis'] is not None
+    # Rules needing the soil analysis are skipped
+    assert result['recommendations'] == []
+
+def test_locations_share_one_elevation_lookup(monkeypatch):
+    calls = []
+
+    def get_elevations(lats, lngs):
+        calls.append(len(lats))
+        return np.where(np.array(lats) > 0, 800.0, np.nan)
+
+    def get_elevation(lat, lng):
+        raise AssertionError('per-location lookup')
+
+    monkeypatch.setattr(models.terrain_analysis, 'get_elevations', get_elevations)
+    monkeypatch.setattr(models.terrain_analysis, 'get_elevation', get_elevation)
+
+    results = asyncio.run(TerrainAnalyzer().analyze_locations([(1.0, 1.0), (-1.0, 1.0), (2.0, 1.0)]))
+    assert calls == [3]
+    assert [result['elevation_analysis']['elevation'] for result in results] == [800.0, DEFAULT_ELEVATION, 800.0]
+
+def test_failed_elevation_lookup_is_each_locations_stage_error(monkeypatch):
+    def get_elevations(lats, lngs):
+        raise ElevationUnavailable('Elevation lookup exceeded 30 s')
+    monkeypatch.setattr(models.terrain_analysis, 'get_elevations', get_elevations)
+
+    results = asyncio.run(TerrainAnalyzer().analyze_locations([(1.0, 1.0), (2.0, 1.0)]))
+    for result in results:
+        assert result['elevation_analysis'] is None
+        assert result['errors'] == {'elevation_analysis': 'Elevation lookup exceeded 30 s'}
+        assert result['soil_stability'] is not None
+
+def test_detailed_routes(client):
+    single = client.get('/api/terrain-analysis/detailed?lat=35.5&lng=-110.5').get_json()
+    assert single['partial'] is False
+
+    batch = client.post('/api/terrain-analysis/detailed', json={'bbox': [35.1, -110.6, 35.12, -110.58], 'spacing': 0.01})
+    data = batch.get_json()
+    assert data['count'] == 9
+    assert data['locations'][0] == [35.1, -110.6]
+    assert data['results'][0]['elevation_analysis']['elevation'] != DEFAULT_ELEVATION
+
+@pytest.mark.parametrize('request_args', [
+    {'method': 'GET', 'path': '/api/terrain-analysis/detailed?lat=1'},
+    {'method': 'POST', 'path': '/api/terrain-analysis/detailed', 'json': {}},
+    {'method': 'POST', 'path': '/api/terrain-analysis/detailed', 'json': {'bbox': [0, 0, 0.3, 0.3], 'spacing': 0.01}}
+])
+def test_detailed_route_errors(client, request_args):
+    assert client.open(**request_args).status_code == 400
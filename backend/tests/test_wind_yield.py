@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from scipy import integrate, stats
+
+from models.wind_yield import (
+    HOURS_PER_YEAR, ROUGHNESS_LENGTHS, TURBINES, annual_energy, check_wind_sites, fit_weibull, parse_turbines,
+    power_curve, predict_wind_yield, shear_to_height, weibull_scale
+)
+
+ARIZONA = {'latitude': 34.0489, 'longitude': -111.0937}
+
+def reference_mean_power(turbine, k, c):
+    """Weibull-weighted mean power by adaptive quadrature over the power curve"""
+    def density(speed):
+        return stats.weibull_min.pdf(speed, k, scale=c) * power_curve(turbine, np.array([speed]))[0]
+    breaks = [turbine['cut_in'], turbine['rated_speed'], turbine['cut_out']]
+    return integrate.quad(density, 0, 30, points=breaks, limit=200)[0]
+
+def test_power_curve_shape():
+    turbine = TURBINES['generic-2mw']
+    power = power_curve(turbine, np.array([0.0, 3.0, 8.0, 12.5, 20.0, 25.5]))
+    assert power[0] == power[1] == power[5] == 0
+    assert 0 < power[2] < turbine['rated_kw']
+    assert power[3] == power[4] == turbine['rated_kw']
+
+def test_aep_matches_weibull_integral():
+    speeds, k, z0 = np.array([5.0, 7.5]), np.array([2.0, 2.6]), np.array([0.1, 0.03])
+    energy = annual_energy(speeds, k, z0, ['generic-2mw', 'generic-10kw'], losses=0)
+    for s in range(2):
+        for t, turbine_id in enumerate(['generic-2mw', 'generic-10kw']):
+            turbine = TURBINES[turbine_id]
+            hub_speed = shear_to_height(speeds[s], turbine['hub_height'], z0[s])
+            expected = reference_mean_power(turbine, k[s], weibull_scale(hub_speed, k[s])) * HOURS_PER_YEAR
+            assert energy['aep_kwh'][s, t] == pytest.approx(expected, rel=0.01)
+    assert (energy['capacity_factor'] < 1).all()
+
+def test_losses_and_shear():
+    lossless = annual_energy([6.0], [2.0], [0.1], ['generic-2mw'], losses=0)['aep_kwh'][0, 0]
+    assert annual_energy([6.0], [2.0], [0.1], ['generic-2mw'])['aep_kwh'][0, 0] == pytest.approx(0.9 * lossless)
+    assert shear_to_height(6.0, 10.0, 0.1) == pytest.approx(6.0)
+    assert shear_to_height(6.0, 80.0, ROUGHNESS_LENGTHS['High']) > shear_to_height(6.0, 80.0, ROUGHNESS_LENGTHS['Low'])
+
+def test_weibull_fit_recovers_the_distribution():
+    samples = stats.weibull_min.rvs(2.2, scale=8.0, size=20000, random_state=np.random.default_rng(3))
+    k, c = fit_weibull(samples)
+    assert k == pytest.approx(2.2, rel=0.05)
+    assert c == pytest.approx(8.0, rel=0.02)
+
+def test_wind_sources_and_roughness():
+    sites = [ARIZONA, dict(ARIZONA, wind_speed=7.0, roughness_length=0.5), {'latitude': 0, 'longitude': 0}]
+    results = predict_wind_yield(sites, ['generic-10kw'], ['Low', 'Low', None])
+    assert [result.get('wind_source') for result in results] == ['dataset', 'request', None]
+    assert results[0]['roughness_length'] == ROUGHNESS_LENGTHS['Low']
+    assert results[1]['roughness_length'] == 0.5
+    assert 'error' in results[2]
+
+@pytest.mark.parametrize('turbines', ['generic-2mw', [3], ['generic-2mw', 'generic-50mw']])
+def test_invalid_turbines_are_rejected(turbines):
+    with pytest.raises(ValueError):
+        parse_turbines(turbines)
+
+@pytest.mark.parametrize('site', [
+    {'wind_speed': 0},
+    {'wind_speed': 'breezy'},
+    {'weibull_k': -1},
+    {'roughness_length': 0},
+    {'roughness_length': 10},
+    {'wind_speeds': [0, 0, 0]},
+    {'wind_speeds': [3, -1, 4]},
+    {'wind_speeds': [3, float('nan')]},
+    {'wind_speeds': [[3, 4]]}
+])
+def test_invalid_wind_inputs_are_rejected(site):
+    with pytest.raises(ValueError):
+        check_wind_sites([dict(ARIZONA, **site)])
+
+def test_calm_hours_are_allowed():
+    check_wind_sites([dict(ARIZONA, wind_speeds=[0, 0, 5, 7])])
+
+def test_prediction_route(client):
+    output = client.post('/api/predictions/', json=dict(
+        ARIZONA, wind_speed=6.0, turbines=['generic-10kw', 'generic-3.6mw']
+    )).get_json()['predicted_output']
+    small, large = output['wind_output']
+    assert 0 < small < large
+
+@pytest.mark.parametrize('body', [
+    dict(ARIZONA, turbines=['generic-50mw']),
+    dict(ARIZONA, turbines='generic-2mw'),
+    dict(ARIZONA, weibull_k=0)
+])
+def test_prediction_route_errors(client, body):
+    response = client.post('/api/predictions/', json=body)
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Optional on-disk tier shared by all caches; disabled when unset
+CACHE_DIR = os.environ.get('CACHE_DIR')
+
+class _Pending:
+    """A miss that is currently being fetched; other callers wait on it"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+class CoordinateCache:
+    """LRU cache keyed by coordinates rounded to a fixed number of decimals.
+
+    Entries expire after ``ttl`` seconds and the in-memory tier holds at most
+    ``max_entries`` values. When ``disk_dir`` is set, values are also written
+    as JSON files so they survive restarts. Concurrent misses for the same key
+    are coalesced into a single call to the fetch function.
+    """
+
+    def __init__(self, name, ttl=3600, max_entries=1024, precision=3,
+                 disk_dir=None, max_disk_entries=100000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self.counters = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'evictions': 0,
+            'errors': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def quantize(self, lat, lng):
+        """Round a coordinate pair to the cache precision"""
+        return round(float(lat), self.precision), round(float(lng), self.precision)
+
+    def make_key(self, lat, lng, *extra):
+        q_lat, q_lng = self.quantize(lat, lng)
+        key = f'{q_lat:.{self.precision}f},{q_lng:.{self.precision}f}'
+        if extra:
+            key += '|' + '|'.join(str(part) for part in extra)
+        return key
+
+    def get(self, key):
+        """Return ``(True, value)`` on a hit and ``(False, None)`` on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return True, value
+                del self._entries[key]
+
+        if self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None and entry['expires'] > now:
+                with self._lock:
+                    self.counters['disk_hits'] += 1
+                    self._store(key, entry['expires'], entry['value'])
+                return True, entry['value']
+
+        with self._lock:
+            self.counters['misses'] += 1
+        return False, None
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store(key, expires, value)
+        if self.disk_dir:
+            self._write_disk(key, expires, value)
+
+    def get_or_fetch(self, lat, lng, fetch, *extra):
+        """Return the cached value for the location or call ``fetch(q_lat, q_lng)``
+
+        ``fetch`` receives the quantized coordinates so every caller sharing a
+        key gets the same upstream answer. ``None`` results are not cached.
+        """
+        key = self.make_key(lat, lng, *extra)
+        hit, value = self.get(key)
+        if hit:
+            return value
+
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = fetch(*self.quantize(lat, lng))
+            if pending.value is not None:
+                self.set(key, pending.value)
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            with self._lock:
+                self.counters['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['disk_hits'] + self.counters['misses']
+            return dict(
+                self.counters,
+                size=len(self._entries),
+                max_entries=self.max_entries,
+                hit_ratio=round((lookups - self.counters['misses']) / lookups, 4) if lookups else 0.0
+            )
+
+    def _store(self, key, expires, value):
+        # Caller must hold the lock
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def _read_disk(self, key):
+        try:
+            with open(self._disk_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, expires, value):
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'key': key, 'expires': expires, 'value': value}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError):
+            return
+
+        with self._lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 256 == 0
+        if prune:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Drop the oldest files once the disk tier grows past its bound"""
+        try:
+            entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith('.json')]
+        except OSError:
+            return
+        excess = len(entries) - self.max_disk_entries
+        if excess <= 0:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def get_cache(name, **options):
+    """Return the named cache, creating it on first use.
+
+    ``ttl``, ``max_entries`` and ``precision`` can be overridden with
+    ``<NAME>_CACHE_TTL``, ``<NAME>_CACHE_SIZE`` and ``<NAME>_CACHE_PRECISION``.
+    """
+    with _caches_lock:
+        if name not in _caches:
+            prefix = name.upper().replace('-', '_')
+            options['ttl'] = float(os.environ.get(f'{prefix}_CACHE_TTL', options.get('ttl', 3600)))
+            options['max_entries'] = int(os.environ.get(f'{prefix}_CACHE_SIZE', options.get('max_entries', 1024)))
+            options['precision'] = int(os.environ.get(f'{prefix}_CACHE_PRECISION', options.get('precision', 3)))
+            if CACHE_DIR and 'disk_dir' not in options:
+                options['disk_dir'] = os.path.join(CACHE_DIR, name)
+            _caches[name] = CoordinateCache(name, **options)
+        return _caches[name]
+
+def cache_stats():
+    """Counters for every cache created so far"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,126 @@
+import json
+import struct
+import numpy as np
+from flask import Response, jsonify, request
+from utils.metrics import span
+
+try:
+    import msgpack
+except ImportError:  # Optional; MessagePack is not offered without it
+    msgpack = None
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+FLOAT32_MIMETYPE = 'application/x-float32-frame'
+
+# ``?format=`` values and the media types that select them in ``Accept``
+FORMATS = {
+    'json': (JSON_MIMETYPE,),
+    'msgpack': (MSGPACK_MIMETYPE, 'application/x-msgpack'),
+    'f32': (FLOAT32_MIMETYPE,)
+}
+
+# Array buffers in a float32 frame start on this boundary, so clients can view them in place
+FRAME_ALIGNMENT = 8
+
+def response_format() -> str:
+    """``json``, ``msgpack`` or ``f32`` from ``?format=`` or the Accept header
+
+    JSON wins whenever the client states no preference, so existing pages are
+    unaffected. Raises ValueError for an unknown or unavailable format.
+    """
+    requested = request.args.get('format')
+    if requested is not None:
+        if requested not in FORMATS:
+            raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+        if requested == 'msgpack' and msgpack is None:
+            raise ValueError('MessagePack responses need the msgpack package')
+        return requested
+
+    offered = {
+        mimetype: name for name, mimetypes in FORMATS.items() for mimetype in mimetypes
+        if name != 'msgpack' or msgpack is not None
+    }
+    best = request.accept_mimetypes.best_match(list(offered), JSON_MIMETYPE)
+    return offered.get(best, 'json')
+
+def replace_arrays(value, replace):
+    """Copy of a payload of dicts and lists with every ndarray passed through ``replace``"""
+    if isinstance(value, np.ndarray):
+        return replace(value)
+    if isinstance(value, dict):
+        return {key: replace_arrays(item, replace) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [replace_arrays(item, replace) for item in value]
+    return value
+
+def array_to_list(array: np.ndarray):
+    """Nested lists with NaN as None"""
+    if array.dtype.kind == 'f' and np.isnan(array).any():
+        return np.where(np.isnan(array), None, array.astype(object)).tolist()
+    return array.tolist()
+
+def float32_bytes(array: np.ndarray) -> bytes:
+    return np.ascontiguousarray(array, dtype='<f4').tobytes()
+
+def wire_dtype(array: np.ndarray) -> np.dtype:
+    """float32 for floating arrays; integer and boolean arrays keep their own type, little-endian"""
+    if array.dtype.kind == 'f':
+        return np.dtype('<f4')
+    return array.dtype.newbyteorder('<')
+
+def numpy_default(value):
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind not in 'biuf':
+            return array_to_list(value)
+        dtype = wire_dtype(value)
+        return {'dtype': dtype.str, 'shape': list(value.shape), 'data': np.ascontiguousarray(value, dtype=dtype).tobytes()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Cannot encode {type(value).__name__}')
+
+def float32_frame(payload) -> bytes:
+    """Little-endian uint32 header length, a JSON header, then the array buffers
+
+    Each floating array in the payload is replaced in the header by
+    ``{"$array": i}``; ``arrays[i]`` gives its ``offset`` (bytes from the end
+    of the header), ``length`` and ``shape``. Other arrays stay in the header
+    as lists, so integers are not rounded to float32. The header is padded
+    with spaces so the buffers start on an 8-byte boundary.
+    """
+    arrays, buffers = [], []
+    offset = 0
+
+    def extract(array):
+        nonlocal offset
+        if array.dtype.kind != 'f':
+            return array_to_list(array)
+        buffers.append(float32_bytes(array))
+        arrays.append({'offset': offset, 'length': int(array.size), 'shape': list(array.shape)})
+        offset += len(buffers[-1])
+        return {'$array': len(arrays) - 1}
+
+    body = replace_arrays(payload, extract)
+    header = json.dumps({'arrays': arrays, 'data': body}, separators=(',', ':'), default=numpy_default).encode()
+    header += b' ' * (-(4 + len(header)) % FRAME_ALIGNMENT)
+    return b''.join([struct.pack('<I', len(header)), header, *buffers])
+
+def numeric_response(payload, fmt: str = 'json', status: int = 200):
+    """Encode a payload holding NumPy arrays in the negotiated format
+
+    JSON gets the arrays as lists. MessagePack and float32 frames write each
+    floating array's buffer as little-endian float32 without visiting its
+    elements; NaN stays NaN there, where JSON has null. MessagePack sends
+    integer and boolean arrays in their own dtype, the float32 frame as lists.
+    """
+    if fmt == 'msgpack':
+        with span('msgpack.encode'):
+            response = Response(msgpack.packb(payload, default=numpy_default), status=status, mimetype=MSGPACK_MIMETYPE)
+    elif fmt == 'f32':
+        with span('f32.encode'):
+            response = Response(float32_frame(payload), status=status, mimetype=FLOAT32_MIMETYPE)
+    else:
+        response = jsonify(replace_arrays(payload, array_to_list))
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
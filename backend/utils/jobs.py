@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+JOB_RESULT_DIR = os.environ.get('JOB_RESULT_DIR', os.path.join(PROJECT_ROOT, 'cache', 'jobs'))
+
+# Stored results are dropped this many seconds after the job finishes
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 24 * 3600))
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+
+# 'spawn' keeps workers independent of the server's threads and open sockets
+JOB_START_METHOD = os.environ.get('JOB_START_METHOD', 'spawn')
+
+class JobType(NamedTuple):
+    """How to split a job into chunks, run one chunk in a worker and combine the results
+
+    ``plan(params)`` validates the parameters (raising ValueError) and returns
+    ``(chunks, context)``. ``run`` must be a module-level function so worker
+    processes can import it. ``merge(partials, context)`` gets the chunk
+    results in chunk order. ``stream_fields`` are the list fields of the
+    result that are streamed item by item.
+    """
+    plan: Callable[[Dict], Tuple[List, Dict]]
+    run: Callable
+    merge: Callable[[List, Dict], Dict]
+    stream_fields: Tuple[str, ...] = ('results',)
+
+def job_id_for(kind, params):
+    """Identical submissions share an id, so a stored result is found again"""
+    canonical = json.dumps({'type': kind, 'params': params}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:32]
+
+class Job:
+    def __init__(self, job_id, kind, params):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.chunks_total = 0
+        self.chunks_done = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.futures = []
+        self.partials = []
+        # Bumped on every change; watchers wait on the condition for a newer version
+        self.version = 0
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def touch(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    def snapshot(self):
+        return {
+            'id': self.id,
+            'type': self.kind,
+            'status': self.status,
+            'progress': round(self.chunks_done / self.chunks_total, 4) if self.chunks_total else 0.0,
+            'chunks_done': self.chunks_done,
+            'chunks_total': self.chunks_total,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+class ResultStore:
+    """Finished job results as JSON files, expired ``ttl`` seconds after they were written"""
+
+    def __init__(self, directory=JOB_RESULT_DIR, ttl=JOB_RESULT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def put(self, job_id, meta, result):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job_id)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'expires': time.time() + self.ttl, 'meta': meta, 'result': result}, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    def get(self, job_id):
+        """Return ``{'meta': ..., 'result': ...}`` or None when missing or expired"""
+        try:
+            with open(self._path(job_id), 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['expires'] <= time.time():
+            self.delete(job_id)
+            return None
+        return entry
+
+    def delete(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
+
+    def purge_expired(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith('.json')]
+        except OSError:
+            return
+        for entry in entries:
+            # Files are rewritten on completion, so the mtime bounds the expiry
+            if entry.stat().st_mtime + self.ttl <= time.time():
+                self.delete(entry.name[:-len('.json')])
+
+class JobManager:
+    """Runs job chunks in a process pool and keeps finished results in a ResultStore"""
+
+    def __init__(self, job_types: Dict[str, JobType], store: ResultStore = None,
+                 workers=JOB_WORKERS, start_method=JOB_START_METHOD):
+        self.job_types = job_types
+        self.store = store or ResultStore()
+        self.workers = workers
+        self.start_method = start_method
+        self._jobs = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # Caller must hold the lock
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+            )
+        return self._pool
+
+    def submit(self, kind, params):
+        """Start a job, or return the running or stored one for identical input
+
+        Returns ``(job, created)``; raises ValueError for unknown types or bad parameters.
+        """
+        job_type = self.job_types.get(kind)
+        if job_type is None:
+            raise ValueError(f'Unknown job type: {kind}')
+        job_id = job_id_for(kind, params)
+
+        existing = self.get(job_id)
+        if existing is not None and existing.status not in ('failed', 'cancelled'):
+            return existing, False
+
+        chunks, context = job_type.plan(params)
+        job = Job(job_id, kind, params)
+        job.chunks_total = len(chunks)
+        job.partials = [None] * len(chunks)
+        job.status = 'running'
+        job.started_at = time.time()
+
+        with self._lock:
+            # An identical submission may have started the job since the check above
+            current = self._jobs.get(job_id)
+            if current is not None and current.status not in ('failed', 'cancelled'):
+                return current, False
+            self._jobs[job_id] = job
+            try:
+                job.futures = [self._get_pool().submit(job_type.run, chunk) for chunk in chunks]
+            except BrokenProcessPool:
+                self._pool = None
+                job.futures = [self._get_pool().submit(job_type.run, chunk) for chunk in chunks]
+            pool = self._pool
+
+        job.touch()
+        for index, future in enumerate(job.futures):
+            future.add_done_callback(
+                lambda future, index=index: self._chunk_done(job, job_type, context, pool, index, future)
+            )
+        if not chunks:
+            threading.Thread(target=self._finish, args=(job, job_type, context), daemon=True).start()
+
+        self.store.purge_expired()
+        self._evict_expired()
+        return job, True
+
+    def _chunk_done(self, job, job_type, context, pool, index, future):
+        if future.cancelled() or job.finished:
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; the pool rejects new work, so the next submission gets a fresh one.
+            # The executor is already failing the remaining futures itself.
+            with self._lock:
+                if self._pool is pool:
+                    self._pool = None
+            self._fail(job, f'{type(error).__name__}: {error}', cancel=False)
+            return
+        if error is not None:
+            self._fail(job, f'{type(error).__name__}: {error}')
+            return
+
+        with self._lock:
+            job.partials[index] = future.result()
+            job.chunks_done += 1
+            last = job.chunks_done == job.chunks_total
+        job.touch()
+        if last:
+            # Merging can be slow for big jobs; keep it off the pool's callback thread
+            threading.Thread(target=self._finish, args=(job, job_type, context), daemon=True).start()
+
+    def _finish(self, job, job_type, context):
+        try:
+            result = job_type.merge(job.partials, context)
+            job.finished_at = time.time()
+            meta = dict(job.snapshot(), status='done', params=job.params)
+            self.store.put(job.id, meta, result)
+        except Exception as e:
+            self._fail(job, f'{type(e).__name__}: {e}')
+            return
+        job.partials = []
+        job.futures = []
+        job.status = 'done'
+        job.touch()
+
+    def _fail(self, job, message, cancel=True):
+        with self._lock:
+            if job.finished:
+                return
+            job.status = 'failed'
+            job.error = message
+            job.finished_at = time.time()
+        if cancel:
+            for future in job.futures:
+                future.cancel()
+        job.partials = []
+        job.touch()
+
+    def _expired(self, job):
+        return job.finished and job.finished_at is not None and job.finished_at + self.store.ttl <= time.time()
+
+    def _evict_expired(self):
+        """Forget finished jobs, including failed and cancelled ones, ``ttl`` seconds after they ended"""
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if self._expired(job)]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        """The job from memory, or rebuilt from a stored result after a restart"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None and job.status != 'done' and self._expired(job):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            return None
+        if job is not None:
+            if job.status == 'done' and self.store.get(job_id) is None:
+                # The stored result expired
+                with self._lock:
+                    self._jobs.pop(job_id, None)
+                return None
+            return job
+
+        entry = self.store.get(job_id)
+        if entry is None:
+            return None
+        meta = entry['meta']
+        job = Job(job_id, meta['type'], meta.get('params'))
+        for key in ('status', 'chunks_done', 'chunks_total', 'error', 'created_at', 'started_at', 'finished_at'):
+            setattr(job, key, meta.get(key))
+        with self._lock:
+            self._jobs.setdefault(job_id, job)
+        return job
+
+    def result(self, job_id):
+        entry = self.store.get(job_id)
+        return entry['result'] if entry is not None else None
+
+    def list(self):
+        self._evict_expired()
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.snapshot() for job in sorted(jobs, key=lambda job: job.created_at, reverse=True)]
+
+    def cancel(self, job_id):
+        """Stop a running job or forget a finished one; False if there is no such job"""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with self._lock:
+            if not job.finished:
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+            self._jobs.pop(job_id, None)
+        for future in job.futures:
+            future.cancel()
+        self.store.delete(job_id)
+        job.touch()
+        return True
+
+    def watch(self, job, timeout=30.0):
+        """Yield snapshots whenever the job changes, ending with its final state"""
+        version = -1
+        while True:
+            with job.changed:
+                if job.version == version:
+                    job.changed.wait(timeout)
+                version = job.version
+            yield job.snapshot()
+            if job.finished:
+                return
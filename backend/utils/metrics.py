@@ -0,0 +1,267 @@
+import os
+import io
+import time
+import random
+import pstats
+import cProfile
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond handlers to slow upstream calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Fraction of requests run under cProfile, and how slow one must be to be kept
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 20))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value:g}' for key, value in items]
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [('le', f'{bound:g}')])
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {count}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {total:g}')
+        return lines
+
+class Registry:
+    """Metrics plus collector callbacks rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """``collect()`` returns extra exposition lines, computed at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            lines.extend(collect())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'http_requests_total', 'Requests handled, by route and status', ('method', 'route', 'status')
+)
+http_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('method', 'route')
+)
+http_in_flight = registry.gauge('http_requests_in_flight', 'Requests currently being handled')
+span_duration = registry.histogram(
+    'span_duration_seconds', 'Duration of instrumented stages and upstream calls', ('span', 'outcome')
+)
+span_events = registry.counter(
+    'span_events_total', 'Notable events inside spans, such as retries, cache hits and fallbacks', ('span', 'event')
+)
+
+# Spans of the request being handled by this thread, for the Server-Timing header
+_local = threading.local()
+
+def start_request_trace():
+    _local.spans = []
+
+def finish_request_trace():
+    """Return ``[(name, seconds), ...]`` of this request's spans and stop collecting"""
+    spans = getattr(_local, 'spans', None) or []
+    _local.spans = None
+    return spans
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.outcome = 'ok'
+
+    def event(self, event, count=1):
+        span_events.inc(count, span=self.name, event=event)
+
+    def fail(self):
+        """Mark the span as failed without raising"""
+        self.outcome = 'error'
+
+@contextmanager
+def span(name):
+    """Time a block as ``span_duration_seconds{span=name}``
+
+    Exceptions mark the outcome as ``error`` and propagate.
+    """
+    current = Span(name)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException:
+        current.outcome = 'error'
+        raise
+    finally:
+        record_span(name, time.perf_counter() - started, current.outcome)
+
+def record_span(name, seconds, outcome='ok'):
+    """Record a stage timed elsewhere, e.g. by a driver's own event hooks"""
+    span_duration.observe(seconds, span=name, outcome=outcome)
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        spans.append((name, seconds))
+
+def server_timing_header(spans, total_seconds):
+    """``Server-Timing`` value summing repeated spans, plus the total"""
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    parts = [f'{name.replace(".", "-")};dur={seconds * 1000:.2f}' for name, seconds in totals.items()]
+    parts.append(f'total;dur={total_seconds * 1000:.2f}')
+    return ', '.join(parts)
+
+class SampledProfiler:
+    """Profile a random sample of requests and keep the slow ones
+
+    Profiles are per thread, so a sampled request sees only its own work;
+    executor threads it hands off to are not included.
+    """
+
+    def __init__(self, sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS, keep=PROFILE_KEEP):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.profiles = deque(maxlen=keep)
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return None
+        return profiler
+
+    def finish(self, profiler, label, elapsed_seconds):
+        profiler.disable()
+        if elapsed_seconds * 1000 < self.slow_ms:
+            return
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(40)
+        with self._lock:
+            self._next_id += 1
+            self.profiles.append({
+                'id': self._next_id,
+                'request': label,
+                'duration_ms': round(elapsed_seconds * 1000, 1),
+                'captured_at': time.time(),
+                'stats': output.getvalue()
+            })
+
+    def list(self):
+        with self._lock:
+            return [{key: value for key, value in p.items() if key != 'stats'} for p in self.profiles]
+
+    def get(self, profile_id):
+        with self._lock:
+            return next((p for p in self.profiles if p['id'] == profile_id), None)
+
+profiler = SampledProfiler()
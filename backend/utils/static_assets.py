@@ -0,0 +1,174 @@
+import os
+import re
+import gzip
+import time
+import hashlib
+import mimetypes
+import threading
+from flask import Response, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip alone is used without it
+    brotli = None
+
+# Files up to this size are kept in memory with their compressed variants
+ASSET_MEMORY_MAX_SIZE = int(os.environ.get('ASSET_MEMORY_MAX_SIZE', 1024 * 1024))
+
+# How often, in seconds, a cached file's mtime is checked for changes
+ASSET_RELOAD_INTERVAL = float(os.environ.get('ASSET_RELOAD_INTERVAL', 2))
+
+# Files smaller than this are not worth compressing
+COMPRESS_MIN_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'application/xml')
+
+# Names like main.3f2a9c1b.js change whenever their content does, so they can be cached for good
+FINGERPRINT_PATTERN = re.compile(r'[.-][0-9a-f]{8,}\.[a-z0-9]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'
+
+class Asset:
+    """A static file with its strong ETag and, when small, its bytes and compressed variants"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.immutable = FINGERPRINT_PATTERN.search(os.path.basename(path)) is not None
+        self.mtime = None
+        self.size = None
+        self.etag = None
+        self.body = None
+        self.variants = {}
+        self.checked_at = 0.0
+
+    def load(self):
+        stat = os.stat(self.path)
+        self.mtime = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.checked_at = time.monotonic()
+
+        if self.size > ASSET_MEMORY_MAX_SIZE:
+            # Large files are streamed from disk; the ETag only tracks size and mtime
+            self.etag = hashlib.sha1(f'{self.size}-{self.mtime}'.encode('utf-8')).hexdigest()
+            return
+
+        with open(self.path, 'rb') as f:
+            self.body = f.read()
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+        if self.size < COMPRESS_MIN_SIZE or not self.mimetype.startswith(COMPRESSIBLE_TYPES):
+            return
+        candidates = {'gzip': self._precompressed('.gz') or gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates['br'] = self._precompressed('.br') or brotli.compress(self.body, quality=11)
+        self.variants = {
+            encoding: body for encoding, body in candidates.items() if len(body) < len(self.body)
+        }
+
+    def _precompressed(self, suffix):
+        """Bytes of a sibling file compressed at build time, if one is up to date"""
+        path = self.path + suffix
+        try:
+            if os.stat(path).st_mtime_ns >= self.mtime:
+                with open(path, 'rb') as f:
+                    return f.read()
+        except OSError:
+            pass
+        return None
+
+class AssetDirectory:
+    """Every file below ``directory``, indexed at startup and reloaded when its mtime changes"""
+
+    def __init__(self, directory, reload_interval=ASSET_RELOAD_INTERVAL):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        if not os.path.isdir(self.directory):
+            return
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(('.gz', '.br')):
+                    continue
+                relative = os.path.relpath(os.path.join(root, filename), self.directory)
+                self.get(relative.replace(os.sep, '/'))
+
+    def get(self, filename):
+        """Return the current asset, or None if there is no such file"""
+        asset = self._assets.get(filename)
+        now = time.monotonic()
+
+        if asset is not None and now - asset.checked_at < self.reload_interval:
+            return asset
+
+        with self._lock:
+            asset = self._assets.get(filename)
+            if asset is None:
+                path = safe_join(self.directory, filename)
+                if path is None or not os.path.isfile(path):
+                    return None
+                asset = Asset(path)
+                asset.load()
+                self._assets[filename] = asset
+                return asset
+
+            try:
+                mtime = os.stat(asset.path).st_mtime_ns
+            except OSError:
+                # The file was removed
+                del self._assets[filename]
+                return None
+
+            if mtime != asset.mtime:
+                # Swap in a fresh object so readers never see a half-reloaded asset
+                asset = Asset(asset.path)
+                asset.load()
+                self._assets[filename] = asset
+            else:
+                asset.checked_at = now
+            return asset
+
+    def stats(self):
+        assets = list(self._assets.values())
+        return {
+            'files': len(assets),
+            'in_memory_bytes': sum(len(a.body) for a in assets if a.body is not None),
+            'compressed_bytes': sum(len(body) for a in assets for body in a.variants.values())
+        }
+
+def negotiate_encoding(asset):
+    """Best precompressed variant the client accepts, or None for the identity body"""
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+def asset_response(asset):
+    """Serve an asset with a strong ETag, content negotiation and cache headers"""
+    encoding = negotiate_encoding(asset)
+    etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif asset.body is None:
+        response = send_file(asset.path, mimetype=asset.mimetype, conditional=True, etag=False)
+    else:
+        response = Response(asset.variants[encoding] if encoding else asset.body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+
+    # ``?v=<etag prefix>`` pins a URL to one version of the file, like a fingerprinted name
+    version = request.args.get('v')
+    pinned = version is not None and len(version) >= 8 and asset.etag.startswith(version)
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        IMMUTABLE_CACHE_CONTROL if asset.immutable or pinned else REVALIDATE_CACHE_CONTROL
+    )
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,174 @@
+import os
+import math
+import zlib
+import shutil
+import struct
+import threading
+import numpy as np
+from utils.cache import _Pending
+
+MAX_MERCATOR_LAT = 85.05112878
+
+def tile_pixel_centers(z, x, y, size):
+    """Latitude and longitude of every pixel centre of an XYZ tile, north row first"""
+    n = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lngs = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return np.meshgrid(lats, lngs, indexing='ij')
+
+def tile_bounds(z, x, y):
+    """Return ``(south, west, north, east)`` of an XYZ tile"""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+def lat_lng_to_tile(lat, lng, z):
+    n = 2 ** z
+    lat = max(min(lat, MAX_MERCATOR_LAT), -MAX_MERCATOR_LAT)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tiles_in_bbox(min_lat, min_lng, max_lat, max_lng, z):
+    """Yield ``(x, y)`` of every tile at zoom z that intersects the box"""
+    x0, y0 = lat_lng_to_tile(max_lat, min_lng, z)
+    x1, y1 = lat_lng_to_tile(min_lat, max_lng, z)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
+
+def is_valid_tile(z, x, y, max_zoom=22):
+    return 0 <= z <= max_zoom and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+# Red (poor) -> yellow -> green (good)
+COLOR_STOPS = np.array([0.0, 0.5, 1.0])
+COLOR_VALUES = np.array([[215, 48, 39], [254, 224, 139], [26, 152, 80]], dtype=float)
+
+def colorize(values, alpha=170):
+    """Map 0..1 values onto RGBA pixels; NaN becomes fully transparent"""
+    values = np.asarray(values, dtype=float)
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    valid = ~np.isnan(values)
+    clipped = np.clip(np.where(valid, values, 0), 0, 1)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(clipped, COLOR_STOPS, COLOR_VALUES[:, channel]).astype(np.uint8)
+    rgba[..., 3] = np.where(valid, alpha, 0)
+    return rgba
+
+def _png_chunk(kind, data):
+    chunk = kind + data
+    return struct.pack('>I', len(data)) + chunk + struct.pack('>I', zlib.crc32(chunk) & 0xffffffff)
+
+def encode_png(rgba):
+    """Encode an (height, width, 4) uint8 array as an RGBA PNG"""
+    height, width = rgba.shape[:2]
+    # Every scanline starts with filter type 0 (none)
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), 6)),
+        _png_chunk(b'IEND', b'')
+    ])
+
+class TileCache:
+    """Rendered tiles on disk under ``<directory>/<version>/<z>/<x>/<y>.<ext>``
+
+    ``version`` should change whenever the inputs change. The first render
+    under a new version removes the tiles of every other version in the
+    background. Concurrent misses of one tile wait for a single render.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._version = None
+        self.counters = {'hits': 0, 'misses': 0, 'writes': 0, 'coalesced': 0, 'pruned': 0}
+
+    def path(self, version, z, x, y, ext):
+        return os.path.join(self.directory, version, str(z), str(x), f'{y}.{ext}')
+
+    def get(self, version, z, x, y, ext):
+        try:
+            with open(self.path(version, z, x, y, ext), 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.counters['misses'] += 1
+            return None
+        with self._lock:
+            self.counters['hits'] += 1
+        return data
+
+    def put(self, version, z, x, y, ext, data):
+        path = self.path(version, z, x, y, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.counters['writes'] += 1
+
+    def get_or_render(self, version, z, x, y, ext, render):
+        self.use_version(version)
+        data = self.get(version, z, x, y, ext)
+        if data is not None:
+            return data
+
+        key = (version, z, x, y, ext)
+        with self._lock:
+            pending = self._pending.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._pending[key] = _Pending()
+            else:
+                self.counters['coalesced'] += 1
+
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.value
+
+        try:
+            pending.value = render()
+            try:
+                self.put(version, z, x, y, ext, pending.value)
+            except OSError:
+                # Serving the tile matters more than caching it
+                pass
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._pending[key]
+            pending.event.set()
+
+    def use_version(self, version):
+        """Prune every other version the first time ``version`` is used"""
+        with self._lock:
+            if version == self._version:
+                return
+            self._version = version
+        threading.Thread(target=self.prune, args=(version,), name='tile-prune', daemon=True).start()
+
+    def prune(self, keep_version):
+        """Remove the tiles of every version except ``keep_version``"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_dir() and entry.name != keep_version]
+        except OSError:
+            return
+        for entry in entries:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            with self._lock:
+                self.counters['pruned'] += 1